@@ -3,11 +3,28 @@
 import tkinter as tk
 from tkinter import ttk
 
+import csv
+import json
 import os
 import re
 import sys
+import time
 
+LAUNCH_TIME = time.perf_counter()  # For the startup budget
+
+from _dialogs import DialogPool
+from _history import BalanceHistory
+from _images import ImageCache
+from _index import UsernameIndex, CredentialIndex
+from _inventory import Inventory
+from _ledger import TransactionLog, Withdrawal
 from _log import logger
+from _sales import SalesLedger
+from _shop import Cart, CatalogFile, Order, format_price
+from _store import (UserStore, SQLiteUserStore, BinaryUserStore,
+                    ShardedUserStore, parse_cents, format_cents)
+from _worker import WorkerPool
+from _writer import DurableWriter
 
 # Fonts
 LARGE_FONT = ("Verdana", 25)
@@ -19,6 +36,79 @@ options_file = 'options.txt'
 current_user_file = 'current_user.txt'
 user_data_file = 'user_data.txt'
 user_names_file = 'user_names.txt'
+user_db_file = 'user_data.db'
+user_bin_file = 'user_data.bin'
+user_index_file = 'user_data.idx'
+balance_journal_file = 'balance_journal.txt'
+balance_history_file = 'balance_history.txt'
+transactions_file = 'transactions.txt'
+user_shard_file = 'user_data_{}.txt'
+balance_shard_journal_file = 'balance_journal_{}.txt'
+user_shards_file = 'user_shards.txt'
+user_names_bloom_file = 'user_names.bloom'
+credentials_key_file = 'credentials.key'
+catalog_file = 'catalog.json'
+atlas_file = 'img/atlas.png'
+atlas_manifest_file = 'img/atlas.json'
+order_history_file = 'order_history.txt'
+sales_totals_file = 'sales_totals.json'
+inventory_file = 'inventory.txt'
+inventory_journal_file = 'inventory_journal.txt'
 COFFEE_DATA_F = 'coffee_data.txt'
 TECH_DATA_F = 'tech_data.txt'
 PIZZA_DATA_F = 'pizza_data.txt'
+
+# Storage
+# 'always', 'interval' or 'exit' (outside edits are not reloaded after a write)
+DURABILITY = 'always'
+DURABILITY_INTERVAL = 50  # Milliseconds between commits in 'interval' mode
+file_writer = DurableWriter(DURABILITY, DURABILITY_INTERVAL)
+
+STORAGE_BACKEND = 'text'  # 'text', 'sqlite', 'binary' or 'sharded'
+USER_SHARDS = 16  # Initial shard count, see reshard_users.py to change it
+if STORAGE_BACKEND == 'sqlite':
+    user_store = SQLiteUserStore(user_db_file)
+elif STORAGE_BACKEND == 'binary':
+    user_store = BinaryUserStore(user_bin_file, user_index_file)
+elif STORAGE_BACKEND == 'sharded':
+    user_store = ShardedUserStore(user_shard_file, balance_shard_journal_file,
+                                  user_shards_file, USER_SHARDS, file_writer)
+else:
+    user_store = UserStore(user_data_file, user_names_file,
+                           balance_journal_file, file_writer)
+
+username_index = UsernameIndex(user_store, user_names_bloom_file)
+credential_index = CredentialIndex(user_store, credentials_key_file)
+
+HISTORY_CHECKPOINT_EVERY = 32  # Balance changes per user between checkpoints
+HISTORY_FULL_DAYS = 30  # Older balance history is merged to one change a day
+balance_history = BalanceHistory(balance_history_file, file_writer,
+                                 HISTORY_CHECKPOINT_EVERY, HISTORY_FULL_DAYS)
+transaction_log = TransactionLog(transactions_file, file_writer)
+
+# Images
+images = ImageCache(atlas_file, atlas_manifest_file)  # See build_atlas.py
+
+# Shops
+shop_catalogs = CatalogFile(catalog_file)
+sales_ledger = SalesLedger(order_history_file, sales_totals_file, file_writer)
+
+INVENTORY_STRIPES = 16  # Locks shared out among the stocked items
+INVENTORY_HOLD = 300  # Seconds an order window holds its items in stock
+inventory = Inventory(inventory_file, inventory_journal_file, file_writer,
+                      INVENTORY_STRIPES, INVENTORY_HOLD)
+
+# Dialogs
+DIALOGS_KEPT = 1  # Closed windows kept of each kind, to open again quickly
+dialogs = DialogPool(DIALOGS_KEPT)
+
+# Startup
+STARTUP_BUDGET = 500  # Milliseconds from launch to a usable LoginPage
+PREWARM_FRAMES = True  # Build the other frames once the LoginPage is idle
+PREWARM_DELAY = 1000  # Milliseconds after startup before prewarming starts
+PREWARM_INTERVAL = 50  # Milliseconds between prewarmed frames
+
+# Workers
+WORKERS = 4  # Threads that run the storage calls of button callbacks
+WORKER_POLL = 20  # Milliseconds between checks for finished storage calls
+workers = WorkerPool(WORKERS, WORKER_POLL)
@@ -0,0 +1,121 @@
+# ===================================
+# Filename: _dialogs.py
+# Purpose: To reuse the dialog windows of the virtual-world program.
+#
+#
+# virtual-world
+# Copyright (C) 2017  Joshua Peter Booth
+#
+# This file is part of virtual-world.
+#
+# virtual-world is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# virtual-world is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with virtual-world (see LICENSE.md).
+# If not, see <http://www.gnu.org/licenses/>.
+#
+# Contact me:
+# Email: joshb00th@icloud.com
+# ===================================
+
+import time
+import tkinter as tk
+
+from _log import logger
+
+
+class DialogPool:
+
+    def __init__(self, keep=1):
+        """
+        Dialog windows that are built once and then hidden and shown again,
+        instead of being destroyed on close and rebuilt on every open.
+
+        Each kind of dialog has a build function that lays out its widgets
+        on a new tk.Toplevel. Closing a dialog withdraws it and keeps it
+        for the next open of the same kind, so opening one only has to
+        update the fields that change. Dialogs run in the app's mainloop,
+        never in one of their own.
+
+        :param keep: closed dialogs kept of each kind, any more are
+                     destroyed (int).
+        """
+        self.keep = keep
+        self._free = {}  # Kind -> closed dialogs
+
+    def prebuild(self, master, kind, build):
+        """
+        Build a closed dialog ahead of its first open, if none is free.
+
+        :param master: the dialog's parent (tk.Widget).
+        :param kind: the kind of dialog (str).
+        :param build: lays out a new dialog's widgets (function).
+        """
+        if not self._free.get(kind):
+            self._free.setdefault(kind, []).append(
+                self._build(master, kind, build))
+
+    def _build(self, master, kind, build):
+        """ Build a new, withdrawn dialog (tk.Toplevel). """
+        start = time.perf_counter()
+        dialog = tk.Toplevel(master)
+        dialog.withdraw()
+        dialog.kind = kind
+        dialog.opened = 0
+        build(dialog)
+        logger.debug("Built a {} dialog in {:.0f} ms.".format(
+            kind, (time.perf_counter() - start) * 1000))
+        return dialog
+
+    def open(self, master, kind, build):
+        """
+        Show a dialog, reusing a closed one of the same kind if there is
+        one. The caller then updates the fields that change.
+
+        :param master: the dialog's parent (tk.Widget).
+        :param kind: the kind of dialog (str).
+        :param build: lays out a new dialog's widgets (function).
+        :return: the dialog, with opened counting its opens (tk.Toplevel).
+        """
+        free = self._free.get(kind)
+        dialog = free.pop() if free else self._build(master, kind, build)
+        dialog.opened += 1
+        dialog.deiconify()
+        dialog.lift()
+        dialog.focus_set()
+        return dialog
+
+    def close(self, dialog):
+        """
+        Hide a dialog and keep it for the next open of its kind.
+
+        :param dialog: the dialog (tk.Toplevel).
+        """
+        free = self._free.setdefault(dialog.kind, [])
+        if len(free) < self.keep:
+            dialog.withdraw()
+            free.append(dialog)
+        else:
+            dialog.destroy()
+
+    @staticmethod
+    def is_open(dialog, opened):
+        """
+        Check a dialog is still open for the same open as before, so a late
+        result is not shown in a dialog that has since been reopened.
+
+        :param dialog: the dialog, or None if it has been closed
+                       (tk.Toplevel).
+        :param opened: the dialog's opened count at the time (int).
+        :return: True - If it is the same open (bool).
+                 False - If it has been closed or reopened since (bool).
+        """
+        return dialog is not None and dialog.opened == opened
@@ -0,0 +1,315 @@
+# ===================================
+# Filename: _history.py
+# Purpose: To keep a point-in-time history of user balances for the
+#          virtual-world program.
+#
+#
+# virtual-world
+# Copyright (C) 2017  Joshua Peter Booth
+#
+# This file is part of virtual-world.
+#
+# virtual-world is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# virtual-world is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with virtual-world (see LICENSE.md).
+# If not, see <http://www.gnu.org/licenses/>.
+#
+# Contact me:
+# Email: joshb00th@icloud.com
+# ===================================
+
+import threading
+import time
+from array import array
+from bisect import bisect_right
+
+from _log import logger
+from _writer import DurableWriter
+
+
+class Timeline:
+    __slots__ = ('times', 'deltas', 'checkpoints', 'balances')
+
+    def __init__(self):
+        """
+        One user's balance changes in time order.
+
+        Every change keeps its time and amount, and every so often also the
+        balance it left, so a past balance is the nearest checkpoint plus a
+        short run of changes.
+        """
+        self.times = array('d')
+        self.deltas = array('q')
+        self.checkpoints = []  # Positions in times/deltas with a balance
+        self.balances = []
+
+    def __len__(self):
+        return len(self.times)
+
+    def add(self, when, delta, balance=None):
+        """
+        Add a change after every existing one.
+
+        :param when: seconds since the epoch (float).
+        :param delta: the change in cents (int).
+        :param balance: the balance it left in cents, or None if this is not
+                        a checkpoint (int).
+        """
+        if balance is not None:
+            self.checkpoints.append(len(self.times))
+            self.balances.append(balance)
+        self.times.append(when)
+        self.deltas.append(delta)
+
+    def balance(self, position=None):
+        """
+        Get the balance after a change.
+
+        :param position: the change's position, or None for the last (int).
+        :return: the balance in cents (int) or None if it is unknown.
+        """
+        if position is None:
+            position = len(self.times) - 1
+        if position < 0:
+            return None
+        number = bisect_right(self.checkpoints, position) - 1
+        if number < 0:
+            return None
+        start = self.checkpoints[number]
+        return self.balances[number] + \
+            sum(self.deltas[start + 1:position + 1])
+
+
+class BalanceHistory:
+
+    def __init__(self, path, writer=None, checkpoint_every=32,
+                 full_days=30, resolution=86400, downsample_every=10000):
+        """
+        Every deposit and withdrawal, kept so a user's balance at any past
+        time can be looked up.
+
+        Changes are appended to the history file as 'time,delta,,username'
+        records, with every checkpoint_every-th change of each user written
+        as 'time,delta,balance,username' instead. A lookup binary searches
+        the user's change times and then replays at most checkpoint_every
+        changes from the checkpoint before it. Changes older than full_days
+        are merged into one per user per resolution seconds, keeping the
+        balance at the end of each period. Renamed and removed users are
+        appended as 'time,rename,,old,new' and 'time,remove,,username'
+        records, which are folded in when the file is read.
+
+        :param path: the history file (str).
+        :param writer: commits the file (DurableWriter).
+        :param checkpoint_every: changes per user between checkpoints (int).
+        :param full_days: days of history kept change by change (int).
+        :param resolution: seconds covered by each merged change (int).
+        :param downsample_every: changes recorded between downsamples (int).
+        """
+        self.path = path
+        self.writer = writer or DurableWriter()
+        self.checkpoint_every = checkpoint_every
+        self.full_days = full_days
+        self.resolution = resolution
+        self.downsample_every = downsample_every
+        self._lock = threading.RLock()
+        self._timelines = None
+        self._recorded = 0
+
+    def _load(self):
+        """ Read the history file into a timeline per user. """
+        self._timelines = {}
+        try:
+            lines = self.writer.read_records(self.path)
+        except FileNotFoundError:
+            return
+        for line in lines:
+            if not line:
+                continue
+            _time, _delta, _balance, _user = line.split(',', 3)
+            if _delta == 'rename':
+                _old, _new = _user.split(',')
+                self._move(_old, _new)
+            elif _delta == 'remove':
+                self._timelines.pop(_user, None)
+            else:
+                self._timeline(_user).add(
+                    float(_time), int(_delta),
+                    int(_balance) if _balance else None)
+        logger.debug("Loaded the balance history of {} users.".format(
+            len(self._timelines)))
+        self.downsample()
+
+    def _timelines_loaded(self):
+        """ Get username -> Timeline, loading it on first use (dict). """
+        if self._timelines is None:
+            self._load()
+        return self._timelines
+
+    def _timeline(self, username):
+        """ Get a user's timeline, adding an empty one if needed. """
+        timeline = self._timelines.get(username)
+        if timeline is None:
+            timeline = self._timelines[username] = Timeline()
+        return timeline
+
+    def _line(self, username, when, delta, balance):
+        """ Get the history file record for one change (str). """
+        return '{:.3f},{},{},{}\n'.format(
+            when, delta, '' if balance is None else balance, username)
+
+    def record(self, username, delta, balance, when=None):
+        """
+        Record one balance change.
+
+        :param username: user's login name (str).
+        :param delta: the change in cents, negative for a withdrawal (int).
+        :param balance: the balance it left in cents (int).
+        :param when: seconds since the epoch, or None for now (float).
+        """
+        self.record_many([(username, delta, balance)], when)
+
+    def record_many(self, changes, when=None):
+        """
+        Record many balance changes made at the same time.
+
+        :param changes: (username, delta, balance) triples, in cents
+                        (iterable of tuple).
+        :param when: seconds since the epoch, or None for now (float).
+        """
+        when = round(time.time() if when is None else when, 3)  # As saved
+        with self._lock:
+            self._timelines_loaded()
+            lines = []
+            for username, delta, balance in changes:
+                timeline = self._timeline(username)
+                if timeline.times and when < timeline.times[-1]:
+                    when = timeline.times[-1]  # The clock went backwards
+                if len(timeline) % self.checkpoint_every and \
+                        timeline.balance() is not None:
+                    timeline.add(when, delta)
+                    lines.append(self._line(username, when, delta, None))
+                else:
+                    timeline.add(when, delta, balance)
+                    lines.append(self._line(username, when, delta, balance))
+            if not lines:
+                return
+            self.writer.append(self.path, ''.join(lines))
+            self._recorded += len(lines)
+            if self._recorded >= self.downsample_every:
+                self.downsample()
+
+    def balance_at(self, username, when):
+        """
+        Get a user's balance at a past time.
+
+        :param username: user's login name (str).
+        :param when: seconds since the epoch or a datetime (float).
+        :return: the balance in cents (int) or None if no change had been
+                 recorded for the user by then.
+        """
+        if hasattr(when, 'timestamp'):
+            when = when.timestamp()
+        with self._lock:
+            timeline = self._timelines_loaded().get(username)
+            if timeline is None:
+                return None
+            return timeline.balance(bisect_right(timeline.times, when) - 1)
+
+    def _move(self, old_name, new_name):
+        """
+        Move a user's timeline to a new username.
+
+        :return: True - If the user had a timeline (bool).
+                 False - If any other case (bool).
+        """
+        timeline = self._timelines.pop(old_name, None)
+        if timeline is None:
+            return False
+        self._timelines[new_name] = timeline
+        return True
+
+    def _append_record(self, kind, names):
+        """ Append a rename or remove record to the history file. """
+        self.writer.append(self.path, '{:.3f},{},,{}\n'.format(
+            time.time(), kind, ','.join(names)))
+        self._recorded += 1
+
+    def rename(self, old_name, new_name):
+        """ Move a user's history to their new username. """
+        with self._lock:
+            self._timelines_loaded()
+            if self._move(old_name, new_name):
+                self._append_record('rename', (old_name, new_name))
+
+    def remove(self, username):
+        """ Forget a deleted user's history. """
+        with self._lock:
+            if self._timelines_loaded().pop(username, None) is not None:
+                self._append_record('remove', (username,))
+
+    def downsample(self, now=None):
+        """
+        Merge the changes older than full_days into one per user per
+        resolution seconds, rewriting the history file if any were merged.
+
+        :param now: seconds since the epoch, or None for now (float).
+        """
+        if now is None:
+            now = time.time()
+        cutoff = now - self.full_days * 86400
+        with self._lock:
+            timelines = self._timelines_loaded()
+            self._recorded = 0
+            merged = 0
+            for username, timeline in timelines.items():
+                old = bisect_right(timeline.times, cutoff)
+                periods = {int(when // self.resolution)
+                           for when in timeline.times[:old]}
+                if len(periods) == old:
+                    continue
+                balances = [timeline.balance(position)
+                            for position in range(len(timeline))]
+                kept = Timeline()
+                delta = 0
+                for position, when in enumerate(timeline.times):
+                    delta += timeline.deltas[position]
+                    if position + 1 < old and \
+                            int(timeline.times[position + 1] //
+                                self.resolution) == int(when //
+                                                        self.resolution):
+                        continue  # Merged into the period's last change
+                    if position < old or \
+                            not len(kept) % self.checkpoint_every:
+                        kept.add(when, delta, balances[position])
+                    else:
+                        kept.add(when, delta)
+                    delta = 0
+                merged += len(timeline) - len(kept)
+                timelines[username] = kept
+            if merged:
+                logger.info("Merged {} old balance changes.".format(merged))
+                self._save()
+
+    def _save(self):
+        """ Rewrite the history file from the timelines. """
+        records = []
+        for username, timeline in self._timelines.items():
+            checkpoints = set(timeline.checkpoints)
+            for position in range(len(timeline)):
+                balance = timeline.balance(position) \
+                    if position in checkpoints else None
+                records.append((timeline.times[position], self._line(
+                    username, timeline.times[position],
+                    timeline.deltas[position], balance)))
+        records.sort(key=lambda record: record[0])
+        self.writer.replace(self.path,
+                            ''.join(line for _, line in records))
@@ -0,0 +1,306 @@
+# ===================================
+# Filename: _images.py
+# Purpose: To share the decoded images of the virtual-world program.
+#
+#
+# virtual-world
+# Copyright (C) 2017  Joshua Peter Booth
+#
+# This file is part of virtual-world.
+#
+# virtual-world is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# virtual-world is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with virtual-world (see LICENSE.md).
+# If not, see <http://www.gnu.org/licenses/>.
+#
+# Contact me:
+# Email: joshb00th@icloud.com
+# ===================================
+
+import base64
+import json
+import os
+import queue
+import threading
+import tkinter as tk
+from collections import deque
+
+from _log import logger
+
+
+def atlas_key(path):
+    """ Get the name of an image file in the atlas manifest (str). """
+    return path.replace('\\', '/').lower()
+
+
+def pack(sizes, width=512, padding=1):
+    """
+    Place images on shelves in an atlas, tallest first.
+
+    :param sizes: (name, width, height) for each image (list of tuple).
+    :param width: the atlas width, widened to fit the widest image (int).
+    :param padding: pixels left between images (int).
+    :return: name -> [x, y, width, height] and the atlas size (tuple).
+    """
+    width = max([width] + [w for _, w, _ in sizes])
+    offsets = {}
+    x = y = shelf = 0
+    for name, w, h in sorted(sizes, key=lambda size: (-size[2], size[0])):
+        if x + w > width:  # Start a new shelf
+            x, y, shelf = 0, y + shelf + padding, 0
+        offsets[name] = [x, y, w, h]
+        x += w + padding
+        shelf = max(shelf, h)
+    return offsets, (width, y + shelf)
+
+
+def build_atlas(directory, atlas_path, manifest_path):
+    """
+    Pack every GIF under a directory into one PNG atlas, and write the
+    position of each one in it to a JSON manifest. Needs a Tk root.
+
+    :param directory: the image directory (str).
+    :param atlas_path: the atlas file to write (str).
+    :param manifest_path: the manifest file to write (str).
+    :return: the number of images packed (int).
+    """
+    sources = {}
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if name.lower().endswith('.gif'):
+                path = os.path.join(root, name)
+                sources[atlas_key(path)] = tk.PhotoImage(file=path)
+    offsets, size = pack([(key, image.width(), image.height())
+                          for key, image in sources.items()])
+    atlas = tk.PhotoImage(width=size[0], height=size[1])
+    for key, image in sources.items():
+        x, y, _, _ = offsets[key]
+        atlas.tk.call(atlas, 'copy', image, '-to', x, y)
+    atlas.write(atlas_path, format='png')
+    with open(manifest_path, 'w') as file:
+        json.dump(offsets, file, indent=4, sort_keys=True)
+    return len(offsets)
+
+
+class ImageCache:
+
+    def __init__(self, atlas_path=None, manifest_path=None):
+        """
+        Every image file the frames show, decoded once and shared.
+
+        Images are kept by path, subsample factor and PhotoImage options,
+        so each frame that shows the same file at the same size gets the
+        same Tk image instead of decoding its own. The images handed out
+        are shared, so they must not be changed in place.
+
+        If the atlas built by build_atlas.py exists, it is read and decoded
+        once and each image is copied out of it when first asked for, and
+        only images missing from its manifest are read from their own files.
+        The atlas is freed once preload() has copied every image out.
+
+        :param atlas_path: the atlas image (str).
+        :param manifest_path: the atlas manifest (str).
+        """
+        self.atlas_path = atlas_path
+        self.manifest_path = manifest_path
+        self._images = {}  # (path, subsample, options) -> tk.PhotoImage
+        self._atlas = None
+        self._manifest = None  # Atlas key -> [x, y, width, height]
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0  # Tk keeps 4 bytes per pixel
+
+    def _load_atlas(self, data=None):
+        """
+        Load the atlas and its manifest, if they exist.
+
+        :param data: the atlas file's contents, or None to read it (bytes).
+        """
+        self._manifest = {}
+        if self.manifest_path is None:
+            return
+        try:
+            with open(self.manifest_path, 'r') as file:
+                manifest = json.load(file)
+            if data is None:
+                self._atlas = tk.PhotoImage(file=self.atlas_path)
+            else:
+                self._atlas = tk.PhotoImage(data=base64.b64encode(data),
+                                            format='png')
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, tk.TclError) as error:
+            logger.error("Not using the image atlas: {}".format(error))
+            return
+        self._manifest = manifest
+        self.bytes += self._atlas.width() * self._atlas.height() * 4
+        logger.debug("Loaded the image atlas of {} images.".format(
+            len(manifest)))
+
+    def _cut(self, path, options):
+        """
+        Copy an image out of the atlas.
+
+        :return: the image (tk.PhotoImage) or None if it is not in the atlas
+                 or the options need the file itself.
+        """
+        if self._manifest is None or (self._manifest and self._atlas is None):
+            self._load_atlas()
+        place = self._manifest.get(atlas_key(path))
+        if place is None or not set(options) <= {'width', 'height'}:
+            return None
+        x, y, w, h = place
+        image = tk.PhotoImage(width=int(options.get('width', w)),
+                              height=int(options.get('height', h)))
+        image.tk.call(image, 'copy', self._atlas, '-from', x, y,
+                      x + min(w, image.width()), y + min(h, image.height()))
+        return image
+
+    @staticmethod
+    def _key(path, options, subsample=1):
+        """ Get the cache key of an image (tuple). """
+        return atlas_key(path), subsample, tuple(sorted(options.items()))
+
+    def get(self, path, subsample=1, **options):
+        """
+        Get the shared image of a file.
+
+        :param path: the image file (str).
+        :param subsample: keep every subsample-th pixel in each direction
+                          (int).
+        :param options: other tk.PhotoImage options, such as height (dict).
+        :return: the image (tk.PhotoImage).
+        """
+        key = self._key(path, options, subsample)
+        image = self._images.get(key)
+        if image is not None:
+            self.hits += 1
+            return image
+        self.misses += 1
+        if subsample == 1:
+            image = self._cut(path, options) or \
+                tk.PhotoImage(file=path, **options)
+        else:
+            image = self.get(path, **options).subsample(subsample)
+        self._images[key] = image
+        self.bytes += image.width() * image.height() * 4
+        return image
+
+    def preload(self, widget, paths=(), variants=(), interval=10):
+        """
+        Warm the cache with images for frames not yet shown, without holding
+        up the mainloop.
+
+        Files (and the atlas, if it has not been loaded yet) are read on a
+        background thread. Tk images can only be made on the Tk thread, so
+        widget.after() callbacks then decode or cut out one image each.
+
+        :param widget: schedules the callbacks (tk.Widget).
+        :param paths: image files to warm as well as every image in the
+                      atlas (iterable of str).
+        :param variants: (file, PhotoImage options) of images shown at
+                         another size, warmed before the atlas is freed
+                         (iterable of tuple).
+        :param interval: milliseconds between images (int).
+        """
+        read_atlas = self._manifest is None and self.manifest_path is not None
+        wanted = [(path, {}) for path in paths] + \
+            [(path, dict(options)) for path, options in variants]
+        pending = queue.Queue()
+
+        def read():
+            """ Read the files the Tk thread will decode. """
+            if read_atlas:
+                try:
+                    with open(self.atlas_path, 'rb') as file:
+                        pending.put((None, None, file.read()))
+                except OSError:
+                    pending.put((None, None, None))
+            for path, options in wanted:
+                if self._key(path, options) in self._images:
+                    continue
+                try:
+                    with open(path, 'rb') as file:
+                        pending.put((path, options, file.read()))
+                except OSError as error:
+                    logger.error("Failed to preload '{}': {}".format(
+                        path, error))
+
+        reader = threading.Thread(target=read, daemon=True)
+        reader.start()
+        cuts = deque()
+
+        def step():
+            """ Decode or cut out the next image. """
+            try:
+                path, options, data = pending.get_nowait()
+            except queue.Empty:
+                if cuts:
+                    self.get(cuts.popleft())
+                elif not reader.is_alive() and pending.empty():
+                    logger.debug("Finished preloading images.")
+                    self._drop_atlas()
+                    self.log_stats()
+                    return
+            else:
+                if path is None:  # The atlas
+                    if data is None:  # Not built
+                        self._manifest = self._manifest or {}
+                    elif self._manifest is None:
+                        self._load_atlas(data)
+                    cuts.extend(self._manifest)
+                else:
+                    self._warm(path, options, data)
+            widget.after(interval, step)
+
+        if not read_atlas:
+            cuts.extend(self._manifest or ())
+        widget.after(interval, step)
+
+    def _drop_atlas(self):
+        """ Free the atlas once every image in it has been copied out. """
+        if self._atlas is not None and all(
+                (key, 1, ()) in self._images for key in self._manifest):
+            self.bytes -= self._atlas.width() * self._atlas.height() * 4
+            self._atlas = None
+
+    def _warm(self, path, options, data):
+        """ Cache an image decoded from its file's contents. """
+        key = self._key(path, options)
+        if key in self._images:
+            return
+        if atlas_key(path) in (self._manifest or {}):
+            self.get(path, **options)
+            return
+        try:
+            image = tk.PhotoImage(data=base64.b64encode(data), **options)
+        except tk.TclError as error:
+            logger.error("Failed to preload '{}': {}".format(path, error))
+            return
+        self.misses += 1
+        self._images[key] = image
+        self.bytes += image.width() * image.height() * 4
+
+    def stats(self):
+        """
+        Get how well the cache is doing.
+
+        :return: the number of 'hits', 'misses' and 'images' and the
+                 'bytes' of image memory in use (dict).
+        """
+        return {"hits": self.hits, "misses": self.misses,
+                "images": len(self._images), "bytes": self.bytes}
+
+    def log_stats(self):
+        """ Log how well the cache is doing. """
+        logger.debug("Images: {hits} hits, {misses} misses, {images} images, "
+                     "{bytes} bytes.".format(**self.stats()))
@@ -0,0 +1,357 @@
+# ===================================
+# Filename: _index.py
+# Purpose: To provide fast lookup indexes over the user accounts of the
+#          virtual-world program.
+#
+#
+# virtual-world
+# Copyright (C) 2017  Joshua Peter Booth
+#
+# This file is part of virtual-world.
+#
+# virtual-world is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# virtual-world is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with virtual-world (see LICENSE.md).
+# If not, see <http://www.gnu.org/licenses/>.
+#
+# Contact me:
+# Email: joshb00th@icloud.com
+# ===================================
+
+import hashlib
+import hmac
+import math
+import os
+import struct
+import threading
+
+from _log import logger
+
+
+class BloomFilter:
+    HEADER = struct.Struct('<QII')  # Number of bits, hashes, names added
+
+    def __init__(self, capacity, error_rate=0.01):
+        """
+        Set membership test that never gives a false negative.
+
+        :param capacity: the number of names it is sized for (int).
+        :param error_rate: the false positive rate at capacity (float).
+        """
+        self.capacity = max(int(capacity), 1)
+        self.size = max(int(-self.capacity * math.log(error_rate) /
+                            math.log(2) ** 2), 64)
+        self.hashes = max(int(round(self.size / self.capacity *
+                                    math.log(2))), 1)
+        self.count = 0
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, name):
+        """ Get the bit positions for a name (generator of int). """
+        digest = hashlib.sha256(name.encode('utf-8')).digest()
+        first, second = struct.unpack_from('<QQ', digest)
+        for number in range(self.hashes):
+            yield (first + number * second) % self.size
+
+    def add(self, name):
+        """ Add a name to the filter. """
+        for position in self._positions(name):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, name):
+        return all(self.bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(name))
+
+    def to_bytes(self):
+        """ Get the filter as bytes for saving (bytes). """
+        return self.HEADER.pack(self.size, self.hashes, self.count) + \
+            bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Rebuild a filter saved with to_bytes.
+
+        :param data: the saved filter (bytes).
+        :return: the filter (BloomFilter).
+        :raise: ValueError: Bloom filter data not valid!
+        """
+        if len(data) < cls.HEADER.size:
+            raise ValueError("Bloom filter data not valid!")
+        size, hashes, count = cls.HEADER.unpack_from(data)
+        bloom = cls.__new__(cls)
+        bloom.size, bloom.hashes, bloom.count = size, hashes, count
+        bloom.capacity = max(int(size * math.log(2) ** 2 / -math.log(0.01)),
+                             1)
+        bloom.bits = bytearray(data[cls.HEADER.size:])
+        if len(bloom.bits) != (size + 7) // 8:
+            raise ValueError("Bloom filter data not valid!")
+        return bloom
+
+
+class UsernameIndex:
+
+    def __init__(self, store, bloom_path):
+        """
+        Answer "is this username taken?" without loading the user store.
+
+        An on-disk Bloom filter of every username rules out most free names
+        straight away, and only names it might contain are looked up in the
+        store. Names confirmed as taken are remembered in an in-memory set.
+        The saved filter is only reused if the store's names stamp still
+        matches the one it was saved with, so balance changes do not throw
+        it away, and it is rebuilt whenever the store picks up changes from
+        outside this process, so it can never miss a name.
+
+        :param store: the authoritative user store (StorageBackend).
+        :param bloom_path: the file the Bloom filter is saved in (str).
+        """
+        self.store = store
+        self.bloom_path = bloom_path
+        self._lock = threading.RLock()
+        self._taken = set()
+        self._bloom = None
+        self._stamp = None
+        self._generation = None
+
+    def _sync(self):
+        """
+        Load the filter, rebuilding it if it is missing or stale, and save it
+        again if only this process's own writes have moved the names stamp
+        (a compaction, say) since it was saved.
+        """
+        # Taken before the generation check, so an outside change racing
+        # with it can only leave an older stamp in the file
+        stamp = repr(self.store.names_stamp())
+        if self._bloom is None:
+            if not self._load(stamp):
+                self.rebuild()
+            self._generation = self.store.generation
+        elif self._generation != self.store.generation:
+            self.rebuild()
+        elif stamp != self._stamp:
+            self._save(stamp)
+
+    def _load(self, stamp):
+        """
+        Load the saved filter if it was saved for the given store stamp.
+
+        :return: True - If the saved filter was loaded (bool).
+                 False - If any other case (bool).
+        """
+        try:
+            with open(self.bloom_path, 'rb') as file:
+                length = struct.unpack('<I', file.read(4))[0]
+                if file.read(length).decode('utf-8') != stamp:
+                    return False
+                self._bloom = BloomFilter.from_bytes(file.read())
+        except (FileNotFoundError, struct.error, ValueError):
+            return False
+        self._stamp = stamp
+        return True
+
+    def _save(self, stamp=None):
+        """
+        Save the filter along with the store names stamp it matches.
+
+        :param stamp: the names stamp, if taken before the names were read
+                      (str).
+        """
+        if stamp is None:
+            stamp = repr(self.store.names_stamp())
+        self._stamp = stamp
+        stamp = stamp.encode('utf-8')
+        temp_path = self.bloom_path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(struct.pack('<I', len(stamp)) + stamp)
+            f.write(self._bloom.to_bytes())
+        os.replace(temp_path, self.bloom_path)
+
+    def rebuild(self):
+        """ Rebuild the filter from every name in the store. """
+        with self._lock:
+            self._generation = self.store.generation
+            stamp = repr(self.store.names_stamp())
+            names = self.store.names()
+            logger.debug("Rebuilding the username index ({} names)."
+                         .format(len(names)))
+            self._bloom = BloomFilter(max(2 * len(names), 1024))
+            for name in names:
+                self._bloom.add(name)
+            self._taken = set()
+            self._save(stamp)
+
+    def available(self, name):
+        """
+        Check if nobody has the username.
+
+        :param name: the username to check (str).
+        :return: True - If the name is free (bool).
+                 False - If the name is taken (bool).
+        """
+        with self._lock:
+            self._sync()
+            if name in self._taken:
+                return False
+            if name not in self._bloom:
+                return True
+            if name in self.store:
+                self._taken.add(name)
+                return False
+            return True
+
+    def add(self, *names):
+        """
+        Record usernames that have just been added to the store, taking
+        the store's new names stamp as the one the filter matches.
+
+        :param names: the new usernames (str).
+        """
+        with self._lock:
+            if self._bloom is None:  # The next check rebuilds it anyway
+                return
+            for name in names:
+                self._bloom.add(name)
+                self._taken.add(name)
+            if self._bloom.count > self._bloom.capacity:
+                self.rebuild()
+            else:
+                self._save()
+
+    def remove(self, *names):
+        """
+        Record usernames that have just been removed from the store. They
+        stay in the Bloom filter until the next rebuild, so checking them
+        falls through to the store.
+
+        :param names: the removed usernames (str).
+        """
+        with self._lock:
+            self._taken.difference_update(names)
+            if self._bloom is not None:
+                self._save()
+
+
+class CredentialIndex:
+
+    def __init__(self, store, key_path):
+        """
+        Verify logins with one dict lookup and a constant-time compare.
+
+        Each user's stored password is kept as an HMAC-SHA256 digest under a
+        random per-install key, so the index never holds a password and a
+        login never scans the user store.
+
+        :param store: the authoritative user store (StorageBackend).
+        :param key_path: the file the HMAC key is kept in (str).
+        """
+        self.store = store
+        self.key_path = key_path
+        self._lock = threading.RLock()
+        self._key = None
+        self._digests = None
+        self._generation = None
+
+    def _load_key(self):
+        """ Read the HMAC key, creating it on first use (bytes). """
+        try:
+            with open(self.key_path, 'rb') as file:
+                key = file.read()
+            if len(key) == 32:
+                return key
+        except FileNotFoundError:
+            pass
+        key = os.urandom(32)
+        fd = os.open(self.key_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                     0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(key)
+        return key
+
+    def _digest(self, token):
+        """ Get the keyed digest of a stored password token (bytes). """
+        return hmac.new(self._key, token.encode('utf-8'),
+                        hashlib.sha256).digest()
+
+    def _sync(self):
+        """ Build the index, or rebuild it if the store changed outside. """
+        if self._digests is None or \
+                self._generation != self.store.generation:
+            self.rebuild()
+
+    def rebuild(self):
+        """ Rebuild the digests from every record in the store. """
+        with self._lock:
+            if self._key is None:
+                self._key = self._load_key()
+            self._generation = self.store.generation
+            self._digests = {
+                name: self._digest(self.store.get(name)['password'])
+                for name in self.store.names()}
+
+    def verify(self, username, password):
+        """
+        Check a username and password.
+
+        :param username: user's login name (str).
+        :param password: user's login password (str).
+        :return: True - If the user exists and the password matches (bool).
+                 False - If any other case (bool).
+        """
+        with self._lock:
+            self._sync()
+            return self._verify(username, password)
+
+    def verify_many(self, logins):
+        """
+        Check many username and password pairs at once.
+
+        :param logins: (username, password) pairs (iterable of tuple).
+        :return: one result per pair, as verify would give (list of bool).
+        """
+        with self._lock:
+            self._sync()
+            return [self._verify(username, password)
+                    for username, password in logins]
+
+    def _verify(self, username, password):
+        """ Check one login against the built index (bool). """
+        stored = self._digests.get(username)
+        if stored is None:
+            return False
+        token = self.store.password_token(password)
+        return hmac.compare_digest(stored, self._digest(token))
+
+    def set(self, username, password):
+        """
+        Record a user's new password after it is written to the store.
+
+        :param username: user's login name (str).
+        :param password: user's new password (str).
+        """
+        with self._lock:
+            if self._digests is not None:
+                token = self.store.password_token(password)
+                self._digests[username] = self._digest(token)
+
+    def remove(self, username):
+        """ Forget a user after they are removed from the store. """
+        with self._lock:
+            if self._digests is not None:
+                self._digests.pop(username, None)
+
+    def rename(self, old_name, new_name):
+        """ Move a user's digest after they are renamed in the store. """
+        with self._lock:
+            if self._digests is not None and old_name in self._digests:
+                self._digests[new_name] = self._digests.pop(old_name)
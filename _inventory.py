@@ -0,0 +1,274 @@
+# ===================================
+# Filename: _inventory.py
+# Purpose: To keep the stock of the shop items in the virtual-world program.
+#
+#
+# virtual-world
+# Copyright (C) 2017  Joshua Peter Booth
+#
+# This file is part of virtual-world.
+#
+# virtual-world is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# virtual-world is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with virtual-world (see LICENSE.md).
+# If not, see <http://www.gnu.org/licenses/>.
+#
+# Contact me:
+# Email: joshb00th@icloud.com
+# ===================================
+
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+
+from _log import logger
+from _writer import DurableWriter
+
+
+class Inventory:
+    compact_size = 1 << 20  # Journal size (bytes) that triggers compaction
+
+    def __init__(self, stock_path, journal_path, writer=None, stripes=16,
+                 hold=300):
+        """
+        The units in stock of each shop item, with units held for the orders
+        being paid for.
+
+        Stock is read from the stock file as 'shop/item:units' lines, and
+        items that are not in it are unlimited. Every change is appended to
+        the journal file as a 'shop/item:change' line, which is folded back
+        into the stock file when it passes compact_size.
+
+        Each item is guarded by one of stripes locks, chosen by its name, so
+        orders for different items never wait on each other and an order
+        for several items takes their locks in a fixed order. A reservation
+        holds its units until it is committed or released, or for hold
+        seconds, after which they go back on sale.
+
+        :param stock_path: the stock file (str).
+        :param journal_path: the stock journal (str).
+        :param writer: commits the files (DurableWriter).
+        :param stripes: the number of item locks (int).
+        :param hold: seconds a reservation holds its units (int).
+        """
+        self.stock_path = stock_path
+        self.journal_path = journal_path
+        self.writer = writer or DurableWriter()
+        self.hold = hold
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._load_lock = threading.Lock()
+        self._journal_lock = threading.Lock()
+        self._stock = None  # shop/item -> units in stock
+        self._held = {}  # shop/item -> units reserved
+        self._holds = {}  # Reservation -> {shop/item: units}
+        self._expiries = deque()  # (expiry time, reservation), oldest first
+        self._numbers = itertools.count(1)
+        self._journal_size = 0
+        self._compacting = False
+
+    @staticmethod
+    def sku(shop, item):
+        """ Get the stock file name of a shop's item (str). """
+        return shop + '/' + item
+
+    def _load(self):
+        """ Read the stock file and fold the journal into it. """
+        stock = {}
+        journalled = False
+        for path in (self.stock_path, self.journal_path):
+            try:
+                lines = self.writer.read_records(path)
+            except FileNotFoundError:
+                continue
+            for line in lines:
+                if line:
+                    _sku, _units = line.rsplit(':', 1)
+                    stock[_sku] = stock.get(_sku, 0) + int(_units)
+                    journalled = path == self.journal_path
+        self._stock = stock
+        if journalled:
+            self._save()
+        logger.debug("Loaded the stock of {} items.".format(len(stock)))
+
+    def _loaded(self):
+        """ Get the stock, loading it on first use (dict). """
+        if self._stock is None:
+            with self._load_lock:
+                if self._stock is None:
+                    self._load()
+        return self._stock
+
+    def _save(self):
+        """ Write the stock file and empty the journal. """
+        with self.writer.group():
+            self.writer.replace(self.stock_path, ''.join(
+                '{}:{}\n'.format(sku, units)
+                for sku, units in sorted(self._stock.items())))
+            self.writer.replace(self.journal_path, '')
+        self._journal_size = 0
+
+    def _locked(self, skus):
+        """ Take the locks of some items, always in the same order. """
+        stack = ExitStack()
+        for number in sorted({hash(sku) % len(self._locks) for sku in skus}):
+            stack.enter_context(self._locks[number])
+        return stack
+
+    def _append(self, changes):
+        """ Journal {shop/item: change} while holding the items' locks. """
+        record = ''.join('{}:{}\n'.format(sku, units)
+                         for sku, units in changes.items())
+        self.writer.append(self.journal_path, record)
+        with self._journal_lock:
+            self._journal_size += len(record)
+            if self._journal_size <= self.compact_size or self._compacting:
+                return
+            self._compacting = True
+        threading.Thread(target=self.compact, daemon=True).start()
+
+    def compact(self):
+        """ Fold the journal into a new stock file. """
+        try:
+            with self._locked(self._loaded()):
+                self._save()
+            logger.debug("Compacted '{}'.".format(self.journal_path))
+        finally:
+            self._compacting = False
+
+    def available(self, shop, item):
+        """
+        Get the units of an item that can still be ordered.
+
+        :param shop: the shop's name (str).
+        :param item: the item's name (str).
+        :return: the units (int) or None if the item is unlimited.
+        """
+        sku = self.sku(shop, item)
+        stock = self._loaded()
+        if sku not in stock:
+            return None
+        with self._locked((sku,)):
+            return max(0, stock[sku] - self._held.get(sku, 0))
+
+    def reserve(self, shop, lines):
+        """
+        Hold the units of an order, either all of them or none.
+
+        :param shop: the shop's name (str).
+        :param lines: (item, units) for each item ordered (iterable of tuple).
+        :return: the reservation number (int) or "out_of_stock" (str).
+        """
+        return self.reserve_many({shop: lines})
+
+    def reserve_many(self, orders):
+        """
+        Hold the units of orders from several shops under one reservation,
+        either all of them or none.
+
+        :param orders: shop name -> (item, units) for each item ordered
+                       (dict).
+        :return: the reservation number (int) or "out_of_stock" (str).
+        """
+        self.expire()
+        stock = self._loaded()
+        wanted = {}
+        for shop, lines in orders.items():
+            for item, units in lines:
+                sku = self.sku(shop, item)
+                if sku in stock and units > 0:
+                    wanted[sku] = wanted.get(sku, 0) + units
+        with self._locked(wanted):
+            for sku, units in wanted.items():
+                if stock[sku] - self._held.get(sku, 0) < units:
+                    logger.info("Not enough '{}' in stock.".format(sku))
+                    return "out_of_stock"
+            for sku, units in wanted.items():
+                self._held[sku] = self._held.get(sku, 0) + units
+        reservation = next(self._numbers)
+        self._holds[reservation] = wanted
+        self._expiries.append((time.time() + self.hold, reservation))
+        return reservation
+
+    def commit(self, reservation):
+        """
+        Take a reservation's units out of stock.
+
+        :param reservation: the reservation number (int).
+        :return: True - If the units were taken (bool).
+                 False - If the reservation had expired or was already
+                         committed or released (bool).
+        """
+        wanted = self._holds.pop(reservation, None)  # Only one caller wins
+        if wanted is None:
+            return False
+        stock = self._loaded()
+        with self._locked(wanted):
+            for sku, units in wanted.items():
+                self._held[sku] -= units
+                stock[sku] -= units
+            if wanted:
+                self._append({sku: -units for sku, units in wanted.items()})
+        return True
+
+    def release(self, reservation):
+        """
+        Put a reservation's units back on sale, if it still holds them.
+
+        :param reservation: the reservation number (int).
+        """
+        wanted = self._holds.pop(reservation, None)
+        if not wanted:
+            return
+        with self._locked(wanted):
+            for sku, units in wanted.items():
+                self._held[sku] -= units
+
+    def restock(self, shop, lines):
+        """
+        Add units to the stock of items that are not unlimited.
+
+        :param shop: the shop's name (str).
+        :param lines: (item, units) for each item (iterable of tuple).
+        """
+        stock = self._loaded()
+        changes = {}
+        for item, units in lines:
+            sku = self.sku(shop, item)
+            if sku in stock and units:
+                changes[sku] = changes.get(sku, 0) + units
+        with self._locked(changes):
+            for sku, units in changes.items():
+                stock[sku] += units
+            if changes:
+                self._append(changes)
+
+    def expire(self, now=None):
+        """
+        Release the reservations that have held their units for too long.
+
+        :param now: seconds since the epoch, or None for now (float).
+        """
+        if now is None:
+            now = time.time()
+        while self._expiries and self._expiries[0][0] <= now:
+            try:
+                expires, reservation = self._expiries.popleft()
+            except IndexError:  # Another thread took the last one
+                return
+            if expires > now:  # Another thread took the one checked
+                self._expiries.appendleft((expires, reservation))
+                return
+            if reservation in self._holds:
+                logger.info("Reservation {} expired.".format(reservation))
+                self.release(reservation)
@@ -0,0 +1,172 @@
+# ===================================
+# Filename: _ledger.py
+# Purpose: To make the withdrawals of the virtual-world program safe to
+#          repeat.
+#
+#
+# virtual-world
+# Copyright (C) 2017  Joshua Peter Booth
+#
+# This file is part of virtual-world.
+#
+# virtual-world is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# virtual-world is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with virtual-world (see LICENSE.md).
+# If not, see <http://www.gnu.org/licenses/>.
+#
+# Contact me:
+# Email: joshb00th@icloud.com
+# ===================================
+
+import threading
+import time
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+
+from _log import logger
+from _writer import DurableWriter
+
+
+class Withdrawal(namedtuple('Withdrawal', 'status balance transaction')):
+    """
+    The result of a withdrawal: its status ('ok', 'inadequate_funds' or
+    'error'), the balance it left (str, or None unless it is 'ok') and its
+    transaction ID (str).
+    """
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        """ Whether the money was withdrawn (bool). """
+        return self.status == "ok"
+
+
+class TransactionLog:
+
+    def __init__(self, path, writer=None, stripes=16, keep_days=7):
+        """
+        The result of every withdrawal made with a transaction ID, so making
+        it again gives back the first result instead of withdrawing twice.
+        A transaction ID reused for another user or amount gets an 'error'.
+
+        Results are appended to the log file as
+        'time,transaction,status,balance,cents,username' records and looked
+        up in memory, so a repeat never reads the user store. Each
+        transaction ID is guarded by one of stripes locks, so the same
+        withdrawal made twice at once still only runs once. Results older
+        than keep_days are dropped when the log is loaded.
+
+        :param path: the log file (str).
+        :param writer: commits the file (DurableWriter).
+        :param stripes: the number of transaction locks (int).
+        :param keep_days: days a result is kept for (int).
+        """
+        self.path = path
+        self.writer = writer or DurableWriter()
+        self.keep_days = keep_days
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._load_lock = threading.Lock()
+        self._results = None  # Transaction -> (time, request, Withdrawal)
+
+    @staticmethod
+    def new_id():
+        """ Get a new unique transaction ID (str). """
+        return uuid.uuid4().hex
+
+    def _line(self, when, request, result):
+        """ Get the log file record for one result (str). """
+        username, cents = request or ('', '')
+        return '{:.3f},{},{},{},{},{}\n'.format(
+            when, result.transaction, result.status, result.balance or '',
+            cents, username)
+
+    def _load(self):
+        """ Read the log file, dropping the results that are too old. """
+        results = {}
+        try:
+            lines = self.writer.read_records(self.path)
+        except FileNotFoundError:
+            lines = []
+        cutoff = time.time() - self.keep_days * 86400
+        for line in lines:
+            if line:
+                fields = line.split(',', 5)
+                if len(fields) == 4:  # Logged before requests were kept
+                    fields += ['', '']
+                _time, _transaction, _status, _balance, _cents, _user = fields
+                if float(_time) >= cutoff:
+                    request = (_user, int(_cents)) if _cents else None
+                    results[_transaction] = (
+                        float(_time), request,
+                        Withdrawal(_status, _balance or None, _transaction))
+        self._results = results
+        if len(results) < len(lines):
+            self.writer.replace(self.path, ''.join(
+                self._line(*entry)
+                for entry in sorted(results.values(),
+                                    key=lambda entry: entry[0])))
+        logger.debug("Loaded {} transaction results.".format(len(results)))
+
+    def _loaded(self):
+        """ Get the results, loading them on first use (dict). """
+        if self._results is None:
+            with self._load_lock:
+                if self._results is None:
+                    self._load()
+        return self._results
+
+    def get(self, transaction):
+        """
+        Get the result of a transaction.
+
+        :param transaction: the transaction ID (str).
+        :return: the result (Withdrawal) or None if it has not run.
+        """
+        entry = self._loaded().get(transaction)
+        return None if entry is None else entry[2]
+
+    @contextmanager
+    def claim(self, transaction, username, cents):
+        """
+        Run the enclosed block as the only one for a transaction.
+
+        :param transaction: the transaction ID (str).
+        :param username: the user the withdrawal is for (str).
+        :param cents: the amount withdrawn in cents (int).
+        :return: the result of the transaction if it has already run
+                 (Withdrawal), an 'error' result if it ran for another user
+                 or amount, or None if the block should run it.
+        """
+        with self._locks[hash(transaction) % len(self._locks)]:
+            entry = self._loaded().get(transaction)
+            if entry is None:
+                yield None
+            elif entry[1] not in (None, (username, cents)):
+                logger.warning("Transaction {} was reused for another "
+                               "withdrawal.".format(transaction))
+                yield Withdrawal("error", None, transaction)
+            else:
+                yield entry[2]
+
+    def record(self, result, username, cents):
+        """
+        Keep the result of a transaction, from inside claim().
+
+        :param result: the result (Withdrawal).
+        :param username: the user the withdrawal was for (str).
+        :param cents: the amount withdrawn in cents (int).
+        """
+        when = time.time()
+        request = (username, cents)
+        self._loaded()[result.transaction] = (when, request, result)
+        self.writer.append(self.path, self._line(when, request, result))
@@ -0,0 +1,370 @@
+# ===================================
+# Filename: _report.py
+# Purpose: To build sales reports from the order history of the
+#          virtual-world program.
+#
+#
+# virtual-world
+# Copyright (C) 2017  Joshua Peter Booth
+#
+# This file is part of virtual-world.
+#
+# virtual-world is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# virtual-world is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with virtual-world (see LICENSE.md).
+# If not, see <http://www.gnu.org/licenses/>.
+#
+# Contact me:
+# Email: joshb00th@icloud.com
+# ===================================
+
+import csv
+import io
+import json
+import os
+import time
+from array import array
+
+from _log import logger
+from _store import format_cents
+from _writer import DurableWriter
+
+try:
+    import numpy
+except ImportError:  # Group totals fall back to plain loops
+    numpy = None
+
+# The age brackets of User.create_balance, ages on a boundary get the default
+AGE_BRACKETS = ('under 15', '15 to 20', '20 to 40', '40 to 60', '60 to 80',
+                'over 80', 'other', 'unknown')
+
+
+def age_bracket(age):
+    """
+    Find the position in AGE_BRACKETS of an age.
+
+    :param age: the user's age in years (str).
+    :return: the bracket's position (int).
+    """
+    try:
+        age = int(age)
+    except (TypeError, ValueError):
+        return 7  # Unknown
+    if age > 80:
+        return 5
+    elif 80 > age > 60:
+        return 4
+    elif 60 > age > 40:
+        return 3
+    elif 40 > age > 20:
+        return 2
+    elif 20 > age > 15:
+        return 1
+    elif age < 15:
+        return 0
+    return 6  # On a boundary
+
+
+def group_sum(codes, size, weights=None):
+    """
+    Count, or sum the weights of, the rows with each code.
+
+    :param codes: each row's code, from 0 to size - 1 (array).
+    :param size: the number of codes (int).
+    :param weights: each row's weight, or None to count the rows (array).
+    :return: the total for each code (list).
+    """
+    if numpy is not None:
+        sums = numpy.bincount(
+            numpy.asarray(codes, dtype=numpy.int64),
+            None if weights is None else numpy.asarray(weights),
+            minlength=size)
+        return numpy.rint(sums).astype(numpy.int64).tolist()
+    sums = [0] * size
+    if weights is None:
+        for code in codes:
+            sums[code] += 1
+    else:
+        for code, weight in zip(codes, weights):
+            sums[code] += weight
+    return sums
+
+
+class SalesReport:
+    chunk_size = 65536  # Orders read into the column arrays at a time
+
+    def __init__(self, history_path, start, end, age_of=None, writer=None):
+        """
+        Sales totals for the orders recorded from start up to end.
+
+        The order history is read in chunks of chunk_size orders, with each
+        chunk's orders and order lines turned into columns of codes and
+        numbers in arrays, and each column then totalled per shop, item,
+        age bracket and hour in one pass (with numpy.bincount if numpy is
+        installed). Only the current chunk and the totals are kept, so the
+        memory used does not grow with the size of the history.
+
+        Orders are totalled per buyer and only put in age brackets once the
+        rest of the history has been scanned for renames, so an order made
+        before its buyer was renamed still finds their age.
+
+        :param history_path: the order history file (str).
+        :param start: the first second covered, since the epoch (float).
+        :param end: the second after the last one covered (float).
+        :param age_of: gets a user's age from their username, raising
+                       KeyError for an unknown user (function).
+        :param writer: commits the report files (DurableWriter).
+        """
+        self.history_path = history_path
+        self.start = start
+        self.end = end
+        self.age_of = age_of
+        self.writer = writer or DurableWriter()
+        self._offset = time.localtime(start).tm_gmtoff  # For the hours
+        self._brackets = {}  # Username -> bracket
+        self.users = []  # Each buyer's username, as renamed since
+        self._user_codes = {}  # Username -> code of their next orders
+        self._codes_of = {}  # Username -> codes of the buyers it now names
+        self.user_orders, self.user_cents = [], []
+        self.shops = []
+        self.items = []  # (shop, item)
+        self._shop_codes = {}
+        self._item_codes = {}
+        self.shop_orders, self.shop_amounts, self.shop_cents = [], [], []
+        self.item_amounts, self.item_cents = [], []
+        self.bracket_orders = [0] * len(AGE_BRACKETS)
+        self.bracket_cents = [0] * len(AGE_BRACKETS)
+        self.hour_orders, self.hour_amounts = [0] * 24, [0] * 24
+        self._clear()
+
+    def _clear(self):
+        """ Start a new chunk. """
+        self._order_times = array('d')
+        self._order_shops = array('q')
+        self._order_users = array('q')
+        self._order_amounts = array('q')
+        self._order_cents = array('q')
+        self._line_items = array('q')
+        self._line_amounts = array('q')
+        self._line_cents = array('q')
+
+    def _code(self, codes, names, name):
+        """ Get the code of a shop or item, giving new ones the next code. """
+        code = codes.get(name)
+        if code is None:
+            code = codes[name] = len(names)
+            names.append(name)
+        return code
+
+    def _bracket(self, username):
+        """ Get a user's age bracket, looking each user up once (int). """
+        bracket = self._brackets.get(username)
+        if bracket is None:
+            try:
+                age = self.age_of(username) if self.age_of else None
+            except KeyError:  # Deleted or a guest
+                age = None
+            bracket = self._brackets[username] = age_bracket(age)
+        return bracket
+
+    def _user(self, username):
+        """ Get the code of the buyer whose orders are under a username. """
+        code = self._user_codes.get(username)
+        if code is None:
+            code = self._user_codes[username] = len(self.users)
+            self.users.append(username)
+            self._codes_of.setdefault(username, []).append(code)
+        return code
+
+    def _rename(self, old_name, new_name):
+        """
+        Move the buyers under a username to its new one. Later orders under
+        the old username are someone else's, so they get a new code.
+        """
+        codes = self._codes_of.pop(old_name, [])
+        for code in codes:
+            self.users[code] = new_name
+        self._codes_of.setdefault(new_name, []).extend(codes)
+        self._user_codes.pop(old_name, None)
+
+    def _seek(self, file):
+        """
+        Move to just before the first order at start. The history is in the
+        order it was recorded, so this is a binary search of the file.
+        """
+        low, high = 0, os.fstat(file.fileno()).st_size
+        while high - low > 65536:
+            middle = (low + high) // 2
+            file.seek(middle)
+            file.readline()  # The rest of a cut line
+            line = file.readline()
+            if not line.endswith(b'\n') or \
+                    json.loads(line.decode('utf-8'))['time'] >= self.start:
+                high = middle
+            else:
+                low = middle
+        file.seek(low)
+        if low:
+            file.readline()
+
+    def _add(self, record):
+        """ Add one order to the chunk. """
+        shop = self._code(self._shop_codes, self.shops, record["shop"])
+        amounts = 0
+        for item, amount, cents in record["items"]:
+            self._line_items.append(
+                self._code(self._item_codes, self.items,
+                           (record["shop"], item)))
+            self._line_amounts.append(amount)
+            self._line_cents.append(cents)
+            amounts += amount
+        self._order_times.append(record["time"])
+        self._order_shops.append(shop)
+        self._order_users.append(self._user(record["user"]))
+        self._order_amounts.append(amounts)
+        self._order_cents.append(record["total"])
+
+    @staticmethod
+    def _merge(totals, sums):
+        """ Add a chunk's group totals into the report's. """
+        totals.extend([0] * (len(sums) - len(totals)))
+        for code, value in enumerate(sums):
+            totals[code] += value
+
+    def _flush(self):
+        """ Total the chunk's columns into the report. """
+        if not self._order_times:
+            return
+        if numpy is not None:
+            hours = ((numpy.asarray(self._order_times) + self._offset) //
+                     3600 % 24).astype(numpy.int64)
+        else:
+            hours = array('q', [int((when + self._offset) // 3600 % 24)
+                                for when in self._order_times])
+        shops, items, users = len(self.shops), len(self.items), \
+            len(self.users)
+        for totals, codes, size, weights in (
+                (self.shop_orders, self._order_shops, shops, None),
+                (self.shop_amounts, self._order_shops, shops,
+                 self._order_amounts),
+                (self.shop_cents, self._order_shops, shops,
+                 self._order_cents),
+                (self.item_amounts, self._line_items, items,
+                 self._line_amounts),
+                (self.item_cents, self._line_items, items, self._line_cents),
+                (self.user_orders, self._order_users, users, None),
+                (self.user_cents, self._order_users, users,
+                 self._order_cents),
+                (self.hour_orders, hours, 24, None),
+                (self.hour_amounts, hours, 24, self._order_amounts)):
+            self._merge(totals, group_sum(codes, size, weights))
+        self._clear()
+
+    def build(self):
+        """
+        Read the orders from start up to end into the report.
+
+        :return: the number of orders read (int).
+        """
+        orders = 0
+        past_end = False
+        try:
+            file = open(self.history_path, 'rb')
+        except FileNotFoundError:
+            return orders
+        with file:
+            self._seek(file)
+            for line in file:
+                if not line.endswith(b'\n'):  # Cut short by a crash
+                    break
+                if past_end and b'"rename"' not in line:
+                    continue  # Only renames matter after end
+                record = json.loads(line.decode('utf-8'))
+                if "rename" in record:
+                    self._rename(*record["rename"])
+                elif record["time"] >= self.end:
+                    past_end = True
+                elif record["time"] >= self.start:
+                    self._add(record)
+                    orders += 1
+                    if len(self._order_times) >= self.chunk_size:
+                        self._flush()
+        self._flush()
+        for code, username in enumerate(self.users):
+            bracket = self._bracket(username)
+            self.bracket_orders[bracket] += self.user_orders[code]
+            self.bracket_cents[bracket] += self.user_cents[code]
+        logger.debug("Built a sales report of {} orders.".format(orders))
+        return orders
+
+    def results(self):
+        """
+        Get the report's totals.
+
+        :return: the totals, with money in cents (dict).
+        """
+        return {
+            "start": self.start, "end": self.end,
+            "orders": sum(self.shop_orders),
+            "items": sum(self.shop_amounts),
+            "cents": sum(self.shop_cents),
+            "shops": {shop: {"orders": self.shop_orders[code],
+                             "items": self.shop_amounts[code],
+                             "cents": self.shop_cents[code]}
+                      for code, shop in enumerate(self.shops)},
+            "items_sold": [{"shop": shop, "item": item,
+                            "items": self.item_amounts[code],
+                            "cents": self.item_cents[code]}
+                           for code, (shop, item) in enumerate(self.items)],
+            "age_brackets": {bracket: {"orders": self.bracket_orders[code],
+                                       "cents": self.bracket_cents[code]}
+                             for code, bracket in enumerate(AGE_BRACKETS)},
+            "hours": [{"hour": hour, "orders": self.hour_orders[hour],
+                       "items": self.hour_amounts[hour]}
+                      for hour in range(24)]}
+
+    def rows(self):
+        """
+        Get the report as table rows, revenue in dollars.
+
+        :return: [group, name, orders, items, revenue] rows after a header
+                 row (list of list).
+        """
+        rows = [['group', 'name', 'orders', 'items', 'revenue']]
+        rows.extend(['shop', shop, self.shop_orders[code],
+                     self.shop_amounts[code],
+                     format_cents(self.shop_cents[code])]
+                    for code, shop in enumerate(self.shops))
+        rows.extend(['item', shop + '/' + item, '', self.item_amounts[code],
+                     format_cents(self.item_cents[code])]
+                    for code, (shop, item) in enumerate(self.items))
+        rows.extend(['age', bracket, self.bracket_orders[code], '',
+                     format_cents(self.bracket_cents[code])]
+                    for code, bracket in enumerate(AGE_BRACKETS))
+        rows.extend(['hour', '{:02d}:00'.format(hour), self.hour_orders[hour],
+                     self.hour_amounts[hour], '']
+                    for hour in range(24))
+        return rows
+
+    def write(self, path):
+        """
+        Write the report to path + '.csv' and path + '.json'.
+
+        :param path: the report files' path without an extension (str).
+        """
+        table = io.StringIO()
+        csv.writer(table, lineterminator='\n').writerows(self.rows())
+        with self.writer.group():
+            self.writer.replace(path + '.csv', table.getvalue())
+            self.writer.replace(path + '.json', json.dumps(
+                self.results(), indent=4, sort_keys=True))
+        logger.info("Wrote the sales report '{}'.".format(path))
@@ -0,0 +1,245 @@
+# ===================================
+# Filename: _sales.py
+# Purpose: To keep the order history and sales totals of the shops in the
+#          virtual-world program.
+#
+#
+# virtual-world
+# Copyright (C) 2017  Joshua Peter Booth
+#
+# This file is part of virtual-world.
+#
+# virtual-world is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# virtual-world is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with virtual-world (see LICENSE.md).
+# If not, see <http://www.gnu.org/licenses/>.
+#
+# Contact me:
+# Email: joshb00th@icloud.com
+# ===================================
+
+import atexit
+import json
+import os
+import threading
+import time
+
+from _log import logger
+from _writer import DurableWriter
+
+
+class SalesLedger:
+
+    def __init__(self, history_path, totals_path, writer=None,
+                 snapshot_every=100, keep_days=30):
+        """
+        Every completed shop order, with sales totals kept up to date as
+        each one is recorded.
+
+        Orders are appended to the order history file as JSON lines. The
+        totals for each item, shop and user, and each item's sales for
+        every recent day, are updated with every order and saved to the
+        totals file along with the size of the order history they include,
+        so loading seeks past those orders and only replays the ones
+        recorded since the last save, and a report never reads the order
+        history.
+
+        :param history_path: the order history file (str).
+        :param totals_path: the sales totals file (str).
+        :param writer: commits the files (DurableWriter).
+        :param snapshot_every: orders recorded between saves of the totals
+                               (int).
+        :param keep_days: days of daily item sales kept (int).
+        """
+        self.history_path = history_path
+        self.totals_path = totals_path
+        self.writer = writer or DurableWriter()
+        self.snapshot_every = snapshot_every
+        self.keep_days = keep_days
+        self._lock = threading.RLock()
+        self._totals = None
+        self._unsaved = 0
+        atexit.register(self.save)
+
+    @staticmethod
+    def _empty():
+        """ Get the totals of an empty history (dict). """
+        return {"offset": 0,  # Order history bytes included
+                "items": {},   # shop -> item -> [amount, cents]
+                "shops": {},   # shop -> [orders, amount, cents]
+                "users": {},   # username -> [orders, cents]
+                "days": {}}    # YYYY-MM-DD -> shop -> item -> amount
+
+    def _load(self):
+        """ Load the saved totals and replay any newer orders into them. """
+        try:
+            totals = json.loads(self.writer.read(self.totals_path))
+        except (FileNotFoundError, ValueError):
+            totals = self._empty()
+        if "offset" not in totals:  # Saved by an older version
+            totals = self._empty()
+        self._totals = totals
+        replayed = 0
+        partial = False
+        try:
+            file = open(self.history_path, 'rb')
+        except FileNotFoundError:
+            file = None
+        if file is not None:
+            with file:
+                offset = totals["offset"]
+                if offset:
+                    file.seek(offset - 1)
+                    if file.read(1) != b'\n':  # History replaced, start over
+                        totals = self._totals = self._empty()
+                        file.seek(0)
+                for line in file:
+                    if not line.endswith(b'\n'):  # Cut short by a crash
+                        partial = True
+                    elif line.strip():
+                        self._apply(json.loads(line.decode('utf-8')))
+                        replayed += 1
+        if partial:  # Cut it off the file too, once it is closed
+            self.writer.read_records(self.history_path)
+        self._unsaved = replayed
+        logger.debug("Loaded the sales totals, replaying {} orders.".format(
+            replayed))
+
+    def _loaded(self):
+        """ Get the totals, loading them on first use (dict). """
+        if self._totals is None:
+            self._load()
+        return self._totals
+
+    def _apply(self, record):
+        """ Add one order history record to the totals. """
+        totals = self._totals
+        if "rename" in record:
+            old_name, new_name = record["rename"]
+            if old_name in totals["users"]:
+                totals["users"][new_name] = totals["users"].pop(old_name)
+            return
+        shop = record["shop"]
+        user = totals["users"].setdefault(record["user"], [0, 0])
+        user[0] += 1
+        user[1] += record["total"]
+        shop_totals = totals["shops"].setdefault(shop, [0, 0, 0])
+        shop_totals[0] += 1
+        items = totals["items"].setdefault(shop, {})
+        day = time.strftime('%Y-%m-%d', time.localtime(record["time"]))
+        if day not in totals["days"]:
+            totals["days"][day] = {}
+            for old_day in sorted(totals["days"])[:-self.keep_days]:
+                del totals["days"][old_day]
+        day_items = totals["days"].get(day, {}).setdefault(shop, {})
+        for item, amount, cents in record["items"]:
+            item_totals = items.setdefault(item, [0, 0])
+            item_totals[0] += amount
+            item_totals[1] += cents
+            shop_totals[1] += amount
+            shop_totals[2] += cents
+            day_items[item] = day_items.get(item, 0) + amount
+
+    def _append(self, record):
+        """ Write a record to the order history and add it to the totals. """
+        with self._lock:
+            self._loaded()
+            self.writer.append(self.history_path,
+                               json.dumps(record, sort_keys=True) + '\n')
+            self._apply(record)
+            self._unsaved += 1
+            if self._unsaved >= self.snapshot_every:
+                self.save()
+
+    def record(self, shop, username, lines, when=None):
+        """
+        Record a completed order.
+
+        :param shop: the shop's name (str).
+        :param username: the buyer's login name (str).
+        :param lines: (item, amount, cost in cents) for each item bought
+                      (iterable of tuple).
+        :param when: seconds since the epoch, or None for now (float).
+        """
+        items = [[item, amount, cents] for item, amount, cents in lines]
+        self._append({"time": round(time.time() if when is None else when,
+                                    3),
+                      "shop": shop, "user": username, "items": items,
+                      "total": sum(cents for _, _, cents in items)})
+
+    def rename(self, old_name, new_name):
+        """ Move a user's sales totals to their new username. """
+        self._append({"time": round(time.time(), 3),
+                      "rename": [old_name, new_name]})
+
+    def save(self):
+        """ Save the totals now. """
+        with self._lock:
+            if self._totals is None or not self._unsaved:
+                return
+            self.writer.flush()  # So the order history's size includes them
+            self._totals["offset"] = os.path.getsize(self.history_path)
+            self.writer.replace(self.totals_path,
+                                json.dumps(self._totals, sort_keys=True))
+            self._unsaved = 0
+
+    def top_sellers(self, day=None, shop=None, count=10):
+        """
+        Get the items sold the most on one day.
+
+        :param day: the day as YYYY-MM-DD, or None for today (str).
+        :param shop: only count this shop's items, or None for every shop
+                     (str).
+        :param count: the number of items to give (int).
+        :return: (shop, item, amount) from the most sold down (list).
+        """
+        if day is None:
+            day = time.strftime('%Y-%m-%d')
+        with self._lock:
+            sales = self._loaded()["days"].get(day, {})
+            ranked = [(amount, name, item)
+                      for name, items in sales.items()
+                      if shop is None or name == shop
+                      for item, amount in items.items()]
+        ranked.sort(key=lambda sale: (-sale[0], sale[1], sale[2]))
+        return [(name, item, amount) for amount, name, item in ranked[:count]]
+
+    def item_totals(self, shop):
+        """
+        Get the all-time sales of each of a shop's items.
+
+        :param shop: the shop's name (str).
+        :return: item -> (amount, cents) (dict).
+        """
+        with self._lock:
+            return {item: tuple(totals) for item, totals in
+                    self._loaded()["items"].get(shop, {}).items()}
+
+    def shop_totals(self, shop):
+        """
+        Get a shop's all-time sales.
+
+        :param shop: the shop's name (str).
+        :return: (orders, items sold, cents) (tuple).
+        """
+        with self._lock:
+            return tuple(self._loaded()["shops"].get(shop, (0, 0, 0)))
+
+    def user_totals(self, username):
+        """
+        Get a user's all-time spending.
+
+        :param username: user's login name (str).
+        :return: (orders, cents) (tuple).
+        """
+        with self._lock:
+            return tuple(self._loaded()["users"].get(username, (0, 0)))
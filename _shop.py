@@ -0,0 +1,400 @@
+# ===================================
+# Filename: _shop.py
+# Purpose: To model the orders placed in the shops of the virtual-world
+#          program.
+#
+#
+# virtual-world
+# Copyright (C) 2017  Joshua Peter Booth
+#
+# This file is part of virtual-world.
+#
+# virtual-world is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# virtual-world is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with virtual-world (see LICENSE.md).
+# If not, see <http://www.gnu.org/licenses/>.
+#
+# Contact me:
+# Email: joshb00th@icloud.com
+# ===================================
+
+import hashlib
+import json
+import threading
+from array import array
+from collections import OrderedDict
+
+from _log import logger
+from _store import parse_cents, path_stamp
+from _writer import DurableWriter
+
+try:
+    import numpy
+except ImportError:  # Line totals fall back to array
+    numpy = None
+
+
+def format_price(cents):
+    """
+    Convert a whole number of cents to a price label, e.g. $3.50.
+
+    :param cents: the price in cents (int).
+    :return: the price label (str).
+    """
+    return '${}.{:02d}'.format(*divmod(cents, 100))
+
+
+class Catalog:
+
+    def __init__(self, name, items, heading="Menu", kind="item", limit=9):
+        """
+        A shop's items compiled into a price table.
+
+        Items keep their menu order in parallel columns, with every price
+        held as whole cents in an array('q') and a dict from item to its
+        position, so finding an item's price is one lookup however many
+        items the shop sells.
+
+        :param name: the shop's name (str).
+        :param items: (item, label, price in dollars) triples in menu order
+                      (list).
+        :param heading: the title shown above the items (str).
+        :param kind: what the shop sells, as in "Maximum of 9 of each coffee
+                     type." (str).
+        :param limit: the most of each item one order can have (int).
+        :raise: ValueError: Catalog not valid!
+        """
+        self.name = name
+        self.heading = heading
+        self.kind = kind
+        self.limit = limit
+        self.items = [item for item, _, _ in items]
+        self.labels = [label for _, label, _ in items]
+        self.prices = array('q', [parse_cents(price) for _, _, price in items])
+        self.index = {item: position
+                      for position, item in enumerate(self.items)}
+        if len(self.index) != len(self.items) or 'total' in self.index or \
+                limit < 1:
+            raise ValueError("Catalog not valid!")
+
+    def __len__(self):
+        return len(self.items)
+
+    def price(self, item):
+        """ Get an item's price, in cents (int). """
+        return self.prices[self.index[item]]
+
+    def line_totals(self, amounts):
+        """
+        Multiply every amount by its item's price in one pass.
+
+        :param amounts: the amount of each item in menu order (array).
+        :return: the cost of each item in cents (list).
+        """
+        if numpy is not None and len(self):
+            return (numpy.frombuffer(amounts, dtype=numpy.int64) *
+                    numpy.frombuffer(self.prices, dtype=numpy.int64)).tolist()
+        return [amount * price for amount, price in zip(amounts, self.prices)]
+
+
+class CatalogFile:
+    cache_size = 8  # Parsed versions of the file kept in memory
+
+    def __init__(self, path):
+        """
+        Every shop's catalog, read from a JSON file of the form
+        {"coffee": {"heading": ..., "kind": ..., "limit": ...,
+                    "items": [[item, label, price], ...]}, ...}.
+
+        The file is only re-read when its mtime or size changes, and only
+        re-parsed when its contents hash to a version not seen before, so
+        asking for a catalog is normally one stat() call. An edit that does
+        not parse is logged and the catalogs from before it are kept.
+
+        :param path: the catalog file (str).
+        """
+        self.path = path
+        self._lock = threading.RLock()
+        self._stamp = None
+        self._digest = None
+        self._catalogs = None
+        self._parsed = OrderedDict()  # Contents hash -> catalogs
+
+    @staticmethod
+    def parse(data):
+        """
+        Build the catalogs from the catalog file's contents.
+
+        :param data: the catalog file (bytes).
+        :return: shop name -> Catalog (dict).
+        :raise: ValueError: If the contents are not a valid catalog file.
+        """
+        try:
+            return {name: Catalog(name, [(item, label, price) for
+                                         item, label, price in shop['items']],
+                                  shop.get('heading', "Menu"),
+                                  shop.get('kind', "item"),
+                                  int(shop.get('limit', 9)))
+                    for name, shop in json.loads(data.decode('utf-8')).items()}
+        except (KeyError, TypeError, AttributeError, ArithmeticError) as error:
+            raise ValueError(error)
+
+    def _reload(self, stamp):
+        """ Pick up the file's contents if they have changed. """
+        self._stamp = stamp
+        try:
+            with open(self.path, 'rb') as file:
+                data = file.read()
+            digest = hashlib.sha256(data).hexdigest()
+            if digest == self._digest:
+                return
+            catalogs = self._parsed.get(digest)
+            if catalogs is None:
+                catalogs = self.parse(data)
+                self._parsed[digest] = catalogs
+                if len(self._parsed) > self.cache_size:
+                    self._parsed.popitem(last=False)
+        except (OSError, ValueError) as error:
+            if self._catalogs is None:
+                raise ValueError("Catalog file not valid!")
+            logger.error("Keeping the old catalogs, '{}' is not valid: {}"
+                         .format(self.path, error))
+            return
+        logger.debug("Loaded the catalogs in '{}'.".format(self.path))
+        self._digest = digest
+        self._catalogs = catalogs
+
+    def catalogs(self):
+        """
+        Get every shop's catalog, reloading the file if it has changed.
+
+        :return: shop name -> Catalog (dict).
+        :raise: ValueError: Catalog file not valid!
+        """
+        with self._lock:
+            stamp = path_stamp(self.path)
+            if self._catalogs is None or stamp != self._stamp:
+                self._reload(stamp)
+            return self._catalogs
+
+    def get(self, name):
+        """
+        Get one shop's catalog, which is the same object until the file's
+        contents change.
+
+        :param name: the shop's name (str).
+        :return: the shop's catalog (Catalog).
+        :raise: KeyError: If the file has no catalog for the shop.
+        """
+        return self.catalogs()[name]
+
+
+class Order:
+
+    def __init__(self, catalog, path, writer=None, widget=None, delay=500):
+        """
+        The amount of each item in a shop order, with the number of items
+        and the total cost kept up to date as each amount changes.
+
+        The order is saved to its data file as 'item:amount' lines and a
+        'total:items' line, but only once it has stopped changing for delay
+        milliseconds, so typing an amount never waits on the disk. These
+        delayed saves are only a draft, so they are written without an
+        fsync.
+
+        :param catalog: the shop's items and prices (Catalog).
+        :param path: the shop's order data file (str).
+        :param writer: commits the file (DurableWriter).
+        :param widget: schedules the delayed save with after(), or None to
+                       save on every change (tk.Widget).
+        :param delay: milliseconds to wait for more changes (int).
+        """
+        self.catalog = catalog
+        self.amounts = array('q', [0]) * len(catalog)
+        self.path = path
+        self.writer = writer or DurableWriter()
+        self.widget = widget
+        self.delay = delay
+        self.count = 0
+        self.total = 0  # Cents
+        self._job = None
+
+    def set(self, item, amount):
+        """
+        Change the amount of one item.
+
+        :param item: the item's name (str).
+        :param amount: the new amount (int).
+        :return: True - If the amount changed (bool).
+                 False - If it was already that amount (bool).
+        """
+        position = self.catalog.index[item]
+        change = amount - self.amounts[position]
+        if not change:
+            return False
+        self.amounts[position] = amount
+        self.count += change
+        self.total += change * self.catalog.prices[position]
+        self.changed()
+        return True
+
+    def amount(self, item):
+        """ Get the amount ordered of one item (int). """
+        return self.amounts[self.catalog.index[item]]
+
+    def lines(self):
+        """
+        Get the items that have been ordered.
+
+        :return: (label, amount, cost in cents) for each item with an amount
+                 above zero, in menu order (list of tuple).
+        """
+        catalog = self.catalog
+        return [(catalog.labels[position], amount, cost)
+                for position, (amount, cost) in enumerate(zip(
+                    self.amounts, catalog.line_totals(self.amounts)))
+                if amount > 0]
+
+    def sales(self):
+        """
+        Get the order as it is kept in the order history.
+
+        :return: (item, amount, cost in cents) for each item with an amount
+                 above zero, in menu order (list of tuple).
+        """
+        catalog = self.catalog
+        return [(catalog.items[position], amount, cost)
+                for position, (amount, cost) in enumerate(zip(
+                    self.amounts, catalog.line_totals(self.amounts)))
+                if amount > 0]
+
+    def fields(self):
+        """
+        Get the order as it is saved.
+
+        :return: (item, amount) pairs then ('total', items) (list of tuple).
+        """
+        fields = [(item, str(amount))
+                  for item, amount in zip(self.catalog.items, self.amounts)]
+        fields.append(('total', str(self.count)))
+        return fields
+
+    def changed(self):
+        """ Save the order once it stops changing. """
+        if self.widget is None:
+            self.save()
+            return
+        if self._job is not None:
+            self.widget.after_cancel(self._job)
+        self._job = self.widget.after(self.delay, self._save_later)
+
+    def _save_later(self):
+        """ Save the order when the delay set by changed runs out. """
+        self._job = None
+        self.save(sync=False)
+
+    def contents(self):
+        """ Get the order as it is written to its data file (str). """
+        return '\n'.join('{}:{}'.format(item, amount)
+                         for item, amount in self.fields())
+
+    def save(self, sync=True):
+        """
+        Write the order to its data file now.
+
+        :param sync: False to skip the fsync of a draft (bool).
+        """
+        self._cancel_save()
+        self.write(self.contents(), sync)
+
+    def write(self, contents, sync=True):
+        """
+        Write given contents to the order's data file. This touches no
+        widgets, so it can run on a worker thread.
+
+        :param contents: the order as contents() gave it (str).
+        :param sync: False to skip the fsync of a draft (bool).
+        """
+        logger.debug("Writing new data to {}".format(self.path))
+        self.writer.replace(self.path, contents, sync=sync)
+
+    def _cancel_save(self):
+        """ Cancel the delayed save, if one is waiting. """
+        if self._job is not None:
+            self.widget.after_cancel(self._job)
+            self._job = None
+
+    def clear(self):
+        """
+        Empty the order without saving it.
+
+        :return: the emptied order's contents to write (str).
+        """
+        self._cancel_save()
+        self.amounts = array('q', [0]) * len(self.catalog)
+        self.count = 0
+        self.total = 0
+        return self.contents()
+
+    def reset(self):
+        """ Empty the order and save it. """
+        self.write(self.clear())
+
+
+class Cart:
+
+    def __init__(self):
+        """
+        The orders of every shop, shared by the shop pages so that one
+        checkout pays for all of them.
+        """
+        self.orders = OrderedDict()  # Shop name -> Order
+
+    def add(self, shop, order):
+        """
+        Put a shop's order in the cart, replacing any it had before.
+
+        :param shop: the shop's name (str).
+        :param order: the shop's order (Order).
+        """
+        self.orders[shop] = order
+
+    @property
+    def count(self):
+        """ The number of items in the cart (int). """
+        return sum(order.count for order in self.orders.values())
+
+    @property
+    def total(self):
+        """ The total cost of the cart, in cents (int). """
+        return sum(order.total for order in self.orders.values())
+
+    def stock(self):
+        """
+        Get the units of each item in the cart.
+
+        :return: shop name -> (item, units) for each item with units above
+                 zero (dict).
+        """
+        return {shop: [(item, units) for item, units, _ in order.sales()]
+                for shop, order in self.orders.items() if order.count}
+
+    def reset(self):
+        """
+        Empty every order in the cart, leaving them to be saved by the
+        caller.
+
+        :return: (order, contents) to write for each order that was emptied
+                 (list of tuple).
+        """
+        return [(order, order.clear()) for order in self.orders.values()
+                if order.count]
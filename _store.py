@@ -0,0 +1,1330 @@
+# ===================================
+# Filename: _store.py
+# Purpose: To provide indexed storage of user accounts to the virtual-world
+#          program.
+#
+#
+# virtual-world
+# Copyright (C) 2017  Joshua Peter Booth
+#
+# This file is part of virtual-world.
+#
+# virtual-world is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# virtual-world is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with virtual-world (see LICENSE.md).
+# If not, see <http://www.gnu.org/licenses/>.
+#
+# Contact me:
+# Email: joshb00th@icloud.com
+# ===================================
+
+import hashlib
+import hmac
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+import zlib
+from array import array
+from contextlib import contextmanager, ExitStack
+from decimal import Decimal, ROUND_HALF_UP
+
+from _log import logger
+from _writer import DurableWriter
+
+try:
+    import numpy
+except ImportError:  # The bulk balance operations fall back to array
+    numpy = None
+
+
+def path_stamp(path):
+    """
+    Get the mtime and size of a file.
+
+    :param path: the file to check (str).
+    :return: (mtime_ns, size) (tuple) or None if the file is missing.
+    """
+    if path is None:
+        return None
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def parse_cents(balance):
+    """
+    Convert a balance to a whole number of cents.
+
+    :param balance: the balance in dollars (str, int or float).
+    :return: cents (int).
+    """
+    cents = Decimal(str(balance)) * 100
+    return int(cents.to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def format_cents(cents):
+    """
+    Convert a whole number of cents to a balance string, e.g. 1000000 or
+    24899.50.
+
+    :param cents: the balance in cents (int).
+    :return: the balance in dollars (str).
+    """
+    sign = '-' if cents < 0 else ''
+    dollars, cents = divmod(abs(cents), 100)
+    if cents:
+        return '{}{}.{:02d}'.format(sign, dollars, cents)
+    return '{}{}'.format(sign, dollars)
+
+
+class StorageBackend:
+    """
+    Interface shared by the user account stores.
+
+    Records are handed out as dicts with the keys 'username', 'password',
+    'age' and 'balance' (all str), the same shape User.get_data returns.
+    """
+
+    def __contains__(self, username):
+        try:
+            self.get(username)
+        except KeyError:
+            return False
+        return True
+
+    def names(self):
+        """ Get every username in the store (list). """
+        raise NotImplementedError
+
+    def stamp(self):
+        """
+        Get a cheap fingerprint of the store's files, which changes whenever
+        they are written (tuple), or None if the store cannot provide one.
+        """
+        return None
+
+    def names_stamp(self):
+        """
+        Get a cheap fingerprint that changes whenever the set of usernames
+        may have changed, but not for balance changes (tuple), or None if
+        the store cannot provide one.
+        """
+        return self.stamp()
+
+    @property
+    def generation(self):
+        """
+        A number that changes whenever the store picks up changes made
+        outside this process, but not for its own writes (int).
+        """
+        return 0
+
+    def password_token(self, password):
+        """ Get a password in the form the store keeps it (str). """
+        return password
+
+    def get(self, username):
+        """ Get the record for username, raising KeyError if missing. """
+        raise NotImplementedError
+
+    def put(self, username, password, age, balance):
+        """ Add or replace a user's record. """
+        raise NotImplementedError
+
+    def remove(self, username):
+        """ Remove a user's record, raising KeyError if missing. """
+        raise NotImplementedError
+
+    def rename(self, old_name, new_name):
+        """ Move a user's record to a new username. """
+        user = self.get(old_name)
+        self.remove(old_name)
+        self.put(new_name, user['password'], user['age'], user['balance'])
+
+    def update(self, username, password=None, age=None, balance=None):
+        """ Change the given fields of a user's record. """
+        user = self.get(username)
+        self.put(username,
+                 user['password'] if password is None else password,
+                 user['age'] if age is None else age,
+                 user['balance'] if balance is None else balance)
+
+    def put_many(self, users):
+        """
+        Add or replace many records in one pass.
+
+        :param users: records shaped like User.get_data (iterable of dict).
+        :return: the number of records written (int).
+        """
+        count = 0
+        for user in users:
+            self.put(user['username'], user['password'], user['age'],
+                     user['balance'])
+            count += 1
+        return count
+
+    def check_password(self, username, password):
+        """
+        Check a password against the user's record.
+
+        :return: True - If the user exists and the password matches (bool).
+                 False - If any other case (bool).
+        """
+        try:
+            return self.get(username)['password'] == password
+        except KeyError:
+            return False
+
+    def adjust_balance(self, username, amount):
+        """
+        Add amount to the user's balance as one atomic step.
+
+        :param username: user's login name (str).
+        :param amount: amount of money to add, negative to take away
+                       (float or str).
+        :return: the new balance (str) or None if it would drop below zero.
+        :raise: KeyError: If the user does not exist.
+        """
+        raise NotImplementedError
+
+    def adjust_many(self, changes, atomic=False):
+        """
+        Add amounts to many users' balances in one pass, checking each
+        change against the balance left by the ones before it.
+
+        :param changes: (username, amount) pairs, with a negative amount to
+                        take money away (iterable of tuple).
+        :param atomic: apply nothing unless every change succeeds (bool).
+        :return: one result per change (list), each the new balance (str),
+                 None if it would drop below zero or False if the user does
+                 not exist. An atomic batch with any failure is not applied.
+        """
+        balances = {}
+        results = []
+        for username, amount in changes:
+            if username not in balances:
+                try:
+                    balances[username] = parse_cents(
+                        self.get(username)['balance'])
+                except KeyError:
+                    results.append(False)
+                    continue
+            cents = balances[username] + parse_cents(amount)
+            if cents < 0:
+                results.append(None)
+                continue
+            balances[username] = cents
+            results.append(format_cents(cents))
+        if not atomic or all(results):
+            for username, cents in balances.items():
+                self.update(username, balance=format_cents(cents))
+        return results
+
+    def credit_all(self, cents):
+        """
+        Add the same amount to every user's balance.
+
+        :param cents: the amount to add, in cents (int).
+        :return: the number of users credited (int).
+        :raise: ValueError: Credit amount not valid!
+        """
+        if cents < 0:
+            raise ValueError("Credit amount not valid!")
+        count = 0
+        for name in self.names():
+            self.adjust_balance(name, format_cents(cents))
+            count += 1
+        return count
+
+    def total_cents(self):
+        """ Get the sum of every user's balance, in cents (int). """
+        return sum(parse_cents(self.get(name)['balance'])
+                   for name in self.names())
+
+    def names_below(self, cents):
+        """
+        Get every user whose balance is less than the given amount.
+
+        :param cents: the amount to compare against, in cents (int).
+        :return: usernames (list).
+        """
+        return [name for name in self.names()
+                if parse_cents(self.get(name)['balance']) < cents]
+
+
+class UserStore(StorageBackend):
+    compact_size = 1 << 20  # Journal size (bytes) that triggers compaction
+
+    def __init__(self, data_path, names_path=None, journal_path=None,
+                 writer=None):
+        """
+        In-memory index of the user data file, keyed by username.
+
+        The file is only parsed on first use and again whenever its mtime or
+        size changes outside of this process. That check is skipped while
+        this process has writes to the files waiting to be committed, so in
+        the writer's 'exit' mode, where they wait until the program exits,
+        changes made outside the process after its first write are not
+        picked up. Records are held as columns
+        that share one slot number per user, with every balance kept as
+        whole cents in an array('q'), so bulk balance operations run over
+        one packed array instead of a string per user.
+
+        Balance changes are appended to the journal file as 'username,balance'
+        records instead of rewriting the user data file, which then acts as
+        a snapshot. Once the journal passes compact_size it is folded back
+        into the snapshot on a background thread.
+
+        :param data_path: the user data file to index (str).
+        :param names_path: the user names file kept in step with it (str).
+        :param journal_path: the balance journal, or None to rewrite the
+                             user data file on every balance change (str).
+        :param writer: commits the files (DurableWriter).
+        """
+        self.data_path = data_path
+        self.names_path = names_path
+        self.journal_path = journal_path
+        self.writer = writer or DurableWriter()
+        self.version = 0
+        self.reloads = 0
+        self._slots = None  # username -> slot in the columns below
+        self._names = []
+        self._passwords = []
+        self._ages = []
+        self._cents = array('q')
+        self._stamp = None
+        self._names_dirty = False
+        self._journal_size = 0
+        self._compacting = False
+        self._lock = threading.RLock()
+
+    def _file_stamp(self):
+        """ Get the stamps of the user data file and the journal (tuple). """
+        return (path_stamp(self.data_path),
+                path_stamp(self.journal_path))
+
+    def _saved_names(self):
+        """
+        Get the names in the user names file (list), or None if there is no
+        such file.
+        """
+        if self.names_path is None:
+            return None
+        try:
+            data = self.writer.read(self.names_path)
+        except FileNotFoundError:
+            return None
+        return data.split('\n') if data else []
+
+    def _load(self):
+        """ Parse the user data file and replay the journal into the index. """
+        loaded = self._slots is not None
+        names = self._names if loaded else self._saved_names()
+        dirty = self._names_dirty
+        self._slots = {}
+        self._names, self._passwords, self._ages = [], [], []
+        self._cents = array('q')
+        try:
+            with open(self.data_path, 'r') as file:
+                logger.debug("Indexing '{}'.".format(self.data_path))
+                for line in file:
+                    line = line.strip()
+                    if line:
+                        _user, _pwd, _years, _money = line.split(',')
+                        self._set(_user, _pwd, _years, parse_cents(_money))
+        except FileNotFoundError:
+            logger.error("Failed to open '{}'.".format(self.data_path))
+        self._journal_size = 0
+        if path_stamp(self.journal_path) is not None:
+            for line in self.writer.read_records(self.journal_path):
+                self._journal_size += len(line) + 1
+                _user, _, _money = line.strip().rpartition(',')
+                if _user in self._slots:
+                    self._cents[self._slots[_user]] = parse_cents(_money)
+        if loaded:
+            self.reloads += 1
+        self._stamp = self._file_stamp()
+        # Only rewrite the user names file if the names have changed
+        self._names_dirty = dirty or self._names != names
+        self.version += 1
+
+    def _records(self):
+        """
+        Get the index, reloading it if the file has changed on disk and none
+        of this process's writes to it are waiting to be committed.
+
+        :return: username -> slot in the record columns (dict).
+        """
+        with self._lock:
+            if self._slots is None:
+                self._load()
+            elif not self.writer.pending(self.data_path, self.journal_path):
+                stamp = self._file_stamp()
+                if self._stamp is None:  # Our own writes just landed
+                    self._stamp = stamp
+                elif stamp != self._stamp:
+                    self._load()
+            return self._slots
+
+    def _set(self, username, password, age, cents):
+        """ Add or overwrite a record in the columns. """
+        slot = self._slots.get(username)
+        if slot is None:
+            self._names_dirty = True
+            self._slots[username] = len(self._names)
+            self._names.append(username)
+            self._passwords.append(password)
+            self._ages.append(str(age))
+            self._cents.append(cents)
+        else:
+            self._passwords[slot] = password
+            self._ages[slot] = str(age)
+            self._cents[slot] = cents
+
+    def _column(self):
+        """ Get the balances as a NumPy view sharing their memory. """
+        return numpy.frombuffer(self._cents, dtype=numpy.int64)
+
+    def _snapshot(self):
+        """ Get the user data file contents for the current index (str). """
+        return '\n'.join(','.join((name, password, age, format_cents(cents)))
+                         for name, password, age, cents in zip(
+                             self._names, self._passwords, self._ages,
+                             self._cents))
+
+    def _save(self):
+        """
+        Write the index back to the user data file, which folds in (and
+        empties) the journal, and to the user names file if any name has
+        changed since it was last written.
+        """
+        with self.writer.group():
+            self.writer.replace(self.data_path, self._snapshot())
+            if self.names_path is not None and self._names_dirty:
+                self.writer.replace(self.names_path, '\n'.join(self._names))
+                self._names_dirty = False
+            if self.journal_path is not None:
+                self.writer.replace(self.journal_path, '')
+        self._journal_size = 0
+        self._stamp = None
+        self.version += 1
+
+    def _append(self, records):
+        """ Append (username, balance) changes to the journal. """
+        record = ''.join('{},{}\n'.format(username, balance)
+                         for username, balance in records)
+        self.writer.append(self.journal_path, record)
+        self._journal_size += len(record)
+        self._stamp = None
+        self.version += 1
+        if self._journal_size > self.compact_size and not self._compacting:
+            self._compacting = True
+            threading.Thread(target=self.compact, daemon=True).start()
+
+    def compact(self):
+        """
+        Fold the journal into a new user data snapshot.
+
+        The index already holds every journalled balance, so the snapshot
+        and the emptied journal are committed together without re-reading
+        the journal.
+        """
+        try:
+            with self.writer.group():
+                with self._lock:
+                    if self._slots is None or self.journal_path is None:
+                        return
+                    self.writer.replace(self.data_path, self._snapshot())
+                    self.writer.replace(self.journal_path, '')
+                    self._journal_size = 0
+                    self._stamp = None
+            logger.debug("Compacted '{}'.".format(self.journal_path))
+        finally:
+            self._compacting = False
+
+    def __contains__(self, username):
+        return username in self._records()
+
+    def stamp(self):
+        return self._file_stamp()
+
+    def names_stamp(self):
+        # Without a names file, compaction also changes this stamp
+        return path_stamp(self.names_path if self.names_path is not None
+                          else self.data_path)
+
+    @property
+    def generation(self):
+        if self._slots is not None:
+            self._records()
+        return self.reloads
+
+    def __len__(self):
+        return len(self._records())
+
+    def names(self):
+        """
+        Get every username in the store.
+
+        :return: usernames (list).
+        """
+        with self._lock:
+            self._records()
+            return list(self._names)
+
+    def get(self, username):
+        """
+        Get the record for the specified username.
+
+        :param username: user's login name (str).
+        :returns: a dict containing the keys:
+
+                 'username'  - (str)
+                 'password'  - (str)
+                 'age'       - (str)
+                 'balance'   - (str)
+        :raise: KeyError: If the user does not exist.
+        """
+        with self._lock:
+            slot = self._records()[username]
+            return {"username": username, "password": self._passwords[slot],
+                    "age": self._ages[slot],
+                    "balance": format_cents(self._cents[slot])}
+
+    def put(self, username, password, age, balance):
+        """
+        Add or replace a user's record and write it to disk.
+
+        :param username: user's login name (str).
+        :param password: user's login password (str).
+        :param age: user's age (str).
+        :param balance: user's balance (str).
+        """
+        with self.writer.group(), self._lock:
+            self._records()
+            self._set(username, password, age, parse_cents(balance))
+            self._save()
+
+    def put_many(self, users):
+        with self.writer.group(), self._lock:
+            self._records()
+            count = 0
+            for user in users:
+                self._set(user['username'], user['password'], user['age'],
+                          parse_cents(user['balance']))
+                count += 1
+            self._save()
+            return count
+
+    def remove(self, username):
+        """
+        Remove a user's record and write the change to disk.
+
+        :param username: user's login name (str).
+        :raise: KeyError: If the user does not exist.
+        """
+        with self.writer.group(), self._lock:
+            slot = self._records().pop(username)
+            for column in (self._names, self._passwords, self._ages,
+                           self._cents):
+                del column[slot]
+            for name in self._names[slot:]:
+                self._slots[name] -= 1
+            self._names_dirty = True
+            self._save()
+
+    def rename(self, old_name, new_name):
+        """
+        Move a user's record to a new username, keeping its position.
+
+        :param old_name: user's original name (str).
+        :param new_name: user's new name (str).
+        :raise: KeyError: If the user does not exist.
+        """
+        with self.writer.group(), self._lock:
+            slot = self._records().pop(old_name)
+            self._slots[new_name] = slot
+            self._names[slot] = new_name
+            self._names_dirty = True
+            self._save()
+
+    def adjust_balance(self, username, amount):
+        with self.writer.group(), self._lock:
+            slot = self._records()[username]
+            cents = self._cents[slot] + parse_cents(amount)
+            if cents < 0:
+                return None
+            self._cents[slot] = cents
+            balance = format_cents(cents)
+            if self.journal_path is None:
+                self._save()
+            else:
+                self._append([(username, balance)])
+            return balance
+
+    def _stage(self, changes):
+        """
+        Work out a batch of balance changes without applying them.
+
+        :return: slot -> new cents (dict) and the results adjust_many
+                 gives (list).
+        """
+        slots = self._records()
+        staged = {}
+        results = []
+        for username, amount in changes:
+            slot = slots.get(username)
+            if slot is None:
+                results.append(False)
+                continue
+            cents = staged.get(slot, self._cents[slot]) + parse_cents(amount)
+            if cents < 0:
+                results.append(None)
+                continue
+            staged[slot] = cents
+            results.append(format_cents(cents))
+        return staged, results
+
+    def _apply(self, staged):
+        """ Write balance changes worked out by _stage. """
+        if not staged:
+            return
+        for slot, cents in staged.items():
+            self._cents[slot] = cents
+        if self.journal_path is None:
+            self._save()
+        else:
+            self._append((self._names[slot], format_cents(cents))
+                         for slot, cents in staged.items())
+
+    def adjust_many(self, changes, atomic=False):
+        with self.writer.group(), self._lock:
+            staged, results = self._stage(changes)
+            if not atomic or all(results):
+                self._apply(staged)
+            return results
+
+    def credit_all(self, cents):
+        if cents < 0:
+            raise ValueError("Credit amount not valid!")
+        with self.writer.group(), self._lock:
+            self._records()
+            if not self._cents:
+                return 0
+            if numpy is not None:
+                column = self._column()
+                column += cents
+                del column  # Release the buffer so the array can resize
+            else:
+                self._cents = array('q', [balance + cents
+                                          for balance in self._cents])
+            self._save()
+            return len(self._cents)
+
+    def total_cents(self):
+        with self._lock:
+            self._records()
+            if numpy is not None and self._cents:
+                return int(self._column().sum())
+            return sum(self._cents)
+
+    def names_below(self, cents):
+        with self._lock:
+            self._records()
+            if numpy is not None and self._cents:
+                return [self._names[slot]
+                        for slot in numpy.flatnonzero(self._column() < cents)]
+            return [name for name, balance in zip(self._names, self._cents)
+                    if balance < cents]
+
+
+class SQLiteUserStore(StorageBackend):
+    CREATE_SQL = ("CREATE TABLE IF NOT EXISTS users ("
+                  "username TEXT PRIMARY KEY, password TEXT NOT NULL, "
+                  "age TEXT NOT NULL, cents INTEGER NOT NULL)")
+    SELECT_SQL = "SELECT password, age, cents FROM users WHERE username = ?"
+    NAMES_SQL = "SELECT username FROM users ORDER BY rowid"
+    COUNT_SQL = "SELECT COUNT(*) FROM users"
+    PUT_SQL = ("INSERT OR REPLACE INTO users (username, password, age, "
+               "cents) VALUES (?, ?, ?, ?)")
+    DELETE_SQL = "DELETE FROM users WHERE username = ?"
+    RENAME_SQL = "UPDATE users SET username = ? WHERE username = ?"
+    ADJUST_SQL = ("UPDATE users SET cents = cents + ? "
+                  "WHERE username = ? AND cents + ? >= 0")
+    CREDIT_SQL = "UPDATE users SET cents = cents + ?"
+    TOTAL_SQL = "SELECT COALESCE(SUM(cents), 0) FROM users"
+    BELOW_SQL = "SELECT username FROM users WHERE cents < ? ORDER BY rowid"
+
+    def __init__(self, db_path):
+        """
+        User accounts kept in an indexed SQLite 'users' table.
+
+        The database runs in WAL mode and every statement is a fixed string,
+        so sqlite3 prepares each one once and reuses it from its cache.
+        Balances are kept as whole cents, so balance changes and the bulk
+        balance operations are done by SQLite itself in one statement.
+
+        :param db_path: the SQLite database file (str).
+        """
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, isolation_level=None,
+                                     check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(self.CREATE_SQL)
+        self._upgrade()
+
+    def _upgrade(self):
+        """ Convert a table with text 'balance' dollars to integer cents. """
+        columns = [row[1] for row in
+                   self._conn.execute("PRAGMA table_info(users)")]
+        if 'cents' in columns:
+            return
+        logger.info("Converting '{}' balances to cents.".format(self.db_path))
+        with self.transaction() as conn:
+            rows = [(name, password, age, parse_cents(balance)) for
+                    name, password, age, balance in conn.execute(
+                        "SELECT username, password, age, balance FROM users "
+                        "ORDER BY rowid")]
+            conn.execute("DROP TABLE users")
+            conn.execute(self.CREATE_SQL)
+            conn.executemany(self.PUT_SQL, rows)
+
+    @contextmanager
+    def transaction(self):
+        """ Run the enclosed statements as one write transaction. """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(self.COUNT_SQL).fetchone()[0]
+
+    def stamp(self):
+        return path_stamp(self.db_path), path_stamp(self.db_path + '-wal')
+
+    def names_stamp(self):
+        with self._lock:
+            return self._conn.execute("PRAGMA user_version").fetchone()[0]
+
+    @staticmethod
+    def _names_changed(conn):
+        """ Bump the names generation kept in the database header. """
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        conn.execute("PRAGMA user_version = {}".format(version + 1))
+
+    @property
+    def generation(self):
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def names(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute(self.NAMES_SQL)]
+
+    def get(self, username):
+        with self._lock:
+            row = self._conn.execute(self.SELECT_SQL, (username,)).fetchone()
+        if row is None:
+            raise KeyError(username)
+        password, age, cents = row
+        return {"username": username, "password": password,
+                "age": age, "balance": format_cents(cents)}
+
+    def put(self, username, password, age, balance):
+        with self.transaction() as conn:
+            conn.execute(self.PUT_SQL,
+                         (username, password, str(age), parse_cents(balance)))
+            self._names_changed(conn)
+
+    def put_many(self, users):
+        rows = [(user['username'], user['password'], str(user['age']),
+                 parse_cents(user['balance'])) for user in users]
+        with self.transaction() as conn:
+            conn.executemany(self.PUT_SQL, rows)
+            self._names_changed(conn)
+        return len(rows)
+
+    def remove(self, username):
+        with self.transaction() as conn:
+            if conn.execute(self.DELETE_SQL, (username,)).rowcount == 0:
+                raise KeyError(username)
+            self._names_changed(conn)
+
+    def rename(self, old_name, new_name):
+        with self.transaction() as conn:
+            if conn.execute(self.RENAME_SQL,
+                            (new_name, old_name)).rowcount == 0:
+                raise KeyError(old_name)
+            self._names_changed(conn)
+
+    def adjust_balance(self, username, amount):
+        cents = parse_cents(amount)
+        with self.transaction() as conn:
+            changed = conn.execute(self.ADJUST_SQL,
+                                   (cents, username, cents)).rowcount
+            row = conn.execute(self.SELECT_SQL, (username,)).fetchone()
+        if row is None:
+            raise KeyError(username)
+        return format_cents(row[2]) if changed else None
+
+    def adjust_many(self, changes, atomic=False):
+        results = []
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for username, amount in changes:
+                    cents = parse_cents(amount)
+                    changed = conn.execute(self.ADJUST_SQL,
+                                           (cents, username, cents)).rowcount
+                    row = conn.execute(self.SELECT_SQL,
+                                       (username,)).fetchone()
+                    if row is None:
+                        results.append(False)
+                    else:
+                        results.append(format_cents(row[2]) if changed
+                                       else None)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("ROLLBACK" if atomic and not all(results)
+                         else "COMMIT")
+        return results
+
+    def credit_all(self, cents):
+        if cents < 0:
+            raise ValueError("Credit amount not valid!")
+        with self.transaction() as conn:
+            return conn.execute(self.CREDIT_SQL, (cents,)).rowcount
+
+    def total_cents(self):
+        with self._lock:
+            return self._conn.execute(self.TOTAL_SQL).fetchone()[0]
+
+    def names_below(self, cents):
+        with self._lock:
+            return [row[0] for row in
+                    self._conn.execute(self.BELOW_SQL, (cents,))]
+
+    def close(self):
+        """ Close the database connection. """
+        with self._lock:
+            self._conn.close()
+
+
+class BinaryUserStore(StorageBackend):
+    HEADER = struct.Struct('<4sI')       # Magic, number of record slots used
+    RECORD = struct.Struct('<32s32sHq')  # Name, password digest, age, cents
+    MAGIC = b'VWU1'
+    FIELDS = {'name': (struct.Struct('<32s'), 0),
+              'digest': (struct.Struct('<32s'), 32),
+              'age': (struct.Struct('<H'), 64),
+              'cents': (struct.Struct('<q'), 66)}
+    ENTRY = struct.Struct('<BI')         # Index entry: name length, slot
+
+    def __init__(self, data_path, index_path):
+        """
+        User accounts kept as fixed-width binary records in a memory-mapped
+        file, with a separate index file mapping usernames to record slots.
+
+        Passwords are stored as SHA-256 digests and balances as whole cents,
+        so any field can be read or overwritten in place at a known offset
+        without touching the rest of the file.
+
+        :param data_path: the binary record file (str).
+        :param index_path: the username to slot index file (str).
+        """
+        self.data_path = data_path
+        self.index_path = index_path
+        self._lock = threading.RLock()
+        self._slots = {}
+        self._free = []
+        self._count = 0
+        if not os.path.exists(data_path):
+            with open(data_path, 'wb') as f:
+                f.write(self.HEADER.pack(self.MAGIC, 0))
+                f.write(bytes(self.RECORD.size * 64))
+        self._file = open(data_path, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        magic, self._count = self.HEADER.unpack_from(self._map, 0)
+        if magic != self.MAGIC:
+            raise ValueError("User data file not valid!")
+        if not self._load_index():
+            self._rebuild_index()
+            self._save_index()
+
+    @staticmethod
+    def digest(password):
+        """ Get the stored digest of a password (bytes). """
+        return hashlib.sha256(password.encode('utf-8')).digest()
+
+    def _offset(self, slot):
+        """ Get the byte offset of a record slot (int). """
+        return self.HEADER.size + slot * self.RECORD.size
+
+    def _load_index(self):
+        """
+        Read the index file.
+
+        :return: True - If it matches the record file (bool).
+                 False - If it is missing or out of date (bool).
+        """
+        try:
+            with open(self.index_path, 'rb') as file:
+                data = file.read()
+        except FileNotFoundError:
+            return False
+        if len(data) < 4 or struct.unpack_from('<I', data)[0] != self._count:
+            return False
+        slots = {}
+        position = 4
+        while position < len(data):
+            length, slot = self.ENTRY.unpack_from(data, position)
+            position += self.ENTRY.size
+            slots[data[position:position + length].decode('utf-8')] = slot
+            position += length
+        used = set(slots.values())
+        self._slots = slots
+        self._free = [slot for slot in range(self._count) if slot not in used]
+        return True
+
+    def _rebuild_index(self):
+        """ Scan every record slot to rebuild the index. """
+        logger.debug("Rebuilding '{}'.".format(self.index_path))
+        self._slots = {}
+        self._free = []
+        for slot in range(self._count):
+            name = self._map[self._offset(slot):self._offset(slot) + 32]
+            name = name.rstrip(b'\0')
+            if name:
+                self._slots[name.decode('utf-8')] = slot
+            else:
+                self._free.append(slot)
+
+    def _save_index(self):
+        """ Write the index file (to a temp file, then rename it). """
+        parts = [struct.pack('<I', self._count)]
+        for name, slot in self._slots.items():
+            name = name.encode('utf-8')
+            parts.append(self.ENTRY.pack(len(name), slot) + name)
+        temp_path = self.index_path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(b''.join(parts))
+        os.replace(temp_path, self.index_path)
+
+    def _sync(self, offset, size):
+        """ Flush the pages holding the given bytes to disk. """
+        start = offset - offset % mmap.ALLOCATIONGRANULARITY
+        self._map.flush(start, offset + size - start)
+
+    def _allocate(self):
+        """ Get a free record slot, growing the file if it is full (int). """
+        if self._free:
+            return self._free.pop()
+        if self._offset(self._count + 1) > len(self._map):
+            size = len(self._map) + max(len(self._map), self.RECORD.size)
+            self._map.close()
+            self._file.truncate(size)
+            self._map = mmap.mmap(self._file.fileno(), 0)
+        self._count += 1
+        self.HEADER.pack_into(self._map, 0, self.MAGIC, self._count)
+        self._sync(0, self.HEADER.size)
+        return self._count - 1
+
+    def _write(self, username, digest, age, cents):
+        """
+        Write a whole record.
+
+        :return: True - If the user is new (bool).
+                 False - If an existing record was overwritten (bool).
+        """
+        name = username.encode('utf-8')
+        if len(name) > 32:
+            raise ValueError("Username too long!")
+        slot = self._slots.get(username)
+        new = slot is None
+        if new:
+            slot = self._allocate()
+            self._slots[username] = slot
+        offset = self._offset(slot)
+        self.RECORD.pack_into(self._map, offset, name, digest, int(age),
+                              cents)
+        self._sync(offset, self.RECORD.size)
+        return new
+
+    def read_field(self, username, field):
+        """
+        Read one field of a user's record straight out of the mapped file.
+
+        :param username: user's login name (str).
+        :param field: 'name', 'digest', 'age' or 'cents' (str).
+        :return: the raw field value (bytes or int).
+        :raise: KeyError: If the user does not exist.
+        """
+        field_struct, offset = self.FIELDS[field]
+        with self._lock:
+            offset += self._offset(self._slots[username])
+            return field_struct.unpack_from(self._map, offset)[0]
+
+    def write_field(self, username, field, value):
+        """
+        Overwrite one field of a user's record in place.
+
+        :param username: user's login name (str).
+        :param field: 'name', 'digest', 'age' or 'cents' (str).
+        :param value: the raw field value (bytes or int).
+        :raise: KeyError: If the user does not exist.
+        """
+        field_struct, offset = self.FIELDS[field]
+        with self._lock:
+            offset += self._offset(self._slots[username])
+            field_struct.pack_into(self._map, offset, value)
+            self._sync(offset, field_struct.size)
+
+    def __contains__(self, username):
+        return username in self._slots
+
+    def stamp(self):
+        return path_stamp(self.index_path)
+
+    def password_token(self, password):
+        return self.digest(password).hex()
+
+    def __len__(self):
+        return len(self._slots)
+
+    def names(self):
+        with self._lock:
+            return sorted(self._slots, key=self._slots.get)
+
+    def get(self, username):
+        with self._lock:
+            offset = self._offset(self._slots[username])
+            _, digest, age, cents = self.RECORD.unpack_from(self._map, offset)
+        return {"username": username, "password": digest.hex(),
+                "age": str(age), "balance": format_cents(cents)}
+
+    def put(self, username, password, age, balance):
+        with self._lock:
+            if self._write(username, self.digest(password), age,
+                           parse_cents(balance)):
+                self._save_index()
+
+    def put_many(self, users):
+        with self._lock:
+            count = 0
+            for user in users:
+                self._write(user['username'], self.digest(user['password']),
+                            user['age'], parse_cents(user['balance']))
+                count += 1
+            self._save_index()
+            return count
+
+    def update(self, username, password=None, age=None, balance=None):
+        with self._lock:
+            if password is not None:
+                self.write_field(username, 'digest', self.digest(password))
+            if age is not None:
+                self.write_field(username, 'age', int(age))
+            if balance is not None:
+                self.write_field(username, 'cents', parse_cents(balance))
+
+    def remove(self, username):
+        with self._lock:
+            slot = self._slots.pop(username)
+            offset = self._offset(slot)
+            self._map[offset:offset + self.RECORD.size] = \
+                bytes(self.RECORD.size)
+            self._sync(offset, self.RECORD.size)
+            self._free.append(slot)
+            self._save_index()
+
+    def rename(self, old_name, new_name):
+        name = new_name.encode('utf-8')
+        if len(name) > 32:
+            raise ValueError("Username too long!")
+        with self._lock:
+            self.write_field(old_name, 'name', name)
+            self._slots[new_name] = self._slots.pop(old_name)
+            self._save_index()
+
+    def adjust_balance(self, username, amount):
+        with self._lock:
+            cents = self.read_field(username, 'cents') + parse_cents(amount)
+            if cents < 0:
+                return None
+            self.write_field(username, 'cents', cents)
+            return format_cents(cents)
+
+    def adjust_many(self, changes, atomic=False):
+        field_struct, offset = self.FIELDS['cents']
+        with self._lock:
+            staged = {}
+            results = []
+            for username, amount in changes:
+                slot = self._slots.get(username)
+                if slot is None:
+                    results.append(False)
+                    continue
+                cents = staged.get(slot)
+                if cents is None:
+                    cents = field_struct.unpack_from(
+                        self._map, self._offset(slot) + offset)[0]
+                cents += parse_cents(amount)
+                if cents < 0:
+                    results.append(None)
+                    continue
+                staged[slot] = cents
+                results.append(format_cents(cents))
+            if staged and (not atomic or all(results)):
+                for slot, cents in staged.items():
+                    field_struct.pack_into(self._map,
+                                           self._offset(slot) + offset, cents)
+                self._map.flush()
+            return results
+
+    def credit_all(self, cents):
+        if cents < 0:
+            raise ValueError("Credit amount not valid!")
+        field_struct, offset = self.FIELDS['cents']
+        with self._lock:
+            for slot in self._slots.values():
+                position = self._offset(slot) + offset
+                field_struct.pack_into(
+                    self._map, position,
+                    field_struct.unpack_from(self._map, position)[0] + cents)
+            self._map.flush()
+            return len(self._slots)
+
+    def total_cents(self):
+        # Free slots are zeroed, so every slot in use can be summed blindly
+        field_struct, offset = self.FIELDS['cents']
+        with self._lock:
+            return sum(field_struct.unpack_from(
+                self._map, self._offset(slot) + offset)[0]
+                for slot in range(self._count))
+
+    def names_below(self, cents):
+        with self._lock:
+            return [name for name in self.names()
+                    if self.read_field(name, 'cents') < cents]
+
+    def check_password(self, username, password):
+        try:
+            digest = self.read_field(username, 'digest')
+        except KeyError:
+            return False
+        return hmac.compare_digest(digest, self.digest(password))
+
+    def close(self):
+        """ Flush and unmap the record file. """
+        with self._lock:
+            self._map.flush()
+            self._map.close()
+            self._file.close()
+
+
+class ShardedUserStore(StorageBackend):
+
+    def __init__(self, data_pattern, journal_pattern, count_path, count=16,
+                 writer=None):
+        """
+        User accounts split across several text stores by a stable hash of
+        the username, so each lookup or write only loads and rewrites the
+        one shard that owns the user.
+
+        :param data_pattern: the shard file name with a {} for its number
+                             (str).
+        :param journal_pattern: the shard journal file name with a {} for
+                                its number (str).
+        :param count_path: the file remembering the number of shards (str).
+        :param count: the number of shards to start with, used only when
+                      count_path does not exist yet (int).
+        :param writer: commits the files (DurableWriter).
+        """
+        self.data_pattern = data_pattern
+        self.journal_pattern = journal_pattern
+        self.count_path = count_path
+        self.writer = writer or DurableWriter()
+        self._lock = threading.RLock()
+        try:
+            with open(count_path, 'r') as file:
+                count = int(file.read())
+        except FileNotFoundError:
+            self.writer.replace(count_path, str(count))
+        self._open(count)
+
+    def _open(self, count):
+        """ Create the shard stores for the given shard count. """
+        self.shards = [UserStore(self.data_pattern.format(number), None,
+                                 self.journal_pattern.format(number),
+                                 self.writer)
+                       for number in range(count)]
+
+    @staticmethod
+    def shard_number(username, count):
+        """ Get the number of the shard that owns username (int). """
+        return zlib.crc32(username.encode('utf-8')) % count
+
+    def shard(self, username):
+        """ Get the shard that owns username (UserStore). """
+        return self.shards[self.shard_number(username, len(self.shards))]
+
+    @property
+    def version(self):
+        return sum(shard.version for shard in self.shards)
+
+    def __contains__(self, username):
+        return username in self.shard(username)
+
+    def stamp(self):
+        return tuple(shard.stamp() for shard in self.shards)
+
+    def names_stamp(self):
+        return tuple(shard.names_stamp() for shard in self.shards)
+
+    @property
+    def generation(self):
+        return sum(shard.generation for shard in self.shards)
+
+    def __len__(self):
+        return sum(len(shard) for shard in self.shards)
+
+    def names(self):
+        return [name for shard in self.shards for name in shard.names()]
+
+    def get(self, username):
+        return self.shard(username).get(username)
+
+    def put(self, username, password, age, balance):
+        self.shard(username).put(username, password, age, balance)
+
+    def put_many(self, users):
+        groups = [[] for _ in self.shards]
+        for user in users:
+            groups[self.shard_number(user['username'],
+                                     len(self.shards))].append(user)
+        with self.writer.group():
+            return sum(shard.put_many(group)
+                       for shard, group in zip(self.shards, groups) if group)
+
+    def update(self, username, password=None, age=None, balance=None):
+        self.shard(username).update(username, password, age, balance)
+
+    def remove(self, username):
+        self.shard(username).remove(username)
+
+    def rename(self, old_name, new_name):
+        old_shard = self.shard(old_name)
+        new_shard = self.shard(new_name)
+        if old_shard is new_shard:
+            old_shard.rename(old_name, new_name)
+            return
+        with self.writer.group(), self._lock:
+            user = old_shard.get(old_name)
+            new_shard.put(new_name, user['password'], user['age'],
+                          user['balance'])
+            old_shard.remove(old_name)
+
+    def adjust_balance(self, username, amount):
+        return self.shard(username).adjust_balance(username, amount)
+
+    def adjust_many(self, changes, atomic=False):
+        groups = {}  # shard number -> [(position, change)]
+        count = 0
+        for change in changes:
+            number = self.shard_number(change[0], len(self.shards))
+            groups.setdefault(number, []).append((count, change))
+            count += 1
+        results = [None] * count
+        with self.writer.group(), ExitStack() as stack:
+            for number in sorted(groups):
+                stack.enter_context(self.shards[number]._lock)
+            plans = {}
+            for number, group in groups.items():
+                staged, shard_results = self.shards[number]._stage(
+                    change for _, change in group)
+                plans[number] = staged
+                for (position, _), result in zip(group, shard_results):
+                    results[position] = result
+            if not atomic or all(results):
+                for number, staged in plans.items():
+                    self.shards[number]._apply(staged)
+        return results
+
+    def credit_all(self, cents):
+        with self.writer.group():
+            return sum(shard.credit_all(cents) for shard in self.shards)
+
+    def total_cents(self):
+        return sum(shard.total_cents() for shard in self.shards)
+
+    def names_below(self, cents):
+        return [name for shard in self.shards
+                for name in shard.names_below(cents)]
+
+    def reshard(self, count):
+        """
+        Redistribute every user across a new number of shards, removing any
+        shard files that are no longer needed.
+
+        :param count: the new number of shards (int).
+        """
+        with self._lock:
+            users = [shard.get(name) for shard in self.shards
+                     for name in shard.names()]
+            old_count = len(self.shards)
+            groups = [[] for _ in range(count)]
+            for user in users:
+                groups[self.shard_number(user['username'], count)].append(
+                    ','.join([user['username'], user['password'],
+                              user['age'], user['balance']]))
+            with self.writer.group():
+                for number, lines in enumerate(groups):
+                    self.writer.replace(self.data_pattern.format(number),
+                                        '\n'.join(lines))
+                    self.writer.replace(self.journal_pattern.format(number),
+                                        '')
+                self.writer.replace(self.count_path, str(count))
+            self.writer.flush()
+            for number in range(count, old_count):
+                for pattern in (self.data_pattern, self.journal_pattern):
+                    if os.path.exists(pattern.format(number)):
+                        os.remove(pattern.format(number))
+            self._open(count)
+            logger.info("Resharded {} users from {} to {} shards.".format(
+                len(users), old_count, count))
+
+
+def migrate(source, target):
+    """
+    Copy every user record from one store into another in one pass.
+
+    :param source: the store to read from (StorageBackend).
+    :param target: the store to write to (StorageBackend).
+    :return: the number of records copied (int).
+    """
+    count = target.put_many(source.get(name) for name in source.names())
+    logger.info("Migrated {} users.".format(count))
+    return count
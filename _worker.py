@@ -0,0 +1,140 @@
+# ===================================
+# Filename: _worker.py
+# Purpose: To keep the storage work of the virtual-world program off the Tk
+#          thread.
+#
+#
+# virtual-world
+# Copyright (C) 2017  Joshua Peter Booth
+#
+# This file is part of virtual-world.
+#
+# virtual-world is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# virtual-world is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with virtual-world (see LICENSE.md).
+# If not, see <http://www.gnu.org/licenses/>.
+#
+# Contact me:
+# Email: joshb00th@icloud.com
+# ===================================
+
+import queue
+import threading
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+
+from _log import logger
+
+
+class WorkerPool:
+
+    def __init__(self, workers=4, poll=20):
+        """
+        Worker threads that run the User and Check calls of button callbacks,
+        so the callbacks return to the mainloop straight away however big
+        the user store is.
+
+        Tk widgets can only be used from the Tk thread, so each finished
+        call's result is put on a queue that the Tk thread checks every poll
+        milliseconds with after(), and its done callback runs there. While
+        a call runs, its window shows the busy cursor and the buttons given
+        with it are disabled, so it cannot be started twice.
+
+        :param workers: the number of worker threads (int).
+        :param poll: milliseconds between checks for finished calls (int).
+        """
+        self.workers = workers
+        self.poll = poll
+        self._executor = None
+        self._lock = threading.Lock()
+        self._finished = queue.Queue()
+        self._running = 0  # Calls whose done callback has not run yet
+        self._busy = {}  # Window -> calls running for it
+        self._root = None
+
+    def _started(self):
+        """ Get the executor, starting the threads on first use. """
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.workers)
+        return self._executor
+
+    def run(self, widget, work, done=None, busy=(), failed=None):
+        """
+        Run a call on a worker thread.
+
+        :param widget: the widget the call is for (tk.Widget).
+        :param work: the call, which must not touch any widgets (function).
+        :param done: called on the Tk thread with work's result (function).
+        :param busy: buttons disabled until the call is done (iterable of
+                     tk.Widget).
+        :param failed: called on the Tk thread with the exception if work
+                       raises one, which is logged if this is None
+                       (function).
+        """
+        window = widget.winfo_toplevel()
+        busy = list(busy)
+        self._set_busy(window, busy, True)
+        if self._root is None:
+            self._root = widget._root()
+        future = self._started().submit(work)
+        future.add_done_callback(
+            lambda future: self._finished.put((future, window, busy, done,
+                                               failed)))
+        self._running += 1
+        if self._running == 1:
+            self._root.after(self.poll, self._check)
+
+    def _set_busy(self, window, buttons, busy):
+        """ Show or clear the busy cursor and disable or enable buttons. """
+        calls = self._busy.get(window, 0) + (1 if busy else -1)
+        try:
+            if calls:
+                self._busy[window] = calls
+                window.configure(cursor="watch")
+            else:
+                self._busy.pop(window, None)
+                window.configure(cursor="")
+            for button in buttons:
+                button.configure(state="disabled" if busy else "normal")
+        except tk.TclError:  # The window has been closed
+            self._busy.pop(window, None)
+
+    def _check(self):
+        """ Run the done callbacks of the finished calls. """
+        try:
+            while True:
+                try:
+                    future, window, busy, done, failed = \
+                        self._finished.get_nowait()
+                except queue.Empty:
+                    break
+                self._running -= 1
+                self._set_busy(window, busy, False)
+                error = future.exception()
+                if error is not None:
+                    if failed is None:
+                        logger.error("A worker call failed: {!r}".format(
+                            error))
+                    else:
+                        failed(error)
+                elif done is not None:
+                    done(future.result())
+        finally:  # Keep checking even if a callback raised
+            if self._running:
+                self._root.after(self.poll, self._check)
+
+    def shutdown(self):
+        """ Wait for the running calls to finish and stop the threads. """
+        if self._executor is not None:
+            self._executor.shutdown()
@@ -0,0 +1,325 @@
+# ===================================
+# Filename: _writer.py
+# Purpose: To provide crash-safe, group-committed file writes to the
+#          virtual-world program.
+#
+#
+# virtual-world
+# Copyright (C) 2017  Joshua Peter Booth
+#
+# This file is part of virtual-world.
+#
+# virtual-world is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# virtual-world is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with virtual-world (see LICENSE.md).
+# If not, see <http://www.gnu.org/licenses/>.
+#
+# Contact me:
+# Email: joshb00th@icloud.com
+# ===================================
+
+import atexit
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from _log import logger
+
+
+class DurableWriter:
+    modes = ('always', 'interval', 'exit')
+
+    def __init__(self, mode='always', interval=50):
+        """
+        Queue file writes and commit them in batches.
+
+        Whole-file writes go to a temporary file which is fsynced and then
+        renamed over the original, so a crash leaves either the old or the
+        new contents. Every mutation queued while a commit is running is
+        written by the next commit, so a burst of writes costs one fsync
+        per file rather than one per write.
+
+        Files are committed in the order they were last replaced, so a new
+        snapshot always reaches the disk before the journal it replaces is
+        emptied. The files written inside a group() are held back from
+        commits until the group ends, so its writes are committed together.
+
+        :param mode: when writes reach the disk (str):
+
+                 'always'   - before replace/append return (grouped with any
+                              other thread's writes queued meanwhile)
+                 'interval' - every interval milliseconds
+                 'exit'     - on flush() or when the program exits, so
+                              stores stop picking up changes made outside
+                              the process once they have written
+        :param interval: milliseconds between commits in 'interval' mode (int).
+        :raise: ValueError: Durability mode not valid!
+        """
+        if mode not in self.modes:
+            raise ValueError("Durability mode not valid!")
+        self.mode = mode
+        self.interval = interval
+        self._pending = {}  # path -> [new contents or None, appended text]
+        self._tickets = {}  # path -> ticket of its latest pending write
+        self._done = {}  # path -> ticket of its latest committed write
+        self._failed = {}  # path -> (ticket, error) of a failed commit
+        self._held = {}  # path -> open groups that have written it
+        self._writing = ()  # Paths the running commit is writing
+        self._drafts = set()  # Paths being written without an fsync
+        self._ticket = 0
+        self._flushing = False
+        self._cond = threading.Condition()
+        self._local = threading.local()
+
+        if mode == 'interval':
+            threading.Thread(target=self._flush_loop, daemon=True).start()
+        atexit.register(self.flush)
+
+    def _queued(self, path):
+        """
+        Number the write just queued for a file (called holding the
+        condition).
+
+        :return: path -> the write's ticket (dict).
+        """
+        self._ticket += 1
+        self._tickets[path] = self._ticket
+        written = getattr(self._local, 'written', None)
+        if getattr(self._local, 'depth', 0):
+            if path not in written:
+                self._held[path] = self._held.get(path, 0) + 1
+            written[path] = self._ticket
+        return {path: self._ticket}
+
+    def replace(self, path, data, sync=True):
+        """
+        Replace the whole contents of a file.
+
+        :param path: the file to write (str).
+        :param data: the new contents (str).
+        :param sync: False to write a file that may be lost in a crash,
+                     such as a draft, straight away without an fsync, unless
+                     writes to it are already queued (bool).
+        """
+        with self._cond:
+            draft = not sync and path not in self._pending and \
+                path not in self._writing and path not in self._held
+            if draft:  # Held, so no commit writes it meanwhile
+                self._held[path] = 1
+                self._drafts.add(path)
+            else:
+                self._pending.pop(path, None)  # Commit it after earlier files
+                self._pending[path] = [data, '']
+                tickets = self._queued(path)
+        if not draft:
+            self._wait(tickets)
+            return
+        try:
+            self._write(path, data, '', sync=False)
+        finally:
+            with self._cond:
+                self._drafts.discard(path)
+                self._held[path] -= 1
+                if not self._held[path]:
+                    del self._held[path]
+                self._cond.notify_all()
+
+    def append(self, path, data):
+        """
+        Append text to the end of a file.
+
+        :param path: the file to append to (str).
+        :param data: the text to append (str).
+        """
+        with self._cond:
+            self._pending.setdefault(path, [None, ''])[1] += data
+            tickets = self._queued(path)
+        self._wait(tickets)
+
+    def pending(self, *paths):
+        """
+        Check if writes to any of the files have not reached the disk yet.
+
+        :return: True - If a write is waiting (bool).
+                 False - If every write is on disk (bool).
+        """
+        with self._cond:
+            return any(path in self._pending or path in self._writing or
+                       path in self._drafts for path in paths)
+
+    def read(self, path):
+        """
+        Read a file as it will be once pending writes are committed, waiting
+        for a commit that is writing it to finish.
+
+        :param path: the file to read (str).
+        :return: the contents (str).
+        :raise: FileNotFoundError: If the file does not exist.
+        """
+        with self._cond:
+            while path in self._writing or path in self._drafts:
+                self._cond.wait()
+            if path in self._pending:
+                data, appended = self._pending[path]
+                if data is not None:
+                    return data + appended
+            else:
+                appended = ''
+            with open(path, 'r') as file:
+                return file.read() + appended
+
+    def read_records(self, path):
+        """
+        Read a file of appended records. An append is not atomic, so a last
+        line a crash left without its newline is dropped, and cut off the
+        file so the next append starts on a line of its own.
+
+        :param path: the file to read (str).
+        :return: the whole lines (list of str).
+        :raise: FileNotFoundError: If the file does not exist.
+        """
+        data = self.read(path)
+        end = data.rfind('\n') + 1
+        if end < len(data):
+            logger.warning("Dropped a partial record at the end of '{}'."
+                           .format(path))
+            data = data[:end]
+            self.replace(path, data)
+        return data.splitlines()
+
+    @contextmanager
+    def group(self):
+        """
+        Commit every write made inside the block together, even if it
+        raises. No commit writes the block's files until it ends, and other
+        threads waiting on those files wait for it, so the block must not
+        wait for a lock that is held while writing them.
+        """
+        depth = getattr(self._local, 'depth', 0)
+        if depth == 0:
+            self._local.written = {}  # path -> ticket of the latest write
+        self._local.depth = depth + 1
+        try:
+            yield self
+        finally:
+            self._local.depth = depth
+            if depth == 0:
+                written, self._local.written = self._local.written, None
+                with self._cond:
+                    for path in written:
+                        self._held[path] -= 1
+                        if not self._held[path]:
+                            del self._held[path]
+                    self._cond.notify_all()
+                self._wait(written)
+
+    def flush(self):
+        """ Commit every pending write now, except those of open groups. """
+        with self._cond:
+            tickets = {path: self._tickets[path] for path in self._pending
+                       if path not in self._held}
+        self._wait(tickets, force=True)
+
+    def _wait(self, tickets, force=False):
+        """
+        Block until the writes with the given tickets are committed, leading
+        a commit if no other thread is doing it.
+
+        :param tickets: path -> ticket of the write to wait for (dict).
+        :param force: wait even if the mode does not (bool).
+        """
+        if not force and (self.mode != 'always' or
+                          getattr(self._local, 'depth', 0)):
+            return
+        with self._cond:
+            while True:
+                waiting = [path for path, ticket in tickets.items()
+                           if self._done.get(path, 0) < ticket]
+                if not waiting:
+                    break
+                if self._flushing or all(path in self._held
+                                         for path in waiting):
+                    self._cond.wait()
+                else:
+                    self._commit()
+            for path, ticket in tickets.items():
+                failed = self._failed.get(path)
+                if failed and failed[0] >= ticket:
+                    raise failed[1]
+
+    def _commit(self):
+        """
+        Write out everything pending that no open group holds (called
+        holding the condition).
+        """
+        pending = {path: self._pending.pop(path) for path in
+                   list(self._pending) if path not in self._held}
+        tickets = {path: self._tickets[path] for path in pending}
+        self._writing = set(pending)
+        self._flushing = True
+        self._cond.release()
+        error = None
+        try:
+            for path, (data, appended) in pending.items():
+                self._write(path, data, appended)
+            self._sync_dirs(pending)
+        except OSError as exc:
+            logger.error("Failed to commit writes: {}".format(exc))
+            error = exc
+        finally:
+            self._cond.acquire()
+            for path, ticket in tickets.items():
+                self._done[path] = ticket
+                if error is None:
+                    self._failed.pop(path, None)
+                else:
+                    self._failed[path] = (ticket, error)
+            self._writing = ()
+            self._flushing = False
+            self._cond.notify_all()
+
+    @staticmethod
+    def _write(path, data, appended, sync=True):
+        """ Durably (if sync) write one file's pending contents. """
+        if data is None:
+            with open(path, 'a') as f:
+                f.write(appended)
+                f.flush()
+                os.fsync(f.fileno())
+        else:
+            temp_path = path + '.tmp'
+            with open(temp_path, 'w') as f:
+                f.write(data + appended)
+                if sync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(temp_path, path)
+
+    @staticmethod
+    def _sync_dirs(paths):
+        """ Make the renames durable where the platform allows it. """
+        if not hasattr(os, 'O_DIRECTORY'):
+            return
+        for folder in {os.path.dirname(os.path.abspath(p)) for p in paths}:
+            fd = os.open(folder, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def _flush_loop(self):
+        """ Commit pending writes every interval milliseconds. """
+        while True:
+            time.sleep(self.interval / 1000)
+            if self._pending:
+                self.flush()
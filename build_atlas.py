@@ -0,0 +1,15 @@
+# Filename: build_atlas.py
+# Packs every GIF under img/ into one atlas image and writes where each one
+# is to the atlas manifest, which ImageCache then copies them out of. Run it
+# again after adding or changing an image. Usage: python build_atlas.py
+
+import tkinter as tk
+
+from __init__ import atlas_file, atlas_manifest_file
+from _images import build_atlas
+
+root = tk.Tk()
+root.withdraw()
+print("Packed {} images into '{}'.".format(
+    build_atlas('img', atlas_file, atlas_manifest_file), atlas_file))
+root.destroy()
@@ -39,20 +39,19 @@ class VirtualWorld(tk.Tk):
 
         tk.Tk.iconbitmap(self, default="img/virtualworld_logo.ico")
         tk.Tk.wm_title(self, "Virtual World")
-        container = ttk.Frame(self)
-        container.grid(row=0, column=0)
-        container.grid_rowconfigure(0, weight=1)
-        container.grid_columnconfigure(0, weight=1)
-
-        self.frames = {}
-        for file in (UserPage, LoginPage, SignupPage, SettingsPage, ShopPage,
-                     CoffeeShopPage, TechShopPage, PizzaShopPage):
-            frame = file(container, self)
-            self.frames[file] = frame
-            frame.grid(row=0, column=0, sticky="nsew")
+        self.container = ttk.Frame(self)
+        self.container.grid(row=0, column=0)
+        self.container.grid_rowconfigure(0, weight=1)
+        self.container.grid_columnconfigure(0, weight=1)
+
+        self.cart = Cart()  # Every shop's order, paid for at one checkout
+        self.frames = {}  # Only the frames built so far, see frame()
+        self.prewarm_queue = [UserPage, ShopPage, SettingsPage, SignupPage,
+                              CoffeeShopPage, TechShopPage, PizzaShopPage]
 
         self.show_frame(LoginPage)
         self.init_window()
+        self.after_idle(self.started)
 
     def init_window(self):
         """ Create the upper Menu bar (for all frames). """
@@ -76,18 +75,90 @@ class VirtualWorld(tk.Tk):
         help_menu.add_command(label='Search')
         _menu.add_cascade(label="Help", menu=help_menu)
 
+    def started(self):
+        """
+        Log how long the LoginPage took to become usable, then check the data
+        files on a worker thread and start building the other frames while
+        the user is idle.
+        """
+        elapsed = (time.perf_counter() - LAUNCH_TIME) * 1000
+        if elapsed > STARTUP_BUDGET:
+            logger.warning("Startup took {:.0f} ms, over the {} ms budget."
+                           .format(elapsed, STARTUP_BUDGET))
+        else:
+            logger.info("Startup took {:.0f} ms.".format(elapsed))
+        images.log_stats()
+        workers.run(self, Check.file)
+        if PREWARM_FRAMES:
+            images.preload(self, *self.prewarm_images())
+            self.after(PREWARM_DELAY, self.prewarm)
+
+    def prewarm_images(self):
+        """
+        Get the images shown by the frames that have not been built yet.
+
+        :return: their image files (list of str) and (file, PhotoImage
+                 options) of the ones shown resized (list of tuple).
+        """
+        paths, variants = [], []
+        for cont in self.prewarm_queue:
+            if cont in self.frames:
+                continue
+            paths.extend(path for path in cont.image_files
+                         if path not in paths)
+            if issubclass(cont, ShopFrame):
+                variants.append((cont.logo_file,
+                                 {"height": cont.logo_height}))
+        return paths, variants
+
+    def prewarm(self):
+        """
+        Build the next frame that has not been built yet, one per idle
+        period so the user's input is never held up for long.
+        """
+        while self.prewarm_queue and self.prewarm_queue[0] in self.frames:
+            self.prewarm_queue.pop(0)
+        if self.prewarm_queue:
+            self.frame(self.prewarm_queue.pop(0))
+            self.after(PREWARM_INTERVAL,
+                       lambda: self.after_idle(self.prewarm))
+
+    def frame(self, cont):
+        """
+        Get a frame, building it the first time it is needed.
+
+        :param cont: the frame's class (tk.Frame).
+        :return: the frame (tk.Frame).
+        """
+        frame = self.frames.get(cont)
+        if frame is None:
+            start = time.perf_counter()
+            frame = self.frames[cont] = cont(self.container, self)
+            frame.grid(row=0, column=0, sticky="nsew")
+            frame.lower()  # Built frames start out of the user's view
+            logger.debug("Built {} in {:.0f} ms.".format(
+                cont.__name__, (time.perf_counter() - start) * 1000))
+            images.log_stats()
+        return frame
+
     def show_frame(self, cont):
         """ Bring frame to the user's view. """
-        frame = self.frames[cont]
+        frame = self.frame(cont)
         frame.tkraise()
 
     def hide_frame(self, cont):
         """ Send frame away from the user's view. """
-        frame = self.frames[cont]
-        frame.lower()
+        if cont in self.frames:
+            self.frames[cont].lower()
 
-    def menu_bar(self, controller):
-        """ Create the lower Menu bar (for most frames). """
+    def menu_bar(self, controller, row=22):
+        """
+        Create the lower Menu bar (for most frames).
+
+        :param controller: the Virtual World window (VirtualWorld).
+        :param row: the grid row to put it in (int).
+        """
+        self.menu_row = row
         self.balance = User.get_current()['balance']
 
         hidden = True
@@ -116,14 +187,16 @@ class VirtualWorld(tk.Tk):
             newest_balance = current_user()["balance"]
             if self.balance == newest_balance:
                 if hidden:
-                    balance_label.grid(row=22, column=1, columnspan=11)
+                    balance_label.grid(row=self.menu_row, column=1,
+                                       columnspan=11)
                 else:
                     balance_label.grid_remove()
             elif self.balance != newest_balance:
                 if hidden:
                     self.balance = newest_balance
                     balance_label.configure(text='Balance: $' + self.balance)
-                    balance_label.grid(row=22, column=1, columnspan=11)
+                    balance_label.grid(row=self.menu_row, column=1,
+                                       columnspan=11)
                 else:
                     balance_label.grid_remove()
             else:
@@ -132,39 +205,39 @@ class VirtualWorld(tk.Tk):
 
         # Menu bar buttons
 
-        balance_img = tk.PhotoImage(file="img/menu/balance_button.gif")
+        balance_img = images.get("img/menu/balance_button.gif")
         balance_button = tk.Button(self, compound=tk.TOP, relief="flat",
                                    width=30, height=30, image=balance_img,
                                    command=toggle_entry)
-        balance_button.grid(row=22, column=1, sticky="W", pady=20)
+        balance_button.grid(row=row, column=1, sticky="W", pady=20)
         balance_button.image = balance_img
 
-        setting_img = tk.PhotoImage(file="img/menu/settings_button.gif")
+        setting_img = images.get("img/menu/settings_button.gif")
         setting_button = tk.Button(self, compound=tk.TOP, relief="flat",
                                    width=30, height=30, image=setting_img,
                                    command=lambda:
                                    controller.show_frame(SettingsPage))
-        setting_button.grid(row=22, column=0, sticky="E", pady=20)
+        setting_button.grid(row=row, column=0, sticky="E", pady=20)
         setting_button.image = setting_img
 
-        help_img = tk.PhotoImage(file="img/menu/help_button.gif")
+        help_img = images.get("img/menu/help_button.gif")
         help_button = tk.Button(self, compound=tk.TOP, relief="flat",
                                 width=30, height=30, image=help_img)
-        help_button.grid(row=22, column=1, sticky="E", pady=20, padx=13)
+        help_button.grid(row=row, column=1, sticky="E", pady=20, padx=13)
         help_button.image = help_img
 
-        home_img = tk.PhotoImage(file="img/menu/home_button.gif")
+        home_img = images.get("img/menu/home_button.gif")
         home_button = tk.Button(self, compound=tk.TOP, relief="flat", width=30,
                                 height=30, image=home_img, command=lambda:
                                 controller.show_frame(UserPage))
-        home_button.grid(row=22, column=0, sticky="W", padx=13, pady=20)
+        home_button.grid(row=row, column=0, sticky="W", padx=13, pady=20)
         home_button.image = home_img
 
-        back_img = tk.PhotoImage(file="img/menu/back_button.gif")
+        back_img = images.get("img/menu/back_button.gif")
         back_button = tk.Button(self, relief="flat", width=80, height=40,
                                 image=back_img,
                                 command=lambda: self.back_button())
-        back_button.grid(row=22, column=10, columnspan=5, sticky="E")
+        back_button.grid(row=row, column=10, columnspan=5, sticky="E")
         back_button.image = back_img
 
     def back_button(self):
@@ -174,9 +247,8 @@ class VirtualWorld(tk.Tk):
     def logout(self):
         """ Append current_user_file with a guest user then show LoginPage. """
         user = "Guest" + ',' + "None" + ',' + "50" + ',' + "1000000"
-        with open(current_user_file, 'w') as f:
-            f.write(user)
-        self.show_frame(LoginPage)
+        workers.run(self, lambda: file_writer.replace(current_user_file, user),
+                    lambda _: self.show_frame(LoginPage))
 
 
 class LoginPage(tk.Frame):
@@ -187,7 +259,7 @@ class LoginPage(tk.Frame):
         self.controller = controller
 
         # Header image
-        self.Logo = tk.PhotoImage(file="img/logo.gif")
+        self.Logo = images.get("img/logo.gif")
         self.login_page_logo = tk.Label(self, image=self.Logo)
         self.login_page_logo.grid(row=0, rowspan=12, column=0, columnspan=16)
 
@@ -219,7 +291,7 @@ class LoginPage(tk.Frame):
         # Buttons
 
         # Sign up button
-        self.signup_img = tk.PhotoImage(file="img/menu/signup_button.gif")
+        self.signup_img = images.get("img/menu/signup_button.gif")
         signup_command = (lambda: controller.show_frame(SignupPage))
         self.signup_button = tk.Button(self, compound=tk.TOP, relief="flat",
                                        width=80, height=40,
@@ -230,17 +302,17 @@ class LoginPage(tk.Frame):
         self.signup_button.image = self.signup_img
 
         # Sign in button
-        sign_in_img = tk.PhotoImage(file="img/menu/submit_button.gif")
+        sign_in_img = images.get("img/menu/submit_button.gif")
         sign_in_command = (lambda: self.sign_in_button())
-        sign_in_button = tk.Button(self, compound=tk.TOP, relief="flat",
-                                   width=80, height=40, image=sign_in_img,
-                                   command=sign_in_command)
-        sign_in_button.grid(row=18, column=6, columnspan=5, sticky="E",
-                            padx=20, pady=5)
-        sign_in_button.image = sign_in_img
+        self.sign_in = tk.Button(self, compound=tk.TOP, relief="flat",
+                                 width=80, height=40, image=sign_in_img,
+                                 command=sign_in_command)
+        self.sign_in.grid(row=18, column=6, columnspan=5, sticky="E",
+                          padx=20, pady=5)
+        self.sign_in.image = sign_in_img
 
         # Guest user button
-        guest_img = tk.PhotoImage(file="img/menu/guest_button.gif")
+        guest_img = images.get("img/menu/guest_button.gif")
         guest_button = tk.Button(self, compound=tk.TOP, relief="flat",
                                  width=150, height=40, image=guest_img,
                                  command=lambda: self.guest_button())
@@ -250,15 +322,12 @@ class LoginPage(tk.Frame):
 
     def sign_in_button(self):
         """
-        Check user's info and sign them in.
+        Check user's info and sign them in, on a worker thread.
 
-        :return: False - If user does not exist.
+        :return: False - If no username was entered.
         """
         username = self.username.get()
         password = self.password.get()
-        name_and_pass = username + ',' + password
-        full_user_data = Check.all_user_data(name_and_pass)
-        # Attempt to get all of the user's data if user in the user_data_file
         if username == "":
             if username == "" and password == "":
                 logger.info("Entering nothing will not work.")
@@ -268,36 +337,56 @@ class LoginPage(tk.Frame):
             self.error_label_2.configure(text="Username/Password",
                                          foreground="red")
             return False
-        elif Check.in_user_data(full_user_data):
-            with open(current_user_file, 'w') as f:
-                f.write(full_user_data)
+
+        def sign_in():
+            """ Check the credentials, then save the current user. """
+            if not Check.credentials(username, password):
+                return False
+            full_user_data = Check.all_user_data(username + ',' + password)
+            file_writer.replace(current_user_file, full_user_data)
+            return True
+
+        workers.run(self, sign_in, lambda accepted: self.signed_in(
+            username, accepted), busy=(self.sign_in,))
+
+    def signed_in(self, username, accepted):
+        """
+        Show whether the user was signed in, then take them to the UserPage
+        if they were.
+
+        :param username: user's login name (str).
+        :param accepted: whether the username and password match (bool).
+        """
+        if accepted:
             self.error_label.configure(text="User", foreground="green")
             self.error_label_2.configure(text="Accepted!", foreground="green")
             success_command = (lambda: self.controller.show_frame(UserPage))
             self.error_label_2.after(1250, success_command)
-            logger.info("User '{}' Exists!".format(self.username.get()))
+            logger.info("User '{}' Exists!".format(username))
         else:
             logger.info("Incorrect Username/Password")
             self.error_label.configure(text="Incorrect", foreground="red")
             self.error_label_2.configure(text="Username/Password",
                                          foreground="red")
-            return False
 
     def guest_button(self):
         """" Take the user (without a login) to the user homepage. """
-        with open(current_user_file, 'w') as f:
-            f.write('Guest,None,50,1000000')
-        self.controller.show_frame(UserPage)
+        workers.run(self, lambda: file_writer.replace(
+            current_user_file, 'Guest,None,50,1000000'),
+            lambda _: self.controller.show_frame(UserPage))
 
 
 class SignupPage(tk.Frame):
+    image_files = ("img/logo.gif", "img/menu/back_button.gif",
+                   "img/menu/submit_button.gif")
+
     def __init__(self, parent, controller):
         """ Signup frame of Virtual World. """
         tk.Frame.__init__(self, parent)
         self.controller = controller
 
         # Header image
-        self.Logo = tk.PhotoImage(file="img/logo.gif")
+        self.Logo = images.get("img/logo.gif")
         self.sign_in_logo = tk.Label(self, image=self.Logo)
         self.sign_in_logo.grid(row=0, rowspan=12, column=0, columnspan=16)
 
@@ -338,7 +427,7 @@ class SignupPage(tk.Frame):
         # Buttons
 
         # Back button
-        back_img = tk.PhotoImage(file="img/menu/back_button.gif")
+        back_img = images.get("img/menu/back_button.gif")
         back_button = tk.Button(self, relief="flat", width=80, height=40,
                                 image=back_img,
                                 command=lambda: self.back_button())
@@ -346,13 +435,13 @@ class SignupPage(tk.Frame):
         back_button.image = back_img
 
         # Submit button
-        submit_img = tk.PhotoImage(file="img/menu/submit_button.gif")
-        submit_button = tk.Button(self, compound=tk.TOP, relief="flat",
-                                  width=80, height=40, image=submit_img,
-                                  command=lambda: self.submit_button())
-        submit_button.grid(row=21, column=6, columnspan=5, sticky="E",
-                           padx=20, pady=5)
-        submit_button.image = submit_img
+        submit_img = images.get("img/menu/submit_button.gif")
+        self.submit = tk.Button(self, compound=tk.TOP, relief="flat",
+                                width=80, height=40, image=submit_img,
+                                command=lambda: self.submit_button())
+        self.submit.grid(row=21, column=6, columnspan=5, sticky="E",
+                         padx=20, pady=5)
+        self.submit.image = submit_img
 
     def back_button(self):
         """ Raise the LoginPage frame to the user's view. """
@@ -360,20 +449,38 @@ class SignupPage(tk.Frame):
 
     def create_user(self, username, password, age):
         """
-        Adds the user to the text file, shows a success message, then returns
-        the user back to the LoginPage frame.
+        Adds the user to the text file on a worker thread, then shows a
+        success message and returns the user back to the LoginPage frame.
         """
-        User.new(username, password, age)
+        workers.run(self, lambda: User.new(username, password, age),
+                    lambda _: self.user_created(), busy=(self.submit,))
+
+    def user_created(self):
+        """ Show the success message, then go back to the LoginPage. """
         self.name_error_label.configure(text="")  # ttk label
         self.pwd_error_label.configure(text="", )  # ttk label
         self.age_error_label.configure(text="User Created!", fg="green")  # tk
         self.age_error_label.after(2500, self.back_button)
 
     def submit_button(self):
-        """ Check user input then output a success/fail message. """
+        """
+        Check the username is free on a worker thread, then check the rest
+        of the user input.
+        """
+        username = self.username.get()
+        workers.run(self, lambda: Check.username(username),
+                    lambda valid: self.checked(username, valid),
+                    busy=(self.submit,))
+
+    def checked(self, username, valid):
+        """
+        Output a success/fail message for the user input.
+
+        :param username: the username that was checked (str).
+        :param valid: whether the username can be used (bool).
+        """
         # TODO: Fix this so that it is a validatecommand.
-        if Check.username(self.username.get()):
-            username = self.username.get()
+        if valid:
             if Check.password(self.password.get()):
                 password = self.password.get()
                 if Check.age(self.age.get()):
@@ -397,6 +504,9 @@ class SignupPage(tk.Frame):
 
 
 class UserPage(tk.Frame):
+    image_files = ("img/logo.gif", "img/shops/shop_button.gif",
+                   "img/games/game_button.gif", "img/tasks/task_button.gif",
+                   "img/menu/back_button.gif")
 
     def __init__(self, parent, controller):
         """ User's homepage frame of Virtual World. """
@@ -404,7 +514,7 @@ class UserPage(tk.Frame):
         self.controller = controller
 
         # Header image
-        self.Logo = tk.PhotoImage(file="img/logo.gif")
+        self.Logo = images.get("img/logo.gif")
         self.user_page_logo = tk.Label(self, image=self.Logo)
         self.user_page_logo.grid(row=0, rowspan=12, column=0, columnspan=16)
 
@@ -415,7 +525,7 @@ class UserPage(tk.Frame):
         # Buttons
 
         # Shops button
-        shop_img = tk.PhotoImage(file="img/shops/shop_button.gif")
+        shop_img = images.get("img/shops/shop_button.gif")
         shop_button = tk.Button(self, relief="flat", width=80, height=40,
                                 image=shop_img,
                                 command=lambda: self.shops_button())
@@ -423,7 +533,7 @@ class UserPage(tk.Frame):
         shop_button.image = shop_img
 
         # Games button
-        game_img = tk.PhotoImage(file="img/games/game_button.gif")
+        game_img = images.get("img/games/game_button.gif")
         game_button = tk.Button(self, relief="flat", width=80, height=40,
                                 image=game_img,
                                 command=lambda: self.games_button())
@@ -431,7 +541,7 @@ class UserPage(tk.Frame):
         game_button.image = game_img
 
         # Tasks button
-        task_img = tk.PhotoImage(file="img/tasks/task_button.gif")
+        task_img = images.get("img/tasks/task_button.gif")
         task_button = tk.Button(self, relief="flat", width=80, height=40,
                                 image=task_img,
                                 command=lambda: self.tasks_button())
@@ -439,7 +549,7 @@ class UserPage(tk.Frame):
         task_button.image = task_img
 
         # Back button
-        back_img = tk.PhotoImage(file="img/menu/back_button.gif")
+        back_img = images.get("img/menu/back_button.gif")
         back_button = tk.Button(self, relief="flat", width=80, height=40,
                                 image=back_img,
                                 command=lambda: self.back_button())
@@ -463,12 +573,18 @@ class UserPage(tk.Frame):
     def back_button(self):
         """ Append current_user_file with a guest user then show LoginPage. """
         user = "Guest,None,50,1000000"
-        with open(current_user_file, 'w') as f:
-            f.write(user)
-        self.controller.show_frame(LoginPage)
+        workers.run(self, lambda: file_writer.replace(current_user_file, user),
+                    lambda _: self.controller.show_frame(LoginPage))
 
 
 class SettingsPage(tk.Frame):
+    image_files = ("img/logo.gif", "img/settings/change_name.gif",
+                   "img/settings/change_password.gif",
+                   "img/settings/change_age.gif",
+                   "img/settings/delete_user.gif", "img/menu/back_button.gif")
+    # The new value label of each setting, None if it takes no new value
+    new_value_labels = {"Name": "New Username:", "Password": "New Password:",
+                        "Age": "New Age:", "Delete": None}
 
     def __init__(self, parent, controller):
         """ Settings frame of Virtual World. """
@@ -476,7 +592,7 @@ class SettingsPage(tk.Frame):
         self.controller = controller
 
         # Header image
-        self.Logo = tk.PhotoImage(file="img/logo.gif")
+        self.Logo = images.get("img/logo.gif")
         self.settings_page_logo = tk.Label(self, image=self.Logo)
         self.settings_page_logo.grid(row=0, rowspan=12, column=0,
                                      columnspan=16)
@@ -489,7 +605,7 @@ class SettingsPage(tk.Frame):
 
         # Name change button
         name_change_link = "img/settings/change_name.gif"
-        name_change_img = tk.PhotoImage(file=name_change_link)
+        name_change_img = images.get(name_change_link)
         name_window = (lambda: self.open_window("Name"))
         name_change_button = tk.Button(self, relief="flat", width=120,
                                        height=30, image=name_change_img,
@@ -499,7 +615,7 @@ class SettingsPage(tk.Frame):
 
         # Password change button
         pwd_change_link = "img/settings/change_password.gif"
-        pwd_change_img = tk.PhotoImage(file=pwd_change_link)
+        pwd_change_img = images.get(pwd_change_link)
         pwd_window = (lambda: self.open_window("Password"))
         pwd_change_button = tk.Button(self, relief="flat", width=120,
                                       height=30, image=pwd_change_img,
@@ -509,7 +625,7 @@ class SettingsPage(tk.Frame):
 
         # Age change button
         age_change_link = "img/settings/change_age.gif"
-        age_change_img = tk.PhotoImage(file=age_change_link)
+        age_change_img = images.get(age_change_link)
         age_window = (lambda: self.open_window("Age"))
         age_change_button = tk.Button(self, relief="flat", width=120,
                                       height=30, image=age_change_img,
@@ -519,7 +635,7 @@ class SettingsPage(tk.Frame):
 
         # Delete button
         del_user_link = "img/settings/delete_user.gif"
-        del_user_img = tk.PhotoImage(file=del_user_link)
+        del_user_img = images.get(del_user_link)
         del_window = (lambda: self.open_window("Delete"))
         del_user_button = tk.Button(self, relief="flat", width=120, height=30,
                                     image=del_user_img, command=del_window)
@@ -527,7 +643,7 @@ class SettingsPage(tk.Frame):
         del_user_button.image = del_user_img
 
         # Back button
-        back_img = tk.PhotoImage(file="img/menu/back_button.gif")
+        back_img = images.get("img/menu/back_button.gif")
         back_button = tk.Button(self, relief="flat", width=80, height=40,
                                 image=back_img,
                                 command=lambda: self.back_button())
@@ -537,83 +653,111 @@ class SettingsPage(tk.Frame):
         VirtualWorld.menu_bar(self, controller)
 
         self.toplevel = None
+        dialogs.prebuild(self, "settings", self.build_window)
 
     def open_window(self, setting):
         """
-        Create a Username and Password window for verifying user information
-        for changing settings, and provide a Toplevel for entries to be added.
+        Open a Username and Password window for verifying user information
+        for changing settings, reusing the window from the last time.
 
         :return: False - If current user is a guest.
         """
         if self.toplevel is None:
-            current_user = Check.file()['current_user']
-            if 'Guest,None,50,1000000' in list(current_user):
+            current_user = file_writer.read(current_user_file)
+            if 'Guest,None,50,1000000' in current_user.splitlines():
                 logger.info('Guest users cannot change their information!')
                 return False
 
-            self.toplevel = tk.Toplevel(self)
-            self.toplevel.protocol('WM_DELETE_WINDOW',
-                                   lambda: self.remove_window())
-            self.toplevel.focus_set()
-            self.toplevel.resizable(width=False, height=False)
+            self.toplevel = dialogs.open(self, "settings", self.build_window)
             self.toplevel.setting = setting
             self.toplevel.title(setting)
 
-            # Username and password labels and entries
-
-            # Username label and entry
-            username_label = ttk.Label(self.toplevel, text="Username:",
-                                       font=MEDIUM_FONT)
-            username_label.grid(row=0, column=0, sticky="W", pady=5, padx=12)
-            self.toplevel.username = ttk.Entry(self.toplevel)
-            self.toplevel.username.grid(row=1, column=0, padx=15)
-
-            # Password label and entry
-            password_label = ttk.Label(self.toplevel, text="Password:",
-                                       font=MEDIUM_FONT)
-            password_label.grid(row=2, column=0, sticky="W", pady=5, padx=12)
-            self.toplevel.password = ttk.Entry(self.toplevel, show="*")
-            self.toplevel.password.grid(row=3, column=0, padx=15)
-
-            # Buttons
-
-            # Submit button
-            submit_command = (lambda: self.submit_button())
-            self.toplevel.submit = ttk.Button(self.toplevel, text="Submit",
-                                              command=submit_command)
-            self.toplevel.submit.grid(row=6, column=0, sticky="W", pady=5,
-                                      padx=3)
-
-            # Cancel button
-            cancel_command = (lambda: self.remove_window())
-            self.toplevel.cancel = ttk.Button(self.toplevel, text="Cancel",
-                                              command=cancel_command)
-            self.toplevel.cancel.grid(row=6, column=0, sticky="E", pady=5)
-
-            # Error label
-            self.toplevel.user_info = ttk.Label(self.toplevel, text="",
-                                                font=MEDIUM_FONT)
-            self.toplevel.user_info.grid(row=8, column=0)
+            # Only the fields that change between settings
+            self.toplevel.username.delete(0, tk.END)
+            self.toplevel.password.delete(0, tk.END)
+            self.toplevel.new_value.delete(0, tk.END)
+            self.toplevel.new_label.grid_remove()
+            self.toplevel.new_value.grid_remove()
+            self.toplevel.submit.configure(
+                text="Submit", command=lambda: self.submit_button())
+            self.toplevel.user_info.configure(text="")
+            self.toplevel.username.focus_set()
 
-            # Toplevel position
-            w = 157  # Width for toplevel
-            h = 220  # Height for toplevel
+    def build_window(self, toplevel):
+        """
+        Lay out the widgets of the settings window, once for every time it
+        is opened.
 
-            ws = self.toplevel.winfo_screenwidth()  # Width of the screen
-            hs = self.toplevel.winfo_screenheight()  # Height of the screen
+        :param toplevel: the new window (tk.Toplevel).
+        """
+        toplevel.protocol('WM_DELETE_WINDOW', lambda: self.remove_window())
+        toplevel.resizable(width=False, height=False)
 
-            # Calculate x and y coordinates for the Tk root window
-            x = (ws / 2) - (w / 2)
-            y = (hs / 2) - (h / 2)
+        # Username and password labels and entries
 
-            # Set the dimensions of the screen and where it is placed
-            self.toplevel.geometry('%dx%d+%d+%d' % (w, h, x, y - 30))
-            self.toplevel.mainloop()
+        # Username label and entry
+        username_label = ttk.Label(toplevel, text="Username:",
+                                   font=MEDIUM_FONT)
+        username_label.grid(row=0, column=0, sticky="W", pady=5, padx=12)
+        toplevel.username = ttk.Entry(toplevel)
+        toplevel.username.grid(row=1, column=0, padx=15)
 
-    def remove_window(self):
-        """ Remove the toplevel (username and password) window. """
-        self.toplevel.destroy()
-        self.toplevel = None
+        # Password label and entry
+        password_label = ttk.Label(toplevel, text="Password:",
+                                   font=MEDIUM_FONT)
+        password_label.grid(row=2, column=0, sticky="W", pady=5, padx=12)
+        toplevel.password = ttk.Entry(toplevel, show="*")
+        toplevel.password.grid(row=3, column=0, padx=15)
+
+        # New value label and entry, shown once the user is checked
+        toplevel.new_label = ttk.Label(toplevel, text="", font=MEDIUM_FONT)
+        toplevel.new_label.grid(row=4, column=0, sticky="W", pady=5, padx=12)
+        toplevel.new_value = ttk.Entry(toplevel)
+        toplevel.new_value.grid(row=5, column=0)
+
+        # Buttons
+
+        # Submit button, which becomes the change button
+        toplevel.submit = ttk.Button(toplevel, text="Submit")
+        toplevel.submit.grid(row=6, column=0, sticky="W", pady=5, padx=3)
+
+        # Cancel button
+        cancel_command = (lambda: self.remove_window())
+        toplevel.cancel = ttk.Button(toplevel, text="Cancel",
+                                     command=cancel_command)
+        toplevel.cancel.grid(row=6, column=0, sticky="E", pady=5)
+
+        # Error label
+        toplevel.user_info = ttk.Label(toplevel, text="", font=MEDIUM_FONT)
+        toplevel.user_info.grid(row=8, column=0)
+
+        # Toplevel position
+        w = 157  # Width for toplevel
+        h = 220  # Height for toplevel
+
+        ws = toplevel.winfo_screenwidth()  # Width of the screen
+        hs = toplevel.winfo_screenheight()  # Height of the screen
+
+        # Calculate x and y coordinates for the Tk root window
+        x = (ws / 2) - (w / 2)
+        y = (hs / 2) - (h / 2)
+
+        # Set the dimensions of the screen and where it is placed
+        toplevel.geometry('%dx%d+%d+%d' % (w, h, x, y - 30))
+
+    def remove_window(self, opened=None):
+        """
+        Close the toplevel (username and password) window, keeping it to
+        open again.
+
+        :param opened: only close it if it has not been reopened since it
+                       was opened this many times, or None to close it
+                       anyway (int).
+        """
+        if self.toplevel is not None and opened in (None,
+                                                    self.toplevel.opened):
+            dialogs.close(self.toplevel)
+            self.toplevel = None
 
     def back_button(self):
         """ Remove the SettingsPage frame from the user's view. """
@@ -621,80 +765,78 @@ class SettingsPage(tk.Frame):
 
     def submit_button(self):
         """
-        Check user input and change the setting window for the specified
-        setting.
+        Check user input, checking the user's credentials on a worker thread.
 
-        :return: False - If user data is incorrect or if there is no data.
-        :raise: NameError: Setting name is invalid!
+        :return: False - If there is no data.
         """
         username = self.toplevel.username.get()
         password = self.toplevel.password.get()
         user_info = username + ',' + password
-
-        change_name = (lambda: self.change_name(new_name.get()))
-        change_pwd = (lambda: self.change_password(new_password.get()))
-        change_age = (lambda: self.change_age(self.toplevel.new_age.get()))
-        del_user = (lambda: self.delete_user(username))
+        opened = self.toplevel.opened
 
         if user_info == ',':
             logger.info("Nothing was entered")
             self.toplevel.user_info.configure(text="Nothing entered!",
                                               foreground="red")
             return False
+        workers.run(self.toplevel,
+                    lambda: Check.credentials(username, password),
+                    lambda valid: self.show_setting(username, valid, opened),
+                    busy=(self.toplevel.submit,))
 
-        elif Check.in_user_data(Check.all_user_data(user_info)):
+    def show_setting(self, username, valid, opened):
+        """
+        Change the setting window for the specified setting, if the user's
+        credentials were correct.
+
+        :param username: user's login name (str).
+        :param valid: whether the username and password match (bool).
+        :param opened: the window's opened count when it was checked (int).
+        :return: False - If user data is incorrect or the window was closed.
+        :raise: NameError: Setting name is invalid!
+        """
+        if not dialogs.is_open(self.toplevel, opened):
+            return False
+
+        new_value = self.toplevel.new_value
+        commands = {
+            "Name": (lambda: self.change_name(new_value.get())),
+            "Password": (lambda: self.change_password(new_value.get())),
+            "Age": (lambda: self.change_age(new_value.get())),
+            "Delete": (lambda: self.delete_user(username))}
+
+        if valid:
             logger.info("User '{}' Exists!".format(username))
-            if self.toplevel.setting == "Name":
-                # New user label and entry
-                new_name_label = ttk.Label(self.toplevel, font=MEDIUM_FONT,
-                                           text=" New Username:")
-                new_name_label.grid(row=4, column=0, sticky="W", pady=5,
-                                    padx=7)
-                new_name = ttk.Entry(self.toplevel)
-                new_name.grid(row=5, column=0)
-                # Change name button
-                self.toplevel.submit = ttk.Button(self.toplevel, text="Change",
-                                                  command=change_name)
-                self.toplevel.submit.grid(row=6, column=0, sticky="W", pady=5,
-                                          padx=3)
-            elif self.toplevel.setting == "Password":
-                # New password label and entry
-                new_password_label = ttk.Label(self.toplevel,
-                                               text="New Password:",
-                                               font=MEDIUM_FONT)
-                new_password_label.grid(row=4, column=0, sticky="W", pady=5,
-                                        padx=12)
-                new_password = ttk.Entry(self.toplevel)
-                new_password.grid(row=5, column=0)
-                # Change password button
-                self.toplevel.submit = ttk.Button(self.toplevel, text="Change",
-                                                  command=change_pwd)
-                self.toplevel.submit.grid(row=6, column=0, sticky="W", pady=5,
-                                          padx=3)
-            elif self.toplevel.setting == "Age":
-                # New age label and entry
-                new_age_label = ttk.Label(self.toplevel, text="New Age:",
-                                          font=MEDIUM_FONT)
-                new_age_label.grid(row=4, column=0, sticky="W", pady=5,
-                                   padx=12)
-                self.toplevel.new_age = ttk.Entry(self.toplevel)
-                self.toplevel.new_age.grid(row=5, column=0)
-                # Change age button
-                self.toplevel.submit = ttk.Button(self.toplevel, text="Change",
-                                                  command=change_age)
-                self.toplevel.submit.grid(row=6, column=0, sticky="W", pady=5,
-                                          padx=3)
-            elif self.toplevel.setting == "Delete":
+            setting = self.toplevel.setting
+            if setting not in commands:
+                raise NameError("Setting name is invalid!")
+            self.toplevel.user_info.configure(text="")
+            if self.new_value_labels[setting] is None:
                 # Delete button
-                delete_button = ttk.Button(self.toplevel, text="Delete User",
-                                           command=del_user)
-                delete_button.grid(row=6, column=0, sticky="W", pady=5, padx=3)
+                self.toplevel.submit.configure(text="Delete User",
+                                               command=commands[setting])
             else:
-                raise NameError("Setting name is invalid!")
+                # New value label and entry, and change button
+                self.toplevel.new_label.configure(
+                    text=self.new_value_labels[setting])
+                self.toplevel.new_label.grid()
+                self.toplevel.new_value.grid()
+                self.toplevel.submit.configure(text="Change",
+                                               command=commands[setting])
         else:
             logger.info("User does not exist!")
             return False
 
+    def show_result(self, text, accepted):
+        """
+        Show the result of a change in the setting window.
+
+        :param text: the message (str).
+        :param accepted: whether the change was made (bool).
+        """
+        self.toplevel.user_info.configure(
+            text=text, foreground="green" if accepted else "red")
+
     def change_name(self, new_name):
         """
         Change the user's name if the new name is valid, decline the username
@@ -702,21 +844,44 @@ class SettingsPage(tk.Frame):
 
         :param new_name: This is user's new name (str).
         """
-        if Check.username(new_name):
-            # Success label
-            success_label = ttk.Label(self.toplevel, text="Username Accepted!",
-                                      foreground="green")
-            success_label.grid(row=8, rowspan=2, column=0, pady=5, padx=12)
+        old_name = self.toplevel.username.get()
+        opened = self.toplevel.opened
 
-            old_name = self.toplevel.username.get()
+        def change():
+            """ Change the name if it is free. """
+            if not Check.username(new_name):
+                return False
             logger.info("Changing username...")
             User.name_change(old_name, new_name)
-            success_label.after(2500, lambda: self.remove_window())
+            return True
+
+        workers.run(self.toplevel, change,
+                    lambda accepted: self.name_changed(accepted, opened),
+                    busy=(self.toplevel.submit,))
+
+    def name_changed(self, accepted, opened):
+        """
+        Show whether the user's name was changed.
+
+        :param accepted: whether the new name was free (bool).
+        :param opened: the window's opened count when it was changed (int).
+        """
+        if not dialogs.is_open(self.toplevel, opened):
+            return
+        if accepted:
+            self.show_result("Username Accepted!", True)
+            self.changed(opened)
         else:
-            # Failure label
-            failure_label = ttk.Label(self.toplevel, text="Username Declined!",
-                                      foreground="red")
-            failure_label.grid(row=8, rowspan=2, column=0, pady=5, padx=12)
+            self.show_result("Username Declined!", False)
+
+    def changed(self, opened):
+        """
+        Close the setting window a moment after the setting changed.
+
+        :param opened: the window's opened count when it was changed (int).
+        """
+        if dialogs.is_open(self.toplevel, opened):
+            self.toplevel.after(2500, lambda: self.remove_window(opened))
 
     def change_password(self, new_password):
         """
@@ -726,20 +891,17 @@ class SettingsPage(tk.Frame):
         :param new_password: This is user's new password (str).
         """
         if Check.password(new_password):
-            # Success label
-            success_label = ttk.Label(self.toplevel, text="Password Accepted!",
-                                      foreground="green")
-            success_label.grid(row=8, rowspan=2, column=0, pady=5, padx=12)
+            self.show_result("Password Accepted!", True)
 
             username = self.toplevel.username.get()
+            opened = self.toplevel.opened
             logger.info("Changing password...")
-            User.password_change(username, new_password)
-            success_label.after(2500, lambda: self.remove_window())
+            workers.run(self.toplevel,
+                        lambda: User.password_change(username, new_password),
+                        lambda _: self.changed(opened),
+                        busy=(self.toplevel.submit,))
         else:
-            # Failure label
-            failure_label = ttk.Label(self.toplevel, text="Password Declined!",
-                                      foreground="red")
-            failure_label.grid(row=8, rowspan=2, column=0, pady=5, padx=12)
+            self.show_result("Password Declined!", False)
 
     def change_age(self, new_age):
         """
@@ -749,47 +911,57 @@ class SettingsPage(tk.Frame):
         :param new_age: This is user's new age (str).
         """
         if Check.age(new_age):
-            # Success label
-            success_label = ttk.Label(self.toplevel, text="Age Accepted!",
-                                      foreground="green")
-            success_label.grid(row=8, rowspan=2, column=0, pady=5, padx=12)
+            self.show_result("Age Accepted!", True)
 
             username = self.toplevel.username.get()
+            opened = self.toplevel.opened
             logger.info("Changing age...")
-            User.age_change(username, new_age)
-            success_label.after(2500, lambda: self.remove_window())
+            workers.run(self.toplevel,
+                        lambda: User.age_change(username, new_age),
+                        lambda _: self.changed(opened),
+                        busy=(self.toplevel.submit,))
         else:
-            # Failure label
-            failure_label = ttk.Label(self.toplevel, text="Age Declined!",
-                                      foreground="red")
-            failure_label.grid(row=8, rowspan=2, column=0, pady=5, padx=12)
+            self.show_result("Age Declined!", False)
 
     def delete_user(self, username):
         """
-        Delete the given user.
+        Delete the given user on a worker thread.
 
         :param username: This is user's login name (str).
         """
-        # Success label
-        success_label = ttk.Label(self.toplevel, text="Deleting user...",
-                                  foreground="green")
-        success_label.grid(row=8, rowspan=2, column=0, pady=5, padx=12)
+        self.show_result("Deleting user...", True)
+        opened = self.toplevel.opened
 
         logger.info("Deleting user...")
-        User.delete(username)
-        del_window = (lambda: self.remove_window_del())
-        success_label.after(2500, del_window)
+        workers.run(self.toplevel, lambda: User.delete(username),
+                    lambda _: self.user_deleted(opened),
+                    busy=(self.toplevel.submit, self.toplevel.cancel))
 
-    def remove_window_del(self):
+    def user_deleted(self, opened):
         """
-        Destroy the window and bring the LoginPage frame to the user's view.
+        Go back to the LoginPage a moment after the user is deleted.
+
+        :param opened: the window's opened count when it was deleted (int).
         """
-        self.toplevel.destroy()
-        self.toplevel = None
+        if dialogs.is_open(self.toplevel, opened):
+            self.toplevel.after(2500, lambda: self.remove_window_del(opened))
+        else:
+            self.controller.show_frame(LoginPage)
+
+    def remove_window_del(self, opened=None):
+        """
+        Close the window and bring the LoginPage frame to the user's view.
+
+        :param opened: the window's opened count when it was deleted (int).
+        """
+        self.remove_window(opened)
         self.controller.show_frame(LoginPage)
 
 
 class ShopPage(tk.Frame):
+    image_files = ("img/logo.gif", "img/shops/coffee/coffee_button.gif",
+                   "img/shops/tech/tech_button.gif",
+                   "img/shops/pizza/pizza_button.gif")
 
     def __init__(self, parent, controller):
         """ Shops frame of Virtual World. """
@@ -797,7 +969,7 @@ class ShopPage(tk.Frame):
         self.controller = controller
 
         # Header image
-        self.Logo = tk.PhotoImage(file="img/logo.gif")
+        self.Logo = images.get("img/logo.gif")
         self.shop_page_logo = tk.Label(self, image=self.Logo)
         self.shop_page_logo.grid(row=0, rowspan=12, column=0, columnspan=16)
 
@@ -808,7 +980,7 @@ class ShopPage(tk.Frame):
         # Buttons                   TODO Fix image sizes!
 
         # Coffee Shop button
-        coffee_img = tk.PhotoImage(file="img/shops/coffee/coffee_button.gif")
+        coffee_img = images.get("img/shops/coffee/coffee_button.gif")
         coffee_button = tk.Button(self, relief="flat", width=180, height=40,
                                   image=coffee_img,
                                   command=lambda: self.shop_coffee())
@@ -816,7 +988,7 @@ class ShopPage(tk.Frame):
         coffee_button.image = coffee_img
 
         # Tech Shop button
-        tech_img = tk.PhotoImage(file="img/shops/tech/tech_button.gif")
+        tech_img = images.get("img/shops/tech/tech_button.gif")
         tech_button = tk.Button(self, relief="flat", width=180, height=40,
                                 image=tech_img,
                                 command=lambda: self.shop_tech())
@@ -824,13 +996,24 @@ class ShopPage(tk.Frame):
         tech_button.image = tech_img
 
         # Pizza Shop button
-        pizza_img = tk.PhotoImage(file="img/shops/pizza/pizza_button.gif")
+        pizza_img = images.get("img/shops/pizza/pizza_button.gif")
         pizza_button = tk.Button(self, relief="flat", width=180, height=40,
                                  image=pizza_img,
                                  command=lambda: self.shop_pizza())
         pizza_button.grid(row=20, column=1, columnspan=13, padx=10)
         pizza_button.image = pizza_img
 
+        # Checkout button, for the orders of every shop
+        checkout_button = ttk.Button(self, text="Checkout",
+                                     command=lambda: self.checkout())
+        checkout_button.grid(row=21, column=1, columnspan=12, pady=5)
+
+        self.toplevel = None
+        self.reservation = None  # Stock held while the checkout is open
+        self.transaction = None  # ID of the checkout's withdrawal
+        self.snapshot = None  # (cents, stock, sales) of the cart at checkout
+        dialogs.prebuild(self, "checkout", self.build_window)
+
         VirtualWorld.menu_bar(self, controller)
 
     def back_button(self):
@@ -854,440 +1037,192 @@ class ShopPage(tk.Frame):
         # print("Balance: ${:.2f}".format(user.balance))
         pass
 
-
-class CoffeeShopPage(tk.Frame):
-    cappu_cost = 3.50
-    espre_cost = 3.00
-    flatw_cost = 2.50
-    latte_cost = 4.50
-    mocha_cost = 3.50
-
-    def __init__(self, parent, controller):
-        """ Coffee shop frame of Virtual World. """
-        tk.Frame.__init__(self, parent)
-        self.controller = controller
-
-        # Header image
-        self.Logo = tk.PhotoImage(file="img/shops/coffee/coffee_cup.gif",
-                                  height="120")
-        self.coffee_logo = tk.Label(self, image=self.Logo)
-        self.coffee_logo.grid(row=0, rowspan=5, column=0, columnspan=16)
-
-        # Header
-        menu_label = ttk.Label(self, text="Menu", font=LARGE_FONT)
-        menu_label.grid(row=6, rowspan=2, column=0, columnspan=16, pady=15)
-
-        # Sub-headers
-        type_label = ttk.Label(self, text="Type", font=MEDIUM_FONT)
-        type_label.grid(row=8, column=1, pady=10, sticky="W")
-        price_label = ttk.Label(self, text="Price", font=MEDIUM_FONT)
-        price_label.grid(row=8, column=4, columnspan=3, pady=10)
-        amount_label = ttk.Label(self, text="Amount", font=MEDIUM_FONT)
-        amount_label.grid(row=8, column=8, columnspan=6, pady=10)
-
-        # Coffee type labels, prices and entries
-
-        # Cappuccino and price label and amount entry
-        # Cappuccino label
-        self.cappuccino_label = ttk.Label(self, text="Cappuccino",
-                                          font=MEDIUM_FONT)
-        self.cappuccino_label.grid(row=14, column=1, columnspan=5, pady=10,
-                                   sticky="W")
-        # Cappuccino price label
-        self.cappuccino_price = ttk.Label(self, font=MEDIUM_FONT,
-                                          text="${:.2f}"
-                                          .format(self.cappu_cost))
-        self.cappuccino_price.grid(row=14, column=4, columnspan=3, pady=10)
-        # Cappuccino amount entry
-        cappuccino_vcmd = (self.register(self.confirm), '%P', '%S',
-                           'cappuccino')
-        self.cappuccino_amount = ttk.Entry(self, validate="key",
-                                           justify="center",
-                                           validatecommand=cappuccino_vcmd)
-        self.cappuccino_amount.grid(row=14, column=10, columnspan=2, pady=10)
-
-        # Espresso label, price and amount entry
-        # Espresso label
-        self.espresso_label = ttk.Label(self, text="Espresso",
-                                        font=MEDIUM_FONT)
-        self.espresso_label.grid(row=15, column=1, columnspan=5, pady=10,
-                                 sticky="W")
-        # Espresso price label
-        self.espresso_price = ttk.Label(self, font=MEDIUM_FONT,
-                                        text="${:.2f}".format(self.espre_cost))
-        self.espresso_price.grid(row=15, column=4, columnspan=3, pady=10)
-        # Espresso amount entry
-        espresso_vcmd = (self.register(self.confirm), '%P', '%S', 'espresso')
-        self.espresso_amount = ttk.Entry(self, validate="key",
-                                         justify="center",
-                                         validatecommand=espresso_vcmd)
-        self.espresso_amount.grid(row=15, column=10, columnspan=2, pady=10)
-
-        # Flat white label, price and amount entry
-        # Flat white label
-        self.flat_w_label = ttk.Label(self, text="Flat White",
-                                      font=MEDIUM_FONT)
-        self.flat_w_label.grid(row=16, column=1, columnspan=5, pady=10,
-                               sticky="W")
-        # Flat white price label
-        self.flat_w_price = ttk.Label(self, font=MEDIUM_FONT,
-                                      text="${:.2f}".format(self.flatw_cost))
-        self.flat_w_price.grid(row=16, column=4, columnspan=3, pady=10)
-        # Flat white amount entry
-        flat_w_vcmd = (self.register(self.confirm), '%P', '%S', 'flat_white')
-        self.flat_w_amount = ttk.Entry(self, validate="key", justify="center",
-                                       validatecommand=flat_w_vcmd)
-        self.flat_w_amount.grid(row=16, column=10, columnspan=2, pady=10)
-
-        # Latte label, price and amount entry
-        # Latte label
-        self.latte_label = ttk.Label(self, text="Latte", font=MEDIUM_FONT)
-        self.latte_label.grid(row=17, column=1, columnspan=5, pady=10,
-                              sticky="W")
-        # Latte price label
-        self.latte_price = ttk.Label(self, font=MEDIUM_FONT,
-                                     text="${:.2f}".format(self.latte_cost))
-        self.latte_price.grid(row=17, column=4, columnspan=3, pady=10)
-        # Latte amount entry
-        latte_vcmd = (self.register(self.confirm), '%P', '%S', 'latte')
-        self.latte_amount = ttk.Entry(self, validate="key", justify="center",
-                                      validatecommand=latte_vcmd)
-        self.latte_amount.grid(row=17, column=10, columnspan=2, pady=10)
-
-        # Mocha label, price and amount entry
-        # Mocha label
-        self.mocha_label = ttk.Label(self, text="Mocha", font=MEDIUM_FONT)
-        self.mocha_label.grid(row=18, column=1, columnspan=5, pady=10,
-                              sticky="W")
-        # Mocha price label
-        self.mocha_price = ttk.Label(self, font=MEDIUM_FONT,
-                                     text="${:.2f}".format(self.mocha_cost))
-        self.mocha_price.grid(row=18, column=4, columnspan=3, pady=10)
-        # Mocha amount entry
-        mocha_vcmd = (self.register(self.confirm), '%P', '%S', 'mocha')
-        self.mocha_amount = ttk.Entry(self, validate="key", justify="center",
-                                      validatecommand=mocha_vcmd)
-        self.mocha_amount.grid(row=18, column=10, columnspan=2, pady=10)
-
-        # Maximum number of coffees
-        self.amount_label = ttk.Label(self, font=SMALL_FONT, foreground="red",
-                                      text="Maximum of 9 of each coffee type.")
-        self.amount_label.grid(row=19, column=1, columnspan=9)
-
-        # Total label and total amount label
-        total_label = ttk.Label(self, text="Total:", font=MEDIUM_FONT)
-        total_label.grid(row=20, column=1, sticky="W")
-        self.total_cost_label = ttk.Label(self, font=MEDIUM_FONT,
-                                          text="$0.00")
-        self.total_cost_label.grid(row=20, column=1, columnspan=6,
-                                   padx=10, sticky="E")
-
-        self.toplevel = None
-
-        # Buttons
-
-        # Erase button
-        self.erase_button = ttk.Button(self, text="Erase all",
-                                       command=lambda: self.erase())
-        self.erase_button.grid(row=19, column=9, columnspan=4, pady=5)
-
-        # Purchase Button
-        self.buy_img = tk.PhotoImage(file="img/shops/purchase_button.gif")
-        buy_window = (lambda: self.order())
-        self.buy_button = tk.Button(self, compound=tk.TOP, relief="flat",
-                                    width=80, height=40, image=self.buy_img,
-                                    command=buy_window, state='disabled')
-        self.buy_button.grid(row=20, column=7, columnspan=6, sticky="E",
-                             pady=5)
-        self.buy_button.image = self.buy_img
-
-        # Back button
-        back_img = tk.PhotoImage(file="img/menu/back_button.gif")
-        back_button = tk.Button(self, relief="flat", width=80, height=40,
-                                image=back_img,
-                                command=lambda: self.back_button())
-        back_button.grid(row=22, column=10, columnspan=5, sticky="E")
-        back_button.image = back_img
-
-        VirtualWorld.menu_bar(self, controller)
-
-        CoffeeShopPage.reset_order_data()
-
-    def erase(self):
-        """ Remove all data from the order entries. """
-        for amount in (self.cappuccino_amount, self.espresso_amount,
-                       self.flat_w_amount, self.latte_amount,
-                       self.mocha_amount):
-            amount.delete(0, 1)
-            amount.insert(0, "")
-
-    def confirm(self, P, S, _type):
-        """
-        Only allow a 1 digit integer and if the total of all the entries
-        is greater than one, enable the cart button.
-
-        :param P: allowed value (%P).
-        :param S: text being inserted (%S).
-        :param _type: the coffee type (str).
-        :returns: True - If value is valid.
-                 False - If input is invalid.
-        """
-        allowed_value = P  # So the values of P and S are understandable
-        inserted_value = S  # But are set as param so that %P and %S are used.
-
-        if len(allowed_value) == 0:
-            inserted_value = 0
-            allowed_value = "0"
-        else:
-            try:
-                inserted_value = int(inserted_value)
-            except ValueError:
-                logger.error("Input is not an integer!")
-        if isinstance(inserted_value, int) and 0 < len(allowed_value) == 1:
-            with open(COFFEE_DATA_F, 'r') as file:
-                current_data = [line.strip() for line in file]
-            data = {}
-            with open(COFFEE_DATA_F, 'r') as file:
-                for line in file:
-                    option, value = line.strip().split(':')
-                    data[option] = value
-            if data[_type] == str(allowed_value):
-                logger.debug("No changes to be made to {}".format(COFFEE_DATA_F))
-            else:
-                current_data.remove('{}:{}'.format(_type, data[_type]))
-                current_data.remove('{}:{}'.format('total', data['total']))
-                data[_type] = int(allowed_value)
-                data['total'] = 0
-                total = 0
-                for item in current_data:
-                    item = item.split(':')
-                    item.pop(0)
-                    total += int(item[0])
-                data['total'] = total + data[_type]
-                current_data.append('{}:{}'.format(_type, data[_type]))
-                current_data.append('{}:{}'.format('total', data['total']))
-
-                cappuccino_total = 0
-                espresso_total = 0
-                flat_w_total = 0
-                latte_total = 0
-                mocha_total = 0
-
-                for item in current_data:
-                    item = item.split(':')
-                    if item[0] == 'cappuccino' and int(item[1]) > 0:
-                        cappuccino_total = int(item[1]) * self.cappu_cost
-                    elif item[0] == 'espresso' and int(item[1]) > 0:
-                        espresso_total = int(item[1]) * self.espre_cost
-                    elif item[0] == 'flat_white' and int(item[1]) > 0:
-                        flat_w_total = int(item[1]) * self.flatw_cost
-                    elif item[0] == 'latte' and int(item[1]) > 0:
-                        latte_total = int(item[1]) * self.latte_cost
-                    elif item[0] == 'mocha' and int(item[1]) > 0:
-                        mocha_total = int(item[1]) * self.mocha_cost
-                new_total = cappuccino_total + espresso_total + \
-                    flat_w_total + latte_total + mocha_total
-
-            if int(data['total']) > 0:
-                self.total_cost_label.configure(text="${:.2f}"
-                                                .format(new_total))
-                self.buy_button.configure(state='normal')
-            else:
-                self.total_cost_label.configure(text="$0.00")
-                self.buy_button.configure(state='disabled')
-            with open(COFFEE_DATA_F, 'w') as file:
-                logger.debug("Writing new data to {}".format(COFFEE_DATA_F))
-                file.write('\n'.join(current_data))
-            return True
-        else:
+    def checkout(self):
+        """ Open the checkout window, or ring the bell if it cannot open. """
+        if self.toplevel is None and (not self.controller.cart.count or
+                                      self.order() == "out_of_stock"):
             self.bell()
-            return False
-
-    def back_button(self):
-        """ Raise the ShopPage frame to the user's view. """
-        self.controller.show_frame(ShopPage)
 
     def submit_button(self):
         """
-        Check user input and change the order window for the specified
-        user, where guests do not pay but all other users do.
+        Check user input, checking the user's credentials on a worker
+        thread, where guests do not pay but all other users do.
 
-        :return: False - If user data is incorrect or if there is no data.
+        :return: False - If there is no data.
         """
-        try:
-            username = self.toplevel.username.get()
-            password = self.toplevel.password.get()
-        except AttributeError:
+        if self.toplevel.guest:
             username = "Guest"
             password = "None"
+        else:
+            username = self.toplevel.username.get()
+            password = self.toplevel.password.get()
+        opened = self.toplevel.opened
 
         name_and_pass = username + ',' + password
-        full_user_data = Check.all_user_data(name_and_pass)
-        # Attempt to get all of the user's data if user in the user_data_file
-        amount = float(self.total_cost_label.cget("text").strip('$'))
         if name_and_pass == ',':
             logger.info("Nothing was entered!")
             self.toplevel.user_info.configure(text="Nothing entered!",
                                               foreground="red")
             return False
-        elif Check.in_user_data(full_user_data):
+        workers.run(self.toplevel,
+                    lambda: Check.credentials(username, password),
+                    lambda valid: self.show_confirm(username, valid, opened),
+                    busy=(self.toplevel.submit,))
+
+    def show_confirm(self, username, valid, opened):
+        """
+        Change the checkout window for the specified user, if their
+        credentials were correct.
+
+        :param username: user's login name (str).
+        :param valid: whether the username and password match (bool).
+        :param opened: the window's opened count when it was checked (int).
+        :return: False - If user data is incorrect or the window was closed.
+        """
+        if not dialogs.is_open(self.toplevel, opened):
+            return False
+        if valid:
             logger.info("User '{}' Exists!".format(username))
             self.toplevel.user_info.configure(text="")
             # Confirm button
-            purchase = (lambda: self.purchase(username, amount))
-            self.toplevel.submit = ttk.Button(self.toplevel, text="Confirm",
-                                              command=purchase)
-            self.toplevel.submit.grid(row=13, column=6, columnspan=10, pady=5)
+            purchase = (lambda: self.purchase(username))
+            self.toplevel.submit.configure(text="Confirm", command=purchase)
         else:
-            # Error label
-            self.toplevel.error_label = ttk.Label(
-                self.toplevel, text="Incorrect username/password",
-                foreground="red")
-            self.toplevel.error_label.grid(row=14, column=9, columnspan=20)
+            self.toplevel.user_info.configure(
+                text="Incorrect username/password", foreground="red")
             return False
 
-    def purchase(self, username, amount):
-        """
-        Check the user is not a guest and then withdraw the amount from the
-        user's account. Reset the order_data_file if the transaction is
-        successful.
-        """
-        if username == 'Guest':
-            self.toplevel.user_info.configure(text="Transaction successful",
-                                              foreground="green")
-            CoffeeShopPage.reset_order_data()
-        elif User.withdraw(username, amount) is True:
+    def purchase(self, username):
+        """
+        Take the cart's items out of stock, check the user is not a guest and
+        then withdraw the cart's total from the user's account in one go.
+        Record each shop's order in the order history and empty the cart if
+        the transaction is successful, otherwise put the items back in stock.
+        The stock, withdrawal and order history are written on a worker
+        thread.
+
+        The total, stock and orders are the ones the checkout window was
+        opened with, so changing an amount while it is open changes none of
+        them. The withdrawal uses the checkout window's transaction ID, so
+        pressing Confirm again never takes the money, the stock or the
+        order history twice.
+        """
+        if self.transaction is None:  # Already paid for
+            return
+        cents, stock, sales = self.snapshot
+        reservation, self.reservation = self.reservation, None  # pay()'s now
+        transaction, opened = self.transaction, self.toplevel.opened
+
+        def pay():
+            """ Take the stock and the money, then record the orders. """
+            result = transaction_log.get(transaction)
+            if result is not None and result.ok:  # Already paid for
+                return result.status
+            if not inventory.commit(reservation):  # Held for too long
+                if not inventory.commit(inventory.reserve_many(stock)):
+                    return "out_of_stock"
+            if username == 'Guest':
+                result = Withdrawal("ok", None, transaction)
+            else:
+                result = User.withdraw(username, format_cents(cents),
+                                       transaction)
+            if result.ok:
+                for shop, lines in sales:
+                    sales_ledger.record(shop, username, lines)
+            else:
+                for shop, lines in stock.items():
+                    inventory.restock(shop, lines)
+            return result.status
+
+        workers.run(self.toplevel, pay,
+                    lambda status: self.paid(status, opened),
+                    busy=(self.toplevel.submit, self.toplevel.cancel))
+
+    def paid(self, status, opened):
+        """
+        Show how the purchase went, emptying the cart if it was paid for.
+
+        :param status: "ok", "out_of_stock", "inadequate_funds" or "error"
+                       (str).
+        :param opened: the window's opened count when it was paid in (int).
+        """
+        if status == "ok":
+            self.empty_cart()
+            if dialogs.is_open(self.toplevel, opened):
+                self.reservation = self.transaction = None
+        if not dialogs.is_open(self.toplevel, opened):  # Closed while paying
+            return
+        if status == "ok":
+            self.toplevel.submit.configure(state="disabled", command="")
             self.toplevel.user_info.configure(text="Transaction successful",
                                               foreground="green")
-            CoffeeShopPage.reset_order_data()
-        elif User.withdraw(username, amount) == "inadequate_funds":
+        elif status == "out_of_stock":
+            self.toplevel.user_info.configure(text="Out of stock",
+                                              foreground="red")
+        elif status == "inadequate_funds":
             self.toplevel.user_info.configure(text="Inadequate funds",
                                               foreground="red")
         else:
             self.toplevel.user_info.configure(text="Transaction failed",
                                               foreground="red")
-        self.toplevel.user_info.after(2500, lambda: self.remove_window())
+        self.toplevel.user_info.after(2500,
+                                      lambda: self.remove_window(opened))
 
-    @staticmethod
-    def reset_order_data():
-        """ Reset the COFFEE_DATA_F file. """
-        order_data = ['cappuccino', 'espresso', 'flat_white', 'latte', 'mocha',
-                      'total']
-        new_data = []
-        with open(COFFEE_DATA_F, 'w') as file:
-            for data in order_data:
-                new_data.append('{}:0'.format(data))
-            file.write('\n'.join(new_data))
+    def empty_cart(self):
+        """
+        Empty the cart and the shops' amount entries, saving the emptied
+        orders on a worker thread.
+        """
+        emptied = self.controller.cart.reset()
+        for frame in self.controller.frames.values():
+            if isinstance(frame, ShopFrame):
+                frame.erase()
+
+        def save():
+            """ Write the emptied orders. """
+            for order, contents in emptied:
+                order.write(contents)
+
+        workers.run(self, save)
 
     def order(self):
         """
-        Create the order window (which displays the user's order) and display
-        the correct amounts and totals for the user's order.
-        """
-        if self.toplevel is None:
-            self.toplevel = tk.Toplevel(self)
-            self.toplevel.protocol('WM_DELETE_WINDOW',
-                                   lambda: self.remove_window())
-            self.toplevel.focus_set()
-            self.toplevel.resizable(width=False, height=False)
-            self.toplevel.title('Order')
-
-            order_label = ttk.Label(self.toplevel, text="Here is your order:",
-                                    font=MEDIUM_FONT)
-            order_label.grid(row=0, column=0, columnspan=20, padx=5, pady=5)
-            type_label = ttk.Label(self.toplevel, text="Type", font=SMALL_FONT)
-            type_label.grid(row=2, column=0, columnspan=10, pady=10, padx=5)
-            price_label = ttk.Label(self.toplevel, text="Amount",
-                                    font=SMALL_FONT)
-            price_label.grid(row=2, column=10, columnspan=9, pady=10)
-            amount_label = ttk.Label(self.toplevel, text="Price",
-                                     font=SMALL_FONT)
-            amount_label.grid(row=2, column=20, pady=10)
-
-            data = {}
-            with open(COFFEE_DATA_F, 'r') as file:
-                row_num = 2
-                for line in file:
-                    option, value = line.strip().split(':')
-                    data[option] = value
-                    if int(data[option]) > 0:
-                        if option == 'flat_white':
-                            coffee_type = 'Flat White'
-                            price = "${:.2f}".format(int(data[option]) *
-                                                     self.flatw_cost)
-                        elif option == 'cappuccino':
-                            coffee_type = option.title()
-                            price = "${:.2f}".format(int(data[option]) *
-                                                     self.cappu_cost)
-                        elif option == 'espresso':
-                            coffee_type = option.title()
-                            price = "${:.2f}".format(int(data[option]) *
-                                                     self.espre_cost)
-                        elif option == 'latte':
-                            coffee_type = option.title()
-                            price = "${:.2f}".format(int(data[option]) *
-                                                     self.latte_cost)
-                        elif option == 'mocha':
-                            coffee_type = option.title()
-                            price = "${:.2f}".format(int(data[option]) *
-                                                     self.mocha_cost)
-                        elif option == 'total':
-                            coffee_type = option.title()
-                            price = self.total_cost_label.cget("text")
-                        else:
-                            coffee_type = option
-                            price = ""
-
-                        row_num += 1
-                        ttk.Label(self.toplevel, text=coffee_type)\
-                            .grid(row=row_num, column=0, columnspan=10)
-                        ttk.Label(self.toplevel, text=data[option])\
-                            .grid(row=row_num, column=10, columnspan=9)
-                        ttk.Label(self.toplevel, text=price)\
-                            .grid(row=row_num, column=20)
-
-            with open(current_user_file, 'r') as file:
-                if 'Guest,None,50,1000000' not in file:
-                    # Username and password labels and entries
-                    # Username label
-                    username_label = ttk.Label(self.toplevel, text="Username:",
-                                               font=SMALL_FONT)
-                    username_label.grid(row=9, column=7, columnspan=11, pady=5)
-                    # Username entry
-                    self.toplevel.username = ttk.Entry(self.toplevel)
-                    self.toplevel.username.grid(row=10, sticky='W', padx=20,
-                                                column=9, columnspan=12)
-                    # Password label
-                    password_label = ttk.Label(self.toplevel, text="Password:",
-                                               font=SMALL_FONT)
-                    password_label.grid(row=11, column=7, columnspan=11,
-                                        pady=5)
-                    # Password entry
-                    self.toplevel.password = ttk.Entry(self.toplevel, show="*")
-                    self.toplevel.password.grid(row=12, sticky="E", padx=20,
-                                                column=9, columnspan=12)
-            # Buttons
-
-            # Submit button
-            submit_command = (lambda: self.submit_button())
-            self.toplevel.submit = ttk.Button(self.toplevel, text="Submit",
-                                              command=submit_command)
-            self.toplevel.submit.grid(row=13, column=6, columnspan=10, pady=5)
-
-            # Cancel button
-            cancel_command = (lambda: self.remove_window())
-            self.toplevel.cancel = ttk.Button(self.toplevel, text="Cancel",
-                                              command=cancel_command)
-            self.toplevel.cancel.grid(row=13, column=16, columnspan=6, pady=5)
-
-            # Error label
-            self.toplevel.user_info = ttk.Label(self.toplevel, text="",
-                                                font=SMALL_FONT)
-            self.toplevel.user_info.grid(row=14, column=8, columnspan=20)
+        Hold the cart's items in stock, then open the checkout window (which
+        displays every shop's order) and display the correct amounts and
+        totals for the user's order, reusing the window from the last time.
+
+        :return: "out_of_stock" - If an item does not have enough stock (str).
+        """
+        cart = self.controller.cart
+        if self.toplevel is None and cart.count:
+            stock = cart.stock()
+            self.reservation = inventory.reserve_many(stock)
+            if self.reservation == "out_of_stock":
+                self.reservation = None
+                return "out_of_stock"
+            self.snapshot = (cart.total, stock, [
+                (shop, order.sales()) for shop, order in cart.orders.items()
+                if order.count])
+            self.transaction = transaction_log.new_id()
+            self.toplevel = dialogs.open(self, "checkout", self.build_window)
+
+            lines = []
+            for shop, order in cart.orders.items():
+                if order.count:
+                    lines.append((shop.title() + ":", "", None))
+                    lines.extend(order.lines())
+            lines.append(("Total", cart.count, cart.total))
+            self.show_lines(lines)
+            row = max(9, len(lines) + 3)
+
+            current_user = file_writer.read(current_user_file)
+            self.toplevel.guest = \
+                'Guest,None,50,1000000' in current_user.splitlines()
+            self.show_form(row)
 
             # Toplevel position
             w = 250  # Width for toplevel
-            h = 335  # Height for toplevel
+            h = 335 + 21 * (row - 9)  # Height for toplevel
 
             ws = self.toplevel.winfo_screenwidth()  # Width of the screen
             hs = self.toplevel.winfo_screenheight()  # Height of the screen
@@ -1298,465 +1233,155 @@ class CoffeeShopPage(tk.Frame):
 
             # Set the dimensions of the screen and where it is placed
             self.toplevel.geometry('%dx%d+%d+%d' % (w, h, x, y - 30))
-            self.toplevel.mainloop()
-
-    def remove_window(self):
-        """ Remove the toplevel (order) window. """
-        self.toplevel.destroy()
-        self.toplevel = None
-
-
-class TechShopPage(tk.Frame):
-    camera_cost = 300.00
-    phone_cost = 500.00
-    tv_cost = 1200.00
-    pc_cost = 1000.00
-    tablet_cost = 800.00
 
-    def __init__(self, parent, controller):
-        """ Tech shop frame of Virtual World. """
-        tk.Frame.__init__(self, parent)
-        self.controller = controller
-
-        # Header image
-        self.Logo = tk.PhotoImage(file="img/shops/tech/tech_logo.gif",
-                                  height="120")
-        self.tech_logo = tk.Label(self, image=self.Logo)
-        self.tech_logo.grid(row=0, rowspan=5, column=0, columnspan=16, padx=20)
-
-        # Header
-        menu_label = ttk.Label(self, text="Catalogue", font=LARGE_FONT)
-        menu_label.grid(row=6, rowspan=2, column=0, columnspan=16, pady=15)
+    def build_window(self, toplevel):
+        """
+        Lay out the widgets of the checkout window that every order shows,
+        once for every time it is opened.
 
-        # Sub-headers
-        type_label = ttk.Label(self, text="Type", font=MEDIUM_FONT)
-        type_label.grid(row=8, column=1, pady=10, sticky="W")
-        price_label = ttk.Label(self, text="Price", font=MEDIUM_FONT)
-        price_label.grid(row=8, column=4, columnspan=3, pady=10)
-        amount_label = ttk.Label(self, text="Amount", font=MEDIUM_FONT)
-        amount_label.grid(row=8, column=8, columnspan=6, pady=10)
+        :param toplevel: the new window (tk.Toplevel).
+        """
+        toplevel.protocol('WM_DELETE_WINDOW', lambda: self.remove_window())
+        toplevel.resizable(width=False, height=False)
+        toplevel.title('Checkout')
 
-        # Tech type labels, prices and entries
-
-        # Camera label, price and amount entry
-        self.camera_label = ttk.Label(self, text="Camera", font=MEDIUM_FONT)
-        self.camera_label.grid(row=14, column=1, columnspan=5, pady=10,
-                               sticky="W")
-        self.camera_price = ttk.Label(self, font=MEDIUM_FONT, text="${:.2f}"
-                                      .format(self.camera_cost))
-        self.camera_price.grid(row=14, column=4, columnspan=3, pady=10)
-        camera_vcmd = (self.register(self.confirm), '%P', '%S', 'camera')
-        self.camera_amount = ttk.Entry(self, validate="key", justify="center",
-                                       validatecommand=camera_vcmd)
-        self.camera_amount.grid(row=14, column=10, columnspan=2, pady=10)
-
-        # Phone label, price and amount entry
-        self.phone_label = ttk.Label(self, text="Phone", font=MEDIUM_FONT)
-        self.phone_label.grid(row=15, column=1, columnspan=5, pady=10,
-                              sticky="W")
-        self.phone_price = ttk.Label(self, font=MEDIUM_FONT,
-                                     text="${:.2f}".format(self.phone_cost))
-        self.phone_price.grid(row=15, column=4, columnspan=3, pady=10)
-        phone_vcmd = (self.register(self.confirm), '%P', '%S', 'phone')
-        self.phone_amount = ttk.Entry(self, validate="key", justify="center",
-                                      validatecommand=phone_vcmd)
-        self.phone_amount.grid(row=15, column=10, columnspan=2, pady=10)
-
-        # T.V. label, price and amount entry
-        self.tv_label = ttk.Label(self, text="Television", font=MEDIUM_FONT)
-        self.tv_label.grid(row=16, column=1, columnspan=5, pady=10, sticky="W")
-        self.tv_price = ttk.Label(self, font=MEDIUM_FONT,
-                                  text="${:.2f}".format(self.tv_cost))
-        self.tv_price.grid(row=16, column=4, columnspan=3, pady=10)
-        tv_vcmd = (self.register(self.confirm), '%P', '%S', 'tv')
-        self.tv_amount = ttk.Entry(self, validate="key", justify="center",
-                                   validatecommand=tv_vcmd)
-        self.tv_amount.grid(row=16, column=10, columnspan=2, pady=10)
-
-        # P.C. label, price and amount entry
-        self.pc_label = ttk.Label(self, text="Computer", font=MEDIUM_FONT)
-        self.pc_label.grid(row=17, column=1, columnspan=5, pady=10,
-                           sticky="W")
-        self.pc_price = ttk.Label(self, font=MEDIUM_FONT,
-                                  text="${:.2f}".format(self.pc_cost))
-        self.pc_price.grid(row=17, column=4, columnspan=3, pady=10)
-        pc_vcmd = (self.register(self.confirm), '%P', '%S', 'pc')
-        self.pc_amount = ttk.Entry(self, validate="key", justify="center",
-                                   validatecommand=pc_vcmd)
-        self.pc_amount.grid(row=17, column=10, columnspan=2, pady=10)
-
-        # Tablet label, price and amount entry
-        self.tablet_label = ttk.Label(self, text="Tablet", font=MEDIUM_FONT)
-        self.tablet_label.grid(row=18, column=1, columnspan=5, pady=10,
-                               sticky="W")
-        self.tablet_price = ttk.Label(self, font=MEDIUM_FONT,
-                                      text="${:.2f}".format(self.tablet_cost))
-        self.tablet_price.grid(row=18, column=4, columnspan=3, pady=10)
-        tablet_vcmd = (self.register(self.confirm), '%P', '%S', 'tablet')
-        self.tablet_amount = ttk.Entry(self, validate="key", justify="center",
-                                       validatecommand=tablet_vcmd)
-        self.tablet_amount.grid(row=18, column=10, columnspan=2, pady=10)
-
-        # Maximum number of tech
-        self.amount_label = ttk.Label(self, font=SMALL_FONT, foreground="red",
-                                      text="Maximum of 9 of each tech type.")
-        self.amount_label.grid(row=19, column=1, columnspan=9)
+        order_label = ttk.Label(toplevel, text="Here is your order:",
+                                font=MEDIUM_FONT)
+        order_label.grid(row=0, column=0, columnspan=20, padx=5, pady=5)
+        type_label = ttk.Label(toplevel, text="Type", font=SMALL_FONT)
+        type_label.grid(row=2, column=0, columnspan=10, pady=10, padx=5)
+        price_label = ttk.Label(toplevel, text="Amount", font=SMALL_FONT)
+        price_label.grid(row=2, column=10, columnspan=9, pady=10)
+        amount_label = ttk.Label(toplevel, text="Price", font=SMALL_FONT)
+        amount_label.grid(row=2, column=20, pady=10)
+        toplevel.lines = []  # (type, amount, price) labels of each line
 
-        # Total label and total amount label
-        total_label = ttk.Label(self, text="Total:", font=MEDIUM_FONT)
-        total_label.grid(row=20, column=1, sticky="W")
-        self.total_cost_label = ttk.Label(self, font=MEDIUM_FONT,
-                                          text="$0.00")
-        self.total_cost_label.grid(row=20, column=1, columnspan=6,
-                                   padx=10, sticky="E")
+        # Username and password labels and entries
+        toplevel.username_label = ttk.Label(toplevel, text="Username:",
+                                            font=SMALL_FONT)
+        toplevel.username = ttk.Entry(toplevel)
+        toplevel.password_label = ttk.Label(toplevel, text="Password:",
+                                            font=SMALL_FONT)
+        toplevel.password = ttk.Entry(toplevel, show="*")
 
         # Buttons
 
-        # Erase button
-        self.erase_button = ttk.Button(self, text="Erase all",
-                                       command=lambda: self.erase())
-        self.erase_button.grid(row=19, column=9, columnspan=4, pady=5)
-
-        # Purchase Button
-        self.buy_img = tk.PhotoImage(file="img/shops/purchase_button.gif")
-        buy_window = (lambda: self.order())
-        self.buy_button = tk.Button(self, compound=tk.TOP, relief="flat",
-                                    width=80, height=40, image=self.buy_img,
-                                    command=buy_window, state='disabled')
-        self.buy_button.grid(row=20, column=7, columnspan=6, sticky="E",
-                             pady=5)
-        self.buy_button.image = self.buy_img
-
-        # Back button
-        back_img = tk.PhotoImage(file="img/menu/back_button.gif")
-        back_button = tk.Button(self, relief="flat", width=80, height=40,
-                                image=back_img,
-                                command=lambda: self.back_button())
-        back_button.grid(row=22, column=10, columnspan=5, sticky="E")
-        back_button.image = back_img
-
-        VirtualWorld.menu_bar(self, controller)
-        self.toplevel = None
-
-        TechShopPage.reset_order_data()
-
-    def erase(self):
-        """ Remove all data from the order entries. """
-        for amount in (self.camera_amount, self.phone_amount,
-                       self.tv_amount, self.pc_amount,
-                       self.tablet_amount):
-            amount.delete(0, 1)
-            amount.insert(0, "")
-
-    def confirm(self, P, S, _type):
-        """
-        Only allow a 1 digit integer and if the total of all the entries
-        is greater than one, enable the cart button.
-
-        :param P: allowed value (%P).
-        :param S: text being inserted (%S).
-        :param _type: the tech type (str).
-        :returns: True - If value is valid.
-                 False - If input is invalid.
-        """
-        allowed_value = P  # So the values of P and S are understandable
-        inserted_value = S  # But are set as param so that %P and %S are used.
-
-        if len(allowed_value) == 0:
-            inserted_value = 0
-            allowed_value = "0"
-        else:
-            try:
-                inserted_value = int(inserted_value)
-            except ValueError:
-                logger.error("Input is not an integer!")
-        if isinstance(inserted_value, int) and 0 < len(allowed_value) == 1:
-            with open(TECH_DATA_F, 'r') as file:
-                current_data = [line.strip() for line in file]
-            data = {}
-            with open(TECH_DATA_F, 'r') as file:
-                for line in file:
-                    option, value = line.strip().split(':')
-                    data[option] = value
-            if data[_type] == str(allowed_value):
-                logger.debug("No changes to be made to {}".format(TECH_DATA_F))
-            else:
-                current_data.remove('{}:{}'.format(_type, data[_type]))
-                current_data.remove('{}:{}'.format('total', data['total']))
-                data[_type] = int(allowed_value)
-                data['total'] = 0
-                total = 0
-                for item in current_data:
-                    item = item.split(':')
-                    item.pop(0)
-                    total += int(item[0])
-                data['total'] = total + data[_type]
-                current_data.append('{}:{}'.format(_type, data[_type]))
-                current_data.append('{}:{}'.format('total', data['total']))
-
-                camera_total = 0
-                phone_total = 0
-                tv_total = 0
-                pc_total = 0
-                tablet_total = 0
-
-                for item in current_data:
-                    item = item.split(':')
-                    if item[0] == 'camera' and int(item[1]) > 0:
-                        camera_total = int(item[1]) * self.camera_cost
-                    elif item[0] == 'phone' and int(item[1]) > 0:
-                        phone_total = int(item[1]) * self.phone_cost
-                    elif item[0] == 'tv' and int(item[1]) > 0:
-                        tv_total = int(item[1]) * self.tv_cost
-                    elif item[0] == 'pc' and int(item[1]) > 0:
-                        pc_total = int(item[1]) * self.pc_cost
-                    elif item[0] == 'tablet' and int(item[1]) > 0:
-                        tablet_total = int(item[1]) * self.tablet_cost
-                new_total = camera_total + phone_total + \
-                    tv_total + pc_total + tablet_total
-
-            if int(data['total']) > 0:
-                self.total_cost_label.configure(text="${:.2f}"
-                                                .format(new_total))
-                self.buy_button.configure(state='normal')
-            else:
-                self.total_cost_label.configure(text="$0.00")
-                self.buy_button.configure(state='disabled')
-            with open(TECH_DATA_F, 'w') as file:
-                logger.debug("Writing new data to {}".format(TECH_DATA_F))
-                file.write('\n'.join(current_data))
-            return True
-        else:
-            self.bell()
-            return False
+        # Submit button, which becomes the confirm button
+        toplevel.submit = ttk.Button(toplevel, text="Submit")
 
-    def back_button(self):
-        """ Raise the ShopPage frame to the user's view. """
-        self.controller.show_frame(ShopPage)
+        # Cancel button
+        cancel_command = (lambda: self.remove_window())
+        toplevel.cancel = ttk.Button(toplevel, text="Cancel",
+                                     command=cancel_command)
 
-    def submit_button(self):
-        """
-        Check user input and change the order window for the specified
-        user, where guests do not pay but all other users do.
+        # Error label
+        toplevel.user_info = ttk.Label(toplevel, text="", font=SMALL_FONT)
 
-        :return: False - If user data is incorrect or if there is no data.
+    def show_lines(self, lines):
         """
-        try:
-            username = self.toplevel.username.get()
-            password = self.toplevel.password.get()
-        except AttributeError:
-            username = "Guest"
-            password = "None"
-
-        name_and_pass = username + ',' + password
-        full_user_data = Check.all_user_data(name_and_pass)
-        # Attempt to get all of the user's data if user in the user_data_file
-        amount = float(self.total_cost_label.cget("text").strip('$'))
-        if name_and_pass == ',':
-            logger.info("Nothing was entered!")
-            self.toplevel.user_info.configure(text="Nothing entered!",
-                                              foreground="red")
-            return False
-        elif Check.in_user_data(full_user_data):
-            logger.info("User '{}' Exists!".format(username))
-            self.toplevel.user_info.configure(text="")
-            # Confirm button
-            purchase = (lambda: self.purchase(username, amount))
-            self.toplevel.submit = ttk.Button(self.toplevel, text="Confirm",
-                                              command=purchase)
-            self.toplevel.submit.grid(row=13, column=6, columnspan=10, pady=5)
-        else:
-            # Error label
-            self.toplevel.error_label = ttk.Label(
-                self.toplevel, text="Incorrect username/password",
-                foreground="red")
-            self.toplevel.error_label.grid(row=14, column=9, columnspan=20)
-            return False
+        Show the order's lines in the checkout window, only making labels
+        for lines past the most any order has shown before.
 
-    def purchase(self, username, amount):
-        """
-        Check the user is not a guest and then withdraw the amount from the
-        user's account. Reset the order_data_file if the transaction is
-        successful.
+        :param lines: (type, amount, cost) of each line, where cost is None
+                      for a shop's name (list of tuple).
         """
-        if username == 'Guest':
-            self.toplevel.user_info.configure(text="Transaction successful",
-                                              foreground="green")
-            TechShopPage.reset_order_data()
-        elif User.withdraw(username, amount) is True:
-            self.toplevel.user_info.configure(text="Transaction successful",
-                                              foreground="green")
-            TechShopPage.reset_order_data()
-        elif User.withdraw(username, amount) == "inadequate_funds":
-            self.toplevel.user_info.configure(text="Inadequate funds",
-                                              foreground="red")
+        labels = self.toplevel.lines
+        while len(labels) < len(lines):
+            labels.append((ttk.Label(self.toplevel), ttk.Label(self.toplevel),
+                           ttk.Label(self.toplevel)))
+        for row_num, (label, amount, cost) in enumerate(lines, 3):
+            type_label, amount_label, price_label = labels[row_num - 3]
+            if cost is None:  # The shop's name
+                type_label.configure(text=label, font=SMALL_FONT)
+                type_label.grid(row=row_num, column=0, columnspan=10, padx=5,
+                                sticky="W")
+                amount_label.grid_remove()
+                price_label.grid_remove()
+                continue
+            type_label.configure(text=label, font="")
+            type_label.grid(row=row_num, column=0, columnspan=10, padx=0,
+                            sticky="")
+            amount_label.configure(text=amount)
+            amount_label.grid(row=row_num, column=10, columnspan=9)
+            price_label.configure(text=format_price(cost))
+            price_label.grid(row=row_num, column=20)
+        for unused in labels[len(lines):]:
+            for widget in unused:
+                widget.grid_remove()
+
+    def show_form(self, row):
+        """
+        Place the checkout window's entries and buttons below the order, with
+        the entries cleared and hidden for guests.
+
+        :param row: the first row below the order (int).
+        """
+        toplevel = self.toplevel
+        if toplevel.guest:
+            for widget in (toplevel.username_label, toplevel.username,
+                           toplevel.password_label, toplevel.password):
+                widget.grid_remove()
         else:
-            self.toplevel.user_info.configure(text="Transaction failed",
-                                              foreground="red")
-        self.toplevel.user_info.after(2500, lambda: self.remove_window())
-
-    @staticmethod
-    def reset_order_data():
-        """ Reset the TECH_DATA_F file. """
-        order_data = ['camera', 'phone', 'tv', 'pc', 'tablet', 'total']
-        new_data = []
-        with open(TECH_DATA_F, 'w') as file:
-            for data in order_data:
-                new_data.append('{}:0'.format(data))
-            file.write('\n'.join(new_data))
-
-    def order(self):
-        """
-        Create the order window (which displays the user's order) and display
-        the correct amounts and totals for the user's order.
-        """
-        if self.toplevel is None:
-            self.toplevel = tk.Toplevel(self)
-            self.toplevel.protocol('WM_DELETE_WINDOW',
-                                   lambda: self.remove_window())
-            self.toplevel.focus_set()
-            self.toplevel.resizable(width=False, height=False)
-            self.toplevel.title('Order')
-
-            # Order label
-            order_label = ttk.Label(self.toplevel, text="Here is your order:",
-                                    font=MEDIUM_FONT)
-            order_label.grid(row=0, column=0, columnspan=20, padx=5, pady=5)
-            # Tech type label
-            type_label = ttk.Label(self.toplevel, text="Type", font=SMALL_FONT)
-            type_label.grid(row=2, column=0, columnspan=10, pady=10, padx=5)
-            # Price label
-            price_label = ttk.Label(self.toplevel, text="Amount",
-                                    font=SMALL_FONT)
-            price_label.grid(row=2, column=10, columnspan=9, pady=10)
-            # Amount label
-            amount_label = ttk.Label(self.toplevel, text="Price",
-                                     font=SMALL_FONT)
-            amount_label.grid(row=2, column=20, pady=10)
-
-            data = {}
-            with open(TECH_DATA_F, 'r') as file:
-                row_num = 2
-                for line in file:
-                    option, value = line.strip().split(':')
-                    data[option] = value
-                    if int(data[option]) > 0:
-                        if option == 'tv':
-                            tech_type = "Television"
-                            price = "${:.2f}".format(int(data[option]) *
-                                                     self.tv_cost)
-                        elif option == 'camera':
-                            tech_type = option.title()
-                            price = "${:.2f}".format(int(data[option]) *
-                                                     self.camera_cost)
-                        elif option == 'phone':
-                            tech_type = option.title()
-                            price = "${:.2f}".format(int(data[option]) *
-                                                     self.phone_cost)
-                        elif option == 'pc':
-                            tech_type = "Computer"
-                            price = "${:.2f}".format(int(data[option]) *
-                                                     self.pc_cost)
-                        elif option == 'tablet':
-                            tech_type = option.title()
-                            price = "${:.2f}".format(int(data[option]) *
-                                                     self.tablet_cost)
-                        elif option == 'total':
-                            tech_type = option.title()
-                            price = self.total_cost_label.cget("text")
-                        else:
-                            tech_type = option
-                            price = ""
-
-                        row_num += 1
-                        ttk.Label(self.toplevel, text=tech_type)\
-                            .grid(row=row_num, column=0, columnspan=10)
-                        ttk.Label(self.toplevel, text=data[option])\
-                            .grid(row=row_num, column=10, columnspan=9)
-                        ttk.Label(self.toplevel, text=price)\
-                            .grid(row=row_num, column=20)
-
-            with open(current_user_file, 'r') as file:
-                if 'Guest,None,50,1000000' not in file:
-                    # Username and password labels and entries
-                    # Username label
-                    username_label = ttk.Label(self.toplevel, text="Username:",
-                                               font=SMALL_FONT)
-                    username_label.grid(row=9, column=7, columnspan=11, pady=5)
-                    # Username entry
-                    self.toplevel.username = ttk.Entry(self.toplevel)
-                    self.toplevel.username.grid(row=10, sticky='W', padx=20,
-                                                column=9, columnspan=12)
-                    # Password label
-                    password_label = ttk.Label(self.toplevel, text="Password:",
-                                               font=SMALL_FONT)
-                    password_label.grid(row=11, column=7, columnspan=11,
-                                        pady=5)
-                    # Password entry
-                    self.toplevel.password = ttk.Entry(self.toplevel, show="*")
-                    self.toplevel.password.grid(row=12, sticky="E", padx=20,
-                                                column=9, columnspan=12)
-            # Buttons
-
-            # Submit button
-            submit_command = (lambda: self.submit_button())
-            self.toplevel.submit = ttk.Button(self.toplevel, text="Submit",
-                                              command=submit_command)
-            self.toplevel.submit.grid(row=13, column=6, columnspan=10, pady=5)
-
-            # Cancel button
-            cancel_command = (lambda: self.remove_window())
-            self.toplevel.cancel = ttk.Button(self.toplevel, text="Cancel",
-                                              command=cancel_command)
-            self.toplevel.cancel.grid(row=13, column=16, columnspan=6, pady=5)
-
-            # Error label
-            self.toplevel.user_info = ttk.Label(self.toplevel, text="",
-                                                font=SMALL_FONT)
-            self.toplevel.user_info.grid(row=14, column=8, columnspan=20)
-
-            # Toplevel position
-            w = 250  # Width for toplevel
-            h = 335  # Height for toplevel
-
-            ws = self.toplevel.winfo_screenwidth()  # Width of the screen
-            hs = self.toplevel.winfo_screenheight()  # Height of the screen
-
-            # Calculate x and y coordinates for the Tk root window
-            x = (ws / 2) - (w / 2)
-            y = (hs / 2) - (h / 2)
-
-            # Set the dimensions of the screen and where it is placed
-            self.toplevel.geometry('%dx%d+%d+%d' % (w, h, x, y - 30))
-            self.toplevel.mainloop()
-
-    def remove_window(self):
-        """ Remove the toplevel (order) window. """
-        self.toplevel.destroy()
-        self.toplevel = None
-
-
-class PizzaShopPage(tk.Frame):
-    meat_cost = 5.00
-    cheese_cost = 5.00
-    pepperoni_cost = 5.00
-    hawaiian_cost = 5.00
-    seafood_cost = 5.00
+            toplevel.username_label.grid(row=row, column=7, columnspan=11,
+                                         pady=5)
+            toplevel.username.grid(row=row + 1, sticky='W', padx=20,
+                                   column=9, columnspan=12)
+            toplevel.password_label.grid(row=row + 2, column=7,
+                                         columnspan=11, pady=5)
+            toplevel.password.grid(row=row + 3, sticky="E", padx=20,
+                                   column=9, columnspan=12)
+        toplevel.username.delete(0, tk.END)
+        toplevel.password.delete(0, tk.END)
+        toplevel.submit.configure(text="Submit", state="normal",
+                                  command=lambda: self.submit_button())
+        toplevel.submit.grid(row=row + 4, column=6, columnspan=10, pady=5)
+        toplevel.cancel.grid(row=row + 4, column=16, columnspan=6, pady=5)
+        toplevel.user_info.configure(text="")
+        toplevel.user_info.grid(row=row + 5, column=8, columnspan=20)
+
+    def remove_window(self, opened=None):
+        """
+        Close the toplevel (checkout) window, keeping it to open again, and
+        put back any stock it still holds.
+
+        :param opened: only close it if it has not been reopened since it
+                       was opened this many times, or None to close it
+                       anyway (int).
+        """
+        if self.toplevel is not None and opened in (None,
+                                                    self.toplevel.opened):
+            inventory.release(self.reservation)
+            self.reservation = None
+            dialogs.close(self.toplevel)
+            self.toplevel = None
+
+
+class ShopFrame(tk.Frame):
+    shop = None  # The shop's name in the catalog file
+    data_file = None  # The file the shop's order is saved in
+    logo_file = None
+    logo_height = 120  # The logo is cut down to this many pixels high
+    logo_padx = 0
+    image_files = ("img/shops/purchase_button.gif",)
+    first_row = 14  # Grid row of the first item
+    watch_interval = 1000  # Milliseconds between catalog file checks
 
     def __init__(self, parent, controller):
-        """ Pizza shop frame of Virtual World. """
+        """ Shop frame of Virtual World, laid out from the shop's catalog. """
         tk.Frame.__init__(self, parent)
         self.controller = controller
+        self.catalog = shop_catalogs.get(self.shop)
 
         # Header image
-        self.Logo = tk.PhotoImage(file="img/shops/pizza/pizza_logo.gif",
-                                  height="120")
-        self.pizza_logo = tk.Label(self, image=self.Logo)
-        self.pizza_logo.grid(row=0, rowspan=5, column=0, columnspan=16, padx=10)
+        self.Logo = images.get(self.logo_file, height=self.logo_height)
+        self.logo = tk.Label(self, image=self.Logo)
+        self.logo.grid(row=0, rowspan=5, column=0, columnspan=16,
+                       padx=self.logo_padx)
 
         # Header
-        menu_label = ttk.Label(self, text="Menu", font=LARGE_FONT)
-        menu_label.grid(row=6, rowspan=2, column=0, columnspan=16, pady=15)
+        self.menu_label = ttk.Label(self, font=LARGE_FONT)
+        self.menu_label.grid(row=6, rowspan=2, column=0, columnspan=16,
+                             pady=15)
 
         # Sub-headers
         type_label = ttk.Label(self, text="Type", font=MEDIUM_FONT)
@@ -1766,406 +1391,210 @@ class PizzaShopPage(tk.Frame):
         amount_label = ttk.Label(self, text="Amount", font=MEDIUM_FONT)
         amount_label.grid(row=8, column=8, columnspan=6, pady=10)
 
-        # Pizza type labels, prices and entries
-
-        # Meat lovers label, price and amount entry
-        self.meat_label = ttk.Label(self, text="Meat lovers", font=MEDIUM_FONT)
-        self.meat_label.grid(row=14, column=1, columnspan=5, pady=10,
-                             sticky="W")
-        self.meat_price = ttk.Label(self, font=MEDIUM_FONT, text="${:.2f}"
-                                    .format(self.meat_cost))
-        self.meat_price.grid(row=14, column=4, columnspan=3, pady=10)
-        meat_vcmd = (self.register(self.confirm), '%P', '%S', 'meat')
-        self.meat_amount = ttk.Entry(self, validate="key", justify="center",
-                                     validatecommand=meat_vcmd)
-        self.meat_amount.grid(row=14, column=10, columnspan=2, pady=10)
-
-        # Cheese label, price and amount entry
-        self.cheese_label = ttk.Label(self, text="Cheese", font=MEDIUM_FONT)
-        self.cheese_label.grid(row=15, column=1, columnspan=5, pady=10,
-                               sticky="W")
-        self.cheese_price = ttk.Label(self, font=MEDIUM_FONT,
-                                      text="${:.2f}".format(self.cheese_cost))
-        self.cheese_price.grid(row=15, column=4, columnspan=3, pady=10)
-        cheese_vcmd = (self.register(self.confirm), '%P', '%S', 'cheese')
-        self.cheese_amount = ttk.Entry(self, validate="key", justify="center",
-                                       validatecommand=cheese_vcmd)
-        self.cheese_amount.grid(row=15, column=10, columnspan=2, pady=10)
-
-        # Pepperoni label, price and amount entry
-        self.pepperoni_label = ttk.Label(self, text="Pepperoni",
-                                         font=MEDIUM_FONT)
-        self.pepperoni_label.grid(row=16, column=1, columnspan=5, pady=10,
-                                  sticky="W")
-        self.pepperoni_price = ttk.Label(self, font=MEDIUM_FONT,
-                                         text="${:.2f}".format(
-                                             self.pepperoni_cost))
-        self.pepperoni_price.grid(row=16, column=4, columnspan=3, pady=10)
-        pepperoni_vcmd = (self.register(self.confirm), '%P', '%S', 'pepperoni')
-        self.pepperoni_amount = ttk.Entry(self, validate="key",
-                                          justify="center",
-                                          validatecommand=pepperoni_vcmd)
-        self.pepperoni_amount.grid(row=16, column=10, columnspan=2, pady=10)
-
-        # Hawaiian label, price and amount entry
-        self.hawaii_label = ttk.Label(self, text="Hawaiian", font=MEDIUM_FONT)
-        self.hawaii_label.grid(row=17, column=1, columnspan=5, pady=10,
-                               sticky="W")
-        self.hawaii_price = ttk.Label(self, font=MEDIUM_FONT,
-                                      text="${:.2f}".format(
-                                          self.hawaiian_cost))
-        self.hawaii_price.grid(row=17, column=4, columnspan=3, pady=10)
-        hawaii_vcmd = (self.register(self.confirm), '%P', '%S', 'hawaiian')
-        self.hawaii_amount = ttk.Entry(self, validate="key", justify="center",
-                                       validatecommand=hawaii_vcmd)
-        self.hawaii_amount.grid(row=17, column=10, columnspan=2, pady=10)
-
-        # Seafood label, price and amount entry
-        self.seafood_label = ttk.Label(self, text="Seafood", font=MEDIUM_FONT)
-        self.seafood_label.grid(row=18, column=1, columnspan=5, pady=10,
-                                sticky="W")
-        self.seafood_price = ttk.Label(self, font=MEDIUM_FONT,
-                                       text="${:.2f}".format(self.seafood_cost))
-        self.seafood_price.grid(row=18, column=4, columnspan=3, pady=10)
-        seafood_vcmd = (self.register(self.confirm), '%P', '%S', 'seafood')
-        self.seafood_amount = ttk.Entry(self, validate="key", justify="center",
-                                        validatecommand=seafood_vcmd)
-        self.seafood_amount.grid(row=18, column=10, columnspan=2, pady=10)
-
-        # Maximum number of pizzas
-        self.amount_label = ttk.Label(self, font=SMALL_FONT, foreground="red",
-                                      text="Maximum of 9 of each pizza type.")
-        self.amount_label.grid(row=19, column=1, columnspan=9)
+        # Item labels, prices and amount entries (see show_catalog)
+        self.confirm_command = self.register(self.confirm)
+        self.item_widgets = []
+        self.amounts = []
+
+        # Maximum number of each item
+        self.amount_label = ttk.Label(self, font=SMALL_FONT, foreground="red")
 
         # Total label and total amount label
-        total_label = ttk.Label(self, text="Total:", font=MEDIUM_FONT)
-        total_label.grid(row=20, column=1, sticky="W")
+        self.total_label = ttk.Label(self, text="Total:", font=MEDIUM_FONT)
         self.total_cost_label = ttk.Label(self, font=MEDIUM_FONT,
                                           text="$0.00")
-        self.total_cost_label.grid(row=20, column=1, columnspan=6,
-                                   padx=10, sticky="E")
 
         # Buttons
 
         # Erase button
         self.erase_button = ttk.Button(self, text="Erase all",
                                        command=lambda: self.erase())
-        self.erase_button.grid(row=19, column=9, columnspan=4, pady=5)
 
-        # Purchase button
-        self.buy_img = tk.PhotoImage(file="img/shops/purchase_button.gif")
-        buy_window = (lambda: self.order())
+        # Purchase Button
+        self.buy_img = images.get("img/shops/purchase_button.gif")
+        buy_window = (lambda: self.checkout())
         self.buy_button = tk.Button(self, compound=tk.TOP, relief="flat",
                                     width=80, height=40, image=self.buy_img,
                                     command=buy_window, state='disabled')
-        self.buy_button.grid(row=20, column=7, columnspan=6, sticky="E",
-                             pady=5)
         self.buy_button.image = self.buy_img
 
-        # Back button
-        back_img = tk.PhotoImage(file="img/menu/back_button.gif")
-        back_button = tk.Button(self, relief="flat", width=80, height=40,
-                                image=back_img,
-                                command=lambda: self.back_button())
-        back_button.grid(row=22, column=10, columnspan=5, sticky="E")
-        back_button.image = back_img
-
         VirtualWorld.menu_bar(self, controller)
-        self.toplevel = None
 
-        PizzaShopPage.reset_order_data()
+        self.order_data = None
+        self.show_catalog(self.catalog)
+        self.after(self.watch_interval, self.watch_catalog)
+
+    def show_catalog(self, catalog):
+        """
+        Lay out the item rows for a catalog, keeping the amounts entered for
+        any items that are still in it.
+
+        :param catalog: the shop's items and prices (Catalog).
+        """
+        amounts = {}
+        if self.order_data is not None:
+            amounts = dict(zip(self.catalog.items, self.order_data.amounts))
+            self.order_data.save()  # Drop any pending save of the old order
+        for widget in self.item_widgets:
+            widget.destroy()
+        self.item_widgets = []
+        self.amounts = []
+        self.catalog = catalog
+        self.order_data = Order(catalog, self.data_file, file_writer, self)
+        self.order_data.reset()
+        self.controller.cart.add(self.shop, self.order_data)
+        self.menu_label.configure(text=catalog.heading)
+
+        for position, item in enumerate(catalog.items):
+            row = self.first_row + position
+            label = ttk.Label(self, text=catalog.labels[position],
+                              font=MEDIUM_FONT)
+            label.grid(row=row, column=1, columnspan=5, pady=10, sticky="W")
+            price = ttk.Label(self, font=MEDIUM_FONT,
+                              text=format_price(catalog.prices[position]))
+            price.grid(row=row, column=4, columnspan=3, pady=10)
+            amount = ttk.Entry(self, validate="key", justify="center",
+                               validatecommand=(self.confirm_command, '%P',
+                                                '%S', item))
+            amount.grid(row=row, column=10, columnspan=2, pady=10)
+            self.item_widgets.extend((label, price, amount))
+            self.amounts.append(amount)
+        row = self.first_row + len(catalog)
+
+        self.amount_label.configure(text="Maximum of {} of each {} type."
+                                    .format(catalog.limit, catalog.kind))
+        self.amount_label.grid(row=row, column=1, columnspan=9)
+        self.total_label.grid(row=row + 1, column=1, sticky="W")
+        self.total_cost_label.configure(text="$0.00")
+        self.total_cost_label.grid(row=row + 1, column=1, columnspan=6,
+                                   padx=10, sticky="E")
+        self.erase_button.grid(row=row, column=9, columnspan=4, pady=5)
+        self.buy_button.configure(state='disabled')
+        self.buy_button.grid(row=row + 1, column=7, columnspan=6, sticky="E",
+                             pady=5)
+
+        # Move the lower menu bar below the items
+        menu_row = max(22, row + 3)
+        for widget in self.grid_slaves(row=self.menu_row):
+            widget.grid_configure(row=menu_row)
+        self.menu_row = menu_row
+
+        for position, item in enumerate(catalog.items):
+            if 0 < amounts.get(item, 0) <= catalog.limit:
+                self.amounts[position].insert(0, str(amounts[item]))
+
+    def watch_catalog(self):
+        """
+        Show the shop's catalog again if the catalog file has changed,
+        keeping the current one if the shop has been taken out of it.
+        """
+        try:
+            checkout = self.controller.frame(ShopPage)
+            if checkout.toplevel is None:  # Not while the cart is being paid
+                try:
+                    catalog = shop_catalogs.get(self.shop)
+                except KeyError:
+                    catalog = self.catalog
+                if catalog is not self.catalog:
+                    logger.info("Reloading the {} shop.".format(self.shop))
+                    self.show_catalog(catalog)
+        finally:  # Keep watching even if showing the catalog failed
+            self.after(self.watch_interval, self.watch_catalog)
 
     def erase(self):
         """ Remove all data from the order entries. """
-        for amount in (self.meat_amount, self.cheese_amount,
-                       self.pepperoni_amount, self.hawaii_amount,
-                       self.seafood_amount):
-            amount.delete(0, 1)
-            amount.insert(0, "")
+        for amount in self.amounts:
+            amount.delete(0, tk.END)
 
     def confirm(self, P, S, _type):
         """
-        Only allow a 1 digit integer and if the total of all the entries
-        is greater than one, enable the cart button.
+        Only allow a whole number up to the catalog's limit and the stock
+        left, update the order with it and if the total of all the entries is
+        greater than one, enable the cart button.
 
         :param P: allowed value (%P).
         :param S: text being inserted (%S).
-        :param _type: the pizza type (str).
+        :param _type: the item in the shop's catalog (str).
         :returns: True - If value is valid.
                  False - If input is invalid.
         """
-        allowed_value = P  # So the values of P and S are understandable
-        inserted_value = S  # But are set as param so that %P and %S are used.
-
-        if len(allowed_value) == 0:
-            inserted_value = 0
-            allowed_value = "0"
-        else:
-            try:
-                inserted_value = int(inserted_value)
-            except ValueError:
-                logger.error("Input is not an integer!")
-        if isinstance(inserted_value, int) and 0 < len(allowed_value) == 1:
-            with open(PIZZA_DATA_F, 'r') as file:
-                current_data = [line.strip() for line in file]
-            data = {}
-            with open(PIZZA_DATA_F, 'r') as file:
-                for line in file:
-                    option, value = line.strip().split(':')
-                    data[option] = value
-            if data[_type] == str(allowed_value):
-                logger.debug("No changes to be made to {}".format(PIZZA_DATA_F))
-            else:
-                current_data.remove('{}:{}'.format(_type, data[_type]))
-                current_data.remove('{}:{}'.format('total', data['total']))
-                data[_type] = int(allowed_value)
-                data['total'] = 0
-                total = 0
-                for item in current_data:
-                    item = item.split(':')
-                    item.pop(0)
-                    total += int(item[0])
-                data['total'] = total + data[_type]
-                current_data.append('{}:{}'.format(_type, data[_type]))
-                current_data.append('{}:{}'.format('total', data['total']))
-
-                meat_total = 0
-                cheese_total = 0
-                pepperoni_total = 0
-                hawaiian_total = 0
-                seafood_total = 0
-
-                for item in current_data:
-                    item = item.split(':')
-                    if item[0] == 'meat' and int(item[1]) > 0:
-                        meat_total = int(item[1]) * self.meat_cost
-                    elif item[0] == 'cheese' and int(item[1]) > 0:
-                        cheese_total = int(item[1]) * self.cheese_cost
-                    elif item[0] == 'pepperoni' and int(item[1]) > 0:
-                        pepperoni_total = int(item[1]) * self.pepperoni_cost
-                    elif item[0] == 'hawaiian' and int(item[1]) > 0:
-                        hawaiian_total = int(item[1]) * self.hawaiian_cost
-                    elif item[0] == 'seafood' and int(item[1]) > 0:
-                        seafood_total = int(item[1]) * self.seafood_cost
-                new_total = meat_total + cheese_total + pepperoni_total + \
-                    hawaiian_total + seafood_total
-
-            if int(data['total']) > 0:
-                self.total_cost_label.configure(text="${:.2f}"
-                                                .format(new_total))
-                self.buy_button.configure(state='normal')
-            else:
-                self.total_cost_label.configure(text="$0.00")
-                self.buy_button.configure(state='disabled')
-            with open(PIZZA_DATA_F, 'w') as file:
-                logger.debug("Writing new data to {}".format(PIZZA_DATA_F))
-                file.write('\n'.join(current_data))
-            return True
+        limit = self.catalog.limit
+        stock = inventory.available(self.shop, _type)
+        if stock is not None:
+            limit = min(limit, stock)
+        if len(P) == 0:
+            amount = 0
+        elif len(P) <= len(str(limit)) and P.isdigit() and int(P) <= limit:
+            amount = int(P)
         else:
+            logger.error("Input is not an integer!")
             self.bell()
             return False
 
+        if not self.order_data.set(_type, amount):
+            logger.debug("No changes to be made to {}".format(self.data_file))
+        self.total_cost_label.configure(
+            text=format_price(self.order_data.total))
+        if self.order_data.count > 0:
+            self.buy_button.configure(state='normal')
+        else:
+            self.buy_button.configure(state='disabled')
+        return True
+
     def back_button(self):
         """ Raise the ShopPage frame to the user's view. """
         self.controller.show_frame(ShopPage)
 
-    def submit_button(self):
+    def checkout(self):
         """
-        Check user input and change the order window for the specified
-        user, where guests do not pay but all other users do.
-
-        :return: False - If user data is incorrect or if there is no data.
+        Open the checkout window for the cart, with every shop's order.
         """
-        try:
-            username = self.toplevel.username.get()
-            password = self.toplevel.password.get()
-        except AttributeError:
-            username = "Guest"
-            password = "None"
-
-        name_and_pass = username + ',' + password
-        full_user_data = Check.all_user_data(name_and_pass)
-        # Attempt to get all of the user's data if user in the user_data_file
-        amount = float(self.total_cost_label.cget("text").strip('$'))
-        if name_and_pass == ',':
-            logger.info("Nothing was entered!")
-            self.toplevel.user_info.configure(text="Nothing entered!",
-                                              foreground="red")
-            return False
-        elif Check.in_user_data(full_user_data):
-            logger.info("User '{}' Exists!".format(username))
-            self.toplevel.user_info.configure(text="")
-            # Confirm button
-            purchase = (lambda: self.purchase(username, amount))
-            self.toplevel.submit = ttk.Button(self.toplevel, text="Confirm",
-                                              command=purchase)
-            self.toplevel.submit.grid(row=13, column=6, columnspan=10, pady=5)
-        else:
-            # Error label
-            self.toplevel.error_label = ttk.Label(
-                self.toplevel, text="Incorrect username/password",
-                foreground="red")
-            self.toplevel.error_label.grid(row=14, column=9, columnspan=20)
-            return False
+        if self.controller.frame(ShopPage).order() == "out_of_stock":
+            self.bell()
+            self.total_cost_label.configure(text="Out of stock")
 
-    def purchase(self, username, amount):
-        """
-        Check the user is not a guest and then withdraw the amount from the
-        user's account. Reset the order_data_file if the transaction is
-        successful.
-        """
-        if username == 'Guest':
-            self.toplevel.user_info.configure(text="Transaction successful",
-                                              foreground="green")
-            PizzaShopPage.reset_order_data()
-        elif User.withdraw(username, amount) is True:
-            self.toplevel.user_info.configure(text="Transaction successful",
-                                              foreground="green")
-            PizzaShopPage.reset_order_data()
-        elif User.withdraw(username, amount) == "inadequate_funds":
-            self.toplevel.user_info.configure(text="Inadequate funds",
-                                              foreground="red")
-        else:
-            self.toplevel.user_info.configure(text="Transaction failed",
-                                              foreground="red")
-        self.toplevel.user_info.after(2500, lambda: self.remove_window())
 
-    @staticmethod
-    def reset_order_data():
-        """ Reset the PIZZA_DATA_F file. """
-        order_data = ['meat', 'cheese', 'pepperoni', 'hawaiian', 'seafood',
-                      'total']
-        new_data = []
-        with open(PIZZA_DATA_F, 'w') as file:
-            for data in order_data:
-                new_data.append('{}:0'.format(data))
-            file.write('\n'.join(new_data))
+class CoffeeShopPage(ShopFrame):
+    shop = 'coffee'
+    data_file = COFFEE_DATA_F
+    logo_file = "img/shops/coffee/coffee_cup.gif"
 
-    def order(self):
-        """
-        Create the order window (which displays the user's order) and display
-        the correct amounts and totals for the user's order.
-        """
-        if self.toplevel is None:
-            self.toplevel = tk.Toplevel(self)
-            self.toplevel.protocol('WM_DELETE_WINDOW',
-                                   lambda: self.remove_window())
-            self.toplevel.focus_set()
-            self.toplevel.resizable(width=False, height=False)
-            self.toplevel.title('Order')
-
-            # Order label
-            order_label = ttk.Label(self.toplevel, text="Here is your order:",
-                                    font=MEDIUM_FONT)
-            order_label.grid(row=0, column=0, columnspan=20, padx=5, pady=5)
-            # Pizza type label
-            type_label = ttk.Label(self.toplevel, text="Type", font=SMALL_FONT)
-            type_label.grid(row=2, column=0, columnspan=10, pady=10, padx=5)
-            # Price label
-            price_label = ttk.Label(self.toplevel, text="Amount",
-                                    font=SMALL_FONT)
-            price_label.grid(row=2, column=10, columnspan=9, pady=10)
-            # Amount label
-            amount_label = ttk.Label(self.toplevel, text="Price",
-                                     font=SMALL_FONT)
-            amount_label.grid(row=2, column=20, pady=10)
-
-            data = {}
-            with open(PIZZA_DATA_F, 'r') as file:
-                row_num = 2
-                for line in file:
-                    option, value = line.strip().split(':')
-                    data[option] = value
-                    if int(data[option]) > 0:
-                        if option == 'meat':
-                            price = "${:.2f}".format(int(data[option]) *
-                                                     self.meat_cost)
-                        elif option == 'cheese':
-                            price = "${:.2f}".format(int(data[option]) *
-                                                     self.cheese_cost)
-                        elif option == 'pepperoni':
-                            price = "${:.2f}".format(int(data[option]) *
-                                                     self.pepperoni_cost)
-                        elif option == 'hawaiian':
-                            price = "${:.2f}".format(int(data[option]) *
-                                                     self.hawaiian_cost)
-                        elif option == 'seafood':
-                            price = "${:.2f}".format(int(data[option]) *
-                                                     self.seafood_cost)
-                        elif option == 'total':
-                            price = self.total_cost_label.cget("text")
-                        else:
-                            price = ""
-                        pizza_type = option.title()
-                        row_num += 1
-                        ttk.Label(self.toplevel, text=pizza_type)\
-                            .grid(row=row_num, column=0, columnspan=10)
-                        ttk.Label(self.toplevel, text=data[option])\
-                            .grid(row=row_num, column=10, columnspan=9)
-                        ttk.Label(self.toplevel, text=price)\
-                            .grid(row=row_num, column=20)
-
-            with open(current_user_file, 'r') as file:
-                if 'Guest,None,50,1000000' not in file:
-                    # Username and password labels and entries
-                    # Username label
-                    username_label = ttk.Label(self.toplevel, text="Username:",
-                                               font=SMALL_FONT)
-                    username_label.grid(row=9, column=7, columnspan=11, pady=5)
-                    # Username entry
-                    self.toplevel.username = ttk.Entry(self.toplevel)
-                    self.toplevel.username.grid(row=10, sticky='W', padx=20,
-                                                column=9, columnspan=12)
-                    # Password label
-                    password_label = ttk.Label(self.toplevel, text="Password:",
-                                               font=SMALL_FONT)
-                    password_label.grid(row=11, column=7, columnspan=11,
-                                        pady=5)
-                    # Password entry
-                    self.toplevel.password = ttk.Entry(self.toplevel, show="*")
-                    self.toplevel.password.grid(row=12, sticky="E", padx=20,
-                                                column=9, columnspan=12)
-            # Buttons
-
-            # Submit button
-            submit_command = (lambda: self.submit_button())
-            self.toplevel.submit = ttk.Button(self.toplevel, text="Submit",
-                                              command=submit_command)
-            self.toplevel.submit.grid(row=13, column=6, columnspan=10, pady=5)
-
-            # Cancel button
-            cancel_command = (lambda: self.remove_window())
-            self.toplevel.cancel = ttk.Button(self.toplevel, text="Cancel",
-                                              command=cancel_command)
-            self.toplevel.cancel.grid(row=13, column=16, columnspan=6, pady=5)
-
-            # Error label
-            self.toplevel.user_info = ttk.Label(self.toplevel, text="",
-                                                font=SMALL_FONT)
-            self.toplevel.user_info.grid(row=14, column=8, columnspan=20)
 
-            # Toplevel position
-            w = 250  # Width for toplevel
-            h = 335  # Height for toplevel
+class TechShopPage(ShopFrame):
+    shop = 'tech'
+    data_file = TECH_DATA_F
+    logo_file = "img/shops/tech/tech_logo.gif"
+    logo_padx = 20
 
-            ws = self.toplevel.winfo_screenwidth()  # Width of the screen
-            hs = self.toplevel.winfo_screenheight()  # Height of the screen
 
-            # Calculate x and y coordinates for the Tk root window
-            x = (ws / 2) - (w / 2)
-            y = (hs / 2) - (h / 2)
+class PizzaShopPage(ShopFrame):
+    shop = 'pizza'
+    data_file = PIZZA_DATA_F
+    logo_file = "img/shops/pizza/pizza_logo.gif"
+    logo_padx = 10
 
-            # Set the dimensions of the screen and where it is placed
-            self.toplevel.geometry('%dx%d+%d+%d' % (w, h, x, y - 30))
-            self.toplevel.mainloop()
 
-    def remove_window(self):
-        """ Remove the toplevel (order) window. """
-        self.toplevel.destroy()
-        self.toplevel = None
+class Check:
 
+    @staticmethod
+    def options():
+        """
+        Check options.txt exists and it is created if it does not exist.
 
-class Check:
+        :return: option_data (list).
+        """
+        while True:
+            try:
+                with open(options_file, 'r') as file:
+                    logger.debug("Opening the options file '{}'.".format(
+                        options_file))
+                    option_data = [line.strip() for line in file]
+                return option_data
+            except FileNotFoundError:
+                logger.error("Failed to open the 'options.txt' file")
+                with open(options_file, 'w') as file:
+                    logger.debug("Creating options.txt...")
+                    file.write("running:False\ntimes_opened:0")
 
     @staticmethod
     def file():
@@ -2180,25 +1609,6 @@ class Check:
                  'options'      - options.txt        (list)
         """
 
-        def options():
-            """
-            Check options.txt exists and it is created if it does not exist.
-
-            :return: option_data (list).
-            """
-            while True:
-                try:
-                    with open(options_file, 'r') as file:
-                        logger.debug("Opening the options file '{}'.".format(
-                              options_file))
-                        option_data = [line.strip() for line in file]
-                    return option_data
-                except FileNotFoundError:
-                    logger.error("Failed to open the 'options.txt' file")
-                    with open(options_file, 'w') as file:
-                        logger.debug("Creating options.txt...")
-                        file.write("running:False\ntimes_opened:0")
-
         def user_names():
             """
             Check user_names.txt exists and it is created if it does not exist.
@@ -2247,11 +1657,10 @@ class Check:
             """
             while True:
                 try:
-                    with open(current_user_file, 'r') as file:
-                        logger.debug("Opening the current_user_file '{}'."
-                                     .format(current_user_file))
-                        current_user_data = [line.strip() for line in file]
-                    return current_user_data
+                    logger.debug("Opening the current_user_file '{}'."
+                                 .format(current_user_file))
+                    current_user = file_writer.read(current_user_file)
+                    return [line.strip() for line in current_user.split('\n')]
                 except FileNotFoundError:
                     logger.error("Failed to open '{}'"
                                  .format(current_user_file))
@@ -2260,25 +1669,37 @@ class Check:
                                      .format(current_user_file))
                         file.write("Guest,None,50,1000000")
 
-        return {"options": options(), "user_names": user_names(),
+        return {"options": Check.options(), "user_names": user_names(),
                 "user_data": user_data(), "current_user": current_user()}
 
     @staticmethod
     def in_user_data(user):
         """
-        Check if user's info is in the user_data_file.
+        Check if user's info matches their record in the user store.
 
         :param user: the user's info to search (str).
         :returns: True - If user is in the file (bool).
                   False - If user is None or not in file (bool).
         """
-        with open(user_data_file, 'r') as file:
-            if user is None:
-                return False
-            elif re.search(user, file.read()):
-                return True
-            else:
-                return False
+        if user is None:
+            return False
+        username, password, age, balance = user.split(',')
+        if not Check.credentials(username, password):
+            return False
+        user_data = User.get_data(username)
+        return (user_data['age'], user_data['balance']) == (age, balance)
+
+    @staticmethod
+    def credentials(username, password):
+        """
+        Check a username and password against the credential index.
+
+        :param username: user's login name (str).
+        :param password: user's login password (str).
+        :return: True - If the user exists and the password matches (bool).
+                 False - If any other case (bool).
+        """
+        return credential_index.verify(username, password)
 
     @staticmethod
     def all_user_data(user_info):
@@ -2291,24 +1712,23 @@ class Check:
         """
         username, password = user_info.split(',')
         try:
-            age = User.get_data(username)['age']
-            balance = User.get_data(username)['balance']
-            return user_info + ',' + age + ',' + balance
+            user = User.get_data(username)
+            return user_info + ',' + user['age'] + ',' + user['balance']
         except KeyError:
             return None
 
     @staticmethod
     def username(name):
         """
-        Check if the user's name is in the user_names file, or is '' or
+        Check if the user's name is in the user store, or is '' or
         contains only alphabet characters or numbers.
 
         :param name: user's name (str).
         :return: True - If username matches the regular expression.
-                 False - If username in the user_names file, '' or anything
+                 False - If username in the user store, '' or anything
                          else.
         """
-        if name in Check.file()["user_names"]:
+        if not username_index.available(name):
             logger.info("You cannot use that name as it is already taken.")
             return False
         elif name == '':
@@ -2369,25 +1789,140 @@ class User:
         :param age: user's age (str).
         """
         balance = User.create_balance(age)
-        user_data = Check.file()['user_data']
-        str_age = str(age)
-        str_bal = str(balance)
-        new_user = username + ',' + password + ',' + str_age + ',' + str_bal
-        user_data.append(new_user)
-
-        with open(user_data_file, 'w') as f:
-            f.write('\n'.join(user_data))
-        with open(user_names_file, 'r') as u:
-            user_names = [line.strip() for line in u]
-        user_names.append(username)
-        with open(user_names_file, 'w') as f:
-            f.write('\n'.join(user_names))
+        with file_writer.group():
+            user_store.put(username, password, str(age), str(balance))
+            balance_history.record(username, parse_cents(balance),
+                                   parse_cents(balance))
+        username_index.add(username)
+        credential_index.set(username, password)
         logger.info("\nUser {} created!\n".format(username))
 
+    @staticmethod
+    def bulk_import(rows, fmt='csv', chunk_size=10000, progress=None):
+        """
+        Create many users from a stream of CSV or JSON lines. Every row is
+        checked with the same rules as the signup page and given a balance
+        from its age, then all accepted users are written in one pass.
+
+        :param rows: 'username,password,age' CSV lines (with or without a
+                     header) or JSON objects with those keys, one per line
+                     (iterable of str).
+        :param fmt: 'csv' or 'jsonl' (str).
+        :param chunk_size: rows read between progress reports (int).
+        :param progress: called with the counters after every chunk
+                         (callable).
+        :returns: a dict containing the keys:
+
+                 'read'            - rows read (int)
+                 'imported'        - users created (int)
+                 'rejected'        - rows that failed a check (int)
+                 'seconds'         - time taken (float)
+                 'rows_per_second' - throughput (float)
+        :raise: ValueError: Import format not valid!
+        """
+        if fmt == 'csv':
+            records = csv.reader(rows)
+        elif fmt == 'jsonl':
+            records = User._json_rows(rows)
+        else:
+            raise ValueError("Import format not valid!")
+
+        counters = {"read": 0, "imported": 0, "rejected": 0}
+        start = time.perf_counter()
+        seen = set()
+        users = []
+        for row in records:
+            if not row or (counters["read"] == 0 and
+                           row == ['username', 'password', 'age']):
+                continue
+            counters["read"] += 1
+            if (len(row) == 3 and row[0] not in seen and
+                    Check.username(row[0]) and Check.password(row[1]) and
+                    Check.age(row[2])):
+                seen.add(row[0])
+                users.append({"username": row[0], "password": row[1],
+                              "age": row[2],
+                              "balance": str(User.create_balance(row[2]))})
+            else:
+                counters["rejected"] += 1
+            if counters["read"] % chunk_size == 0:
+                User._report(counters, start, progress)
+
+        with file_writer.group():
+            counters["imported"] = user_store.put_many(users)
+            balance_history.record_many(
+                (user["username"], parse_cents(user["balance"]),
+                 parse_cents(user["balance"])) for user in users)
+        username_index.add(*seen)
+        for user in users:
+            credential_index.set(user["username"], user["password"])
+        User._report(counters, start, progress)
+        logger.info("Imported {imported} of {read} users in {seconds:.2f}s."
+                    .format(**counters))
+        return counters
+
+    @staticmethod
+    def bulk_export(file, fmt='csv', chunk_size=10000, progress=None):
+        """
+        Write every user to a file as CSV or JSON lines, in chunks.
+
+        :param file: an open text file to write to.
+        :param fmt: 'csv' or 'jsonl' (str).
+        :param chunk_size: users written per chunk (int).
+        :param progress: called with the counters after every chunk
+                         (callable).
+        :returns: a dict containing the keys 'exported', 'seconds' and
+                  'rows_per_second'.
+        :raise: ValueError: Export format not valid!
+        """
+        if fmt not in ('csv', 'jsonl'):
+            raise ValueError("Export format not valid!")
+        fields = ['username', 'password', 'age', 'balance']
+        counters = {"exported": 0}
+        start = time.perf_counter()
+        if fmt == 'csv':
+            writer = csv.writer(file, lineterminator='\n')
+            writer.writerow(fields)
+        names = user_store.names()
+        for first in range(0, len(names), chunk_size):
+            chunk = [user_store.get(name)
+                     for name in names[first:first + chunk_size]]
+            if fmt == 'csv':
+                writer.writerows([user[field] for field in fields]
+                                 for user in chunk)
+            else:
+                file.write(''.join(json.dumps(user) + '\n'
+                                   for user in chunk))
+            counters["exported"] += len(chunk)
+            User._report(counters, start, progress)
+        return counters
+
+    @staticmethod
+    def _json_rows(lines):
+        """ Turn JSON lines into [username, password, age] rows. """
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                user = json.loads(line)
+                yield [str(user['username']), str(user['password']),
+                       str(user['age'])]
+            except (ValueError, KeyError, TypeError):
+                yield ['']  # Counted as a rejected row
+
+    @staticmethod
+    def _report(counters, start, progress):
+        """ Update the timing counters and pass them to progress. """
+        counters["seconds"] = time.perf_counter() - start
+        done = counters.get("read", counters.get("exported"))
+        counters["rows_per_second"] = done / max(counters["seconds"], 1e-9)
+        if progress is not None:
+            progress(dict(counters))
+
     @staticmethod
     def get_data(username=None):
         """
-        Open user_data_file and get the user data for the specified username.
+        Get the user data for the specified username from the user store.
 
         :param username: the user to get the data for (str).
         :returns: a dict containing the keys:
@@ -2397,16 +1932,7 @@ class User:
                  'age'       - (str)
                  'balance'   - (str)
         """
-        data = {}
-        with open(user_data_file, 'r') as file:
-            for line in file:
-                _user, _pwd, _years, _money = line.strip().split(',')
-                data[_user] = [_pwd, _years, _money]
-        password = data[username][0]
-        age = data[username][1]
-        balance = data[username][2]
-        return {"username": username, "password": password,
-                "age": age, "balance": balance}
+        return user_store.get(username)
 
     @staticmethod
     def get_current():
@@ -2420,8 +1946,8 @@ class User:
                  'age'       - (str)
                  'balance'   - (str)
         """
-        with open(current_user_file, 'r') as file:
-            user, pwd, age, balance = file.readline().split(',')
+        current_user = file_writer.read(current_user_file)
+        user, pwd, age, balance = current_user.split('\n')[0].split(',')
         return {"username": user, "password": pwd,
                 "age": age, "balance": balance}
 
@@ -2464,29 +1990,17 @@ class User:
         :param old_name: user's original name (str).
         :param new_name: user's new name(str).
         """
-        user_data = list(Check.file()['user_data'])
-        password = User.get_data(old_name)['password']
-        age = User.get_data(old_name)['age']
-        balance = User.get_data(old_name)['balance']
-
-        del_user = old_name + ',' + password + ',' + age + ',' + balance
-        user_data.remove(del_user)
-        new_user = new_name + ',' + password + ',' + age + ',' + balance
-        user_data.append(new_user)
+        user_store.rename(old_name, new_name)
+        username_index.remove(old_name)
+        username_index.add(new_name)
+        credential_index.rename(old_name, new_name)
+        balance_history.rename(old_name, new_name)
+        sales_ledger.rename(old_name, new_name)
+        user = User.get_data(new_name)
+        new_user = new_name + ',' + user['password'] + ',' + user['age'] + \
+            ',' + user['balance']
 
-        with open(user_data_file, 'w') as f:
-            f.write('\n'.join(user_data))
-
-        with open(user_names_file, 'r') as r:
-            user_names = [line.strip() for line in r]
-        user_names.remove(old_name)
-        user_names.append(new_name)
-
-        with open(user_names_file, 'w') as f:
-            f.write('\n'.join(user_names))
-
-        with open(current_user_file, 'w') as f:
-            f.write(new_user)
+        file_writer.replace(current_user_file, new_user)
 
         logger.info("Your username is now '{}'.".format(new_name))
 
@@ -2498,18 +2012,8 @@ class User:
         :param username: user's login name (str).
         :param new_password: user's new password (str).
         """
-        user_data = list(Check.file()['user_data'])
-        old_password = User.get_data(username)['password']
-        age = User.get_data(username)['age']
-        balance = User.get_data(username)['balance']
-
-        del_user = username + ',' + old_password + ',' + age + ',' + balance
-        user_data.remove(del_user)
-        new_user = username + ',' + new_password + ',' + age + ',' + balance
-        user_data.append(new_user)
-
-        with open(user_data_file, 'w') as f:
-            f.write('\n'.join(user_data))
+        user_store.update(username, password=new_password)
+        credential_index.set(username, new_password)
 
         logger.info("Your password is now '{}'.".format(new_password))
 
@@ -2521,18 +2025,7 @@ class User:
         :param username: user's login name (str).
         :param new_age: user's new age (str).
         """
-        user_data = list(Check.file()['user_data'])
-        password = User.get_data(username)['password']
-        old_age = User.get_data(username)['age']
-        balance = User.get_data(username)['balance']
-
-        del_user = username + ',' + password + ',' + old_age + ',' + balance
-        user_data.remove(del_user)
-        new_user = username + ',' + password + ',' + new_age + ',' + balance
-        user_data.append(new_user)
-
-        with open(user_data_file, 'w') as f:
-            f.write('\n'.join(user_data))
+        user_store.update(username, age=new_age)
 
         logger.info("You are now {:d} years old.".format(int(new_age)))
 
@@ -2543,58 +2036,56 @@ class User:
 
         :param username: user's login name (str).
         """
-        user_data = list(Check.file()['user_data'])
-        password = User.get_data(username)['password']
-        age = User.get_data(username)['age']
-        balance = User.get_data(username)['balance']
-
-        del_user = username + ',' + password + ',' + age + ',' + balance
-        user_data.remove(del_user)
-
-        with open(user_data_file, 'w') as f:
-            f.write('\n'.join(user_data))
-
-        with open(user_names_file, 'r') as u:
-            user_names = [line.strip() for line in u]
-
-        user_names.remove(username)
-        with open(user_names_file, 'w') as f:
-            f.write('\n'.join(user_names))
+        user_store.remove(username)
+        username_index.remove(username)
+        credential_index.remove(username)
+        balance_history.remove(username)
 
     @staticmethod
-    def withdraw(username, amount):
+    def withdraw(username, amount, transaction=None):
         """
-        Withdraw an amount from the user's current balance.
+        Withdraw an amount from the user's current balance, at most once for
+        each transaction ID.
 
         :param username: user's login name (str).
-        :param amount: amount of money to withdraw (float).
-        :returns: True - If withdrawal is successful (bool).
+        :param amount: amount of money to withdraw, exact as a str such as
+                       format_cents gives (float or str).
+        :param transaction: the withdrawal's unique ID, where repeating it
+                            gives back the first result instead of
+                            withdrawing again, or None for a new one (str).
+        :returns: the result (Withdrawal), with the status:
+
+                  ok - If withdrawal is successful (str).
                   inadequate_funds - If user balance is less than amount (str).
-                  False - If any other case.
-        """
-        user_balance = User.get_data(username)['balance']
-        if float(user_balance) >= amount:
-            user_data = list(Check.file()['user_data'])
-            password = User.get_data(username)['password']
-            age = User.get_data(username)['age']
-            logger.info("Withdrawing {} from {}".format(amount, username))
-            del_user = username + ',' + password + ',' + age + ',' + \
-                user_balance
-            user_data.remove(del_user)
-
-            new_balance = str(float(user_balance) - amount)
-
-            new_user = username + ',' + password + ',' + age + ',' + \
-                new_balance
-            user_data.append(new_user)
-
-            with open(user_data_file, 'w') as f:
-                f.write('\n'.join(user_data))
-            return True
-        elif int(user_balance) < amount:
-            return "inadequate_funds"
-        else:
-            return False
+                  error - If the user does not exist, or the transaction ID
+                          was used for another user or amount (str).
+        """
+        if transaction is None:
+            transaction = transaction_log.new_id()
+        cents = parse_cents(amount)
+        with transaction_log.claim(transaction, username, cents) as result:
+            if result is not None:
+                logger.info("Transaction {} has already run.".format(
+                    transaction))
+                return result
+            with file_writer.group():
+                try:
+                    balance = user_store.adjust_balance(username,
+                                                        format_cents(-cents))
+                except KeyError:
+                    result = Withdrawal("error", None, transaction)
+                else:
+                    if balance is None:
+                        result = Withdrawal("inadequate_funds", None,
+                                            transaction)
+                    else:
+                        balance_history.record(username, -cents,
+                                               parse_cents(balance))
+                        result = Withdrawal("ok", balance, transaction)
+                transaction_log.record(result, username, cents)
+        if result.ok:
+            logger.info("Withdrew {} from {}".format(amount, username))
+        return result
 
     @staticmethod
     def deposit(username, amount):
@@ -2604,23 +2095,99 @@ class User:
         :param username: user's login name (str).
         :param amount: amount of money to deposit (float).
         """
-        user_balance = User.get_data(username)['balance']
-        user_data = list(Check.file()['user_data'])
-        password = User.get_data(username)['password']
-        age = User.get_data(username)['age']
         logger.info("Depositing {} to {}".format(amount, username))
-        del_user = username + ',' + password + ',' + age + ',' + \
-            user_balance
-        user_data.remove(del_user)
+        with file_writer.group():
+            balance = user_store.adjust_balance(username, amount)
+            balance_history.record(username, parse_cents(amount),
+                                   parse_cents(balance))
 
-        new_balance = str(float(user_balance) + amount)
+    @staticmethod
+    def apply_transactions(transactions, atomic=False):
+        """
+        Apply many deposits and withdrawals in one pass over the user store,
+        checking the funds for each against the balance left by the ones
+        before it.
+
+        :param transactions: (username, amount) pairs, with a negative amount
+                             for a withdrawal (iterable of tuple).
+        :param atomic: apply nothing unless every transaction succeeds (bool).
+        :returns: one result per transaction (list), each one of:
+
+                  True - If it was applied (bool).
+                  inadequate_funds - If the balance is less than the
+                                     withdrawal (str).
+                  unknown_user - If the user does not exist (str).
+                  rolled_back - If it was valid but the atomic batch was not
+                                applied (str).
+        """
+        transactions = list(transactions)
+        with file_writer.group():
+            results = user_store.adjust_many(transactions, atomic)
+            failed = not all(results)
+            if not (atomic and failed):
+                balance_history.record_many(
+                    (username, parse_cents(amount), parse_cents(balance))
+                    for (username, amount), balance in zip(transactions,
+                                                           results)
+                    if balance)
+        logger.info("Applied {} of {} transactions".format(
+            0 if atomic and failed else sum(map(bool, results)),
+            len(results)))
+        return ["unknown_user" if result is False else
+                "inadequate_funds" if result is None else
+                "rolled_back" if atomic and failed else True
+                for result in results]
 
-        new_user = username + ',' + password + ',' + age + ',' + \
-            new_balance
-        user_data.append(new_user)
+    @staticmethod
+    def credit_all(amount):
+        """
+        Deposit the same amount to every user's balance.
 
-        with open(user_data_file, 'w') as f:
-            f.write('\n'.join(user_data))
+        :param amount: amount of money to deposit (float).
+        :return: the number of users credited (int).
+        :raise: ValueError: Credit amount not valid!
+        """
+        cents = parse_cents(amount)
+        with file_writer.group():
+            count = user_store.credit_all(cents)
+            balance_history.record_many(
+                (name, cents, parse_cents(user_store.get(name)['balance']))
+                for name in user_store.names())
+        logger.info("Deposited {} to {} users".format(amount, count))
+        return count
+
+    @staticmethod
+    def balance_at(username, timestamp):
+        """
+        Get the user's balance at a past time.
+
+        :param username: user's login name (str).
+        :param timestamp: seconds since the epoch or a datetime (float).
+        :return: the balance then (str) or None if the user had no recorded
+                 balance by then. History older than HISTORY_FULL_DAYS gives
+                 the balance at the end of that day.
+        """
+        cents = balance_history.balance_at(username, timestamp)
+        return None if cents is None else format_cents(cents)
+
+    @staticmethod
+    def total_balance():
+        """
+        Add up every user's balance.
+
+        :return: the total balance (str).
+        """
+        return format_cents(user_store.total_cents())
+
+    @staticmethod
+    def users_below(amount):
+        """
+        Find the users whose balance is less than an amount.
+
+        :param amount: amount of money to compare against (float).
+        :return: usernames (list).
+        """
+        return user_store.names_below(parse_cents(amount))
 
 
 class Options:
@@ -2688,7 +2255,7 @@ def main():
     of the Virtual World program, and calls for the exit cleanup.
     """
     # import options_write  # overwrites the options file with default values
-    Check.file()
+    Check.options()  # The other files are checked once the window is idle
     app = VirtualWorld()
 
     w = 500  # Width for the Tk root
@@ -2708,6 +2275,7 @@ def main():
     app.resizable(width=False, height=False)
     app_options = Options()
     app.mainloop()  # starts the mainloop
+    workers.shutdown()  # Let any storage calls still running finish
     app_options.exit()
 
 if __name__ == "__main__":
@@ -0,0 +1,10 @@
+# Filename: migrate_users.py
+# Imports the text user files into the store chosen by STORAGE_BACKEND in
+# __init__.py. Run it once after switching STORAGE_BACKEND away from 'text'.
+
+from __init__ import (user_data_file, user_names_file, balance_journal_file,
+                      user_store)
+from _store import UserStore, migrate
+
+migrate(UserStore(user_data_file, user_names_file, balance_journal_file),
+        user_store)
@@ -0,0 +1,9 @@
+# Filename: reshard_users.py
+# Redistributes the sharded user files (STORAGE_BACKEND = 'sharded') across a
+# new number of shards. Usage: python reshard_users.py <number of shards>
+
+import sys
+
+from __init__ import user_store
+
+user_store.reshard(int(sys.argv[1]))
@@ -0,0 +1,32 @@
+# Filename: sales_report.py
+# Writes the daily or weekly sales report (revenue per shop, item and age
+# bracket and orders per hour) to sales_report_<period>_<date>.csv and .json.
+# Usage: python sales_report.py daily|weekly [YYYY-MM-DD, default today]
+
+import sys
+import time
+
+from __init__ import order_history_file, file_writer, user_store
+from _report import SalesReport
+
+period = sys.argv[1] if len(sys.argv) > 1 else 'daily'
+day = time.strptime(sys.argv[2] if len(sys.argv) > 2 else
+                    time.strftime('%Y-%m-%d'), '%Y-%m-%d')
+if period == 'weekly':  # The week from Monday
+    day = time.localtime(time.mktime(day) + 43200 - day.tm_wday * 86400)
+    days = 7
+elif period == 'daily':
+    days = 1
+else:
+    sys.exit("Usage: python sales_report.py daily|weekly [YYYY-MM-DD]")
+start = time.mktime(time.strptime(time.strftime('%Y-%m-%d', day),
+                                  '%Y-%m-%d'))
+end = time.mktime(time.strptime(time.strftime(
+    '%Y-%m-%d', time.localtime(start + days * 86400 + 43200)), '%Y-%m-%d'))
+
+report = SalesReport(order_history_file, start, end,
+                     lambda username: user_store.get(username)['age'],
+                     file_writer)
+report.build()
+report.write('sales_report_{}_{}'.format(period, time.strftime('%Y-%m-%d',
+                                                               day)))
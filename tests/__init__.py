@@ -0,0 +1,62 @@
+# ===================================
+# Filename: __init__.py
+# Purpose: To share the helpers of the virtual-world program's tests.
+#
+#
+# virtual-world
+# Copyright (C) 2017  Joshua Peter Booth
+#
+# This file is part of virtual-world.
+#
+# virtual-world is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# virtual-world is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with virtual-world (see LICENSE.md).
+# If not, see <http://www.gnu.org/licenses/>.
+#
+# Contact me:
+# Email: joshb00th@icloud.com
+# ===================================
+
+import os
+import sys
+import tempfile
+import unittest
+
+# The modules under test sit at the top of the repository
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+class TempDirTest(unittest.TestCase):
+
+    def setUp(self):
+        """ Run each test in its own empty working directory. """
+        self._cwd = os.getcwd()
+        self._dir = tempfile.TemporaryDirectory()
+        os.chdir(self._dir.name)
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        self._dir.cleanup()
+
+    @staticmethod
+    def write(path, data):
+        """ Write a file as another process would. """
+        with open(path, 'w') as file:
+            file.write(data)
+
+    @staticmethod
+    def read(path):
+        """ Read a file's contents (str). """
+        with open(path, 'r') as file:
+            return file.read()
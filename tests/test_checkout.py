@@ -0,0 +1,140 @@
+# ===================================
+# Filename: test_checkout.py
+# Purpose: To test paying for an order in the virtual-world program.
+#
+#
+# virtual-world
+# Copyright (C) 2017  Joshua Peter Booth
+#
+# This file is part of virtual-world.
+#
+# virtual-world is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# virtual-world is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with virtual-world (see LICENSE.md).
+# If not, see <http://www.gnu.org/licenses/>.
+#
+# Contact me:
+# Email: joshb00th@icloud.com
+# ===================================
+
+import types
+import unittest
+from unittest import mock
+
+from tests import TempDirTest
+from _log import logger
+from _shop import Catalog, Order, Cart
+
+
+class Widget:
+
+    def __init__(self):
+        """ Stand-in for a checkout window widget, keeping its calls. """
+        self.options = {}
+        self.delayed = []
+
+    def configure(self, **options):
+        self.options.update(options)
+
+    def after(self, delay, callback):
+        self.delayed.append(callback)
+
+
+class Workers:
+
+    def __init__(self):
+        """ Stand-in for the WorkerPool that runs calls when told to. """
+        self.calls = []
+
+    def run(self, widget, work, done=None, busy=(), failed=None):
+        self.calls.append((work, done))
+
+    def finish(self):
+        """ Run every call made so far, and any they start, in order. """
+        while self.calls:
+            work, done = self.calls.pop(0)
+            result = work()
+            if done is not None:
+                done(result)
+
+
+class CheckoutTest(TempDirTest):
+
+    @classmethod
+    def setUpClass(cls):
+        disabled = logger.disabled
+        try:
+            import main
+        except ImportError as error:  # No Tk here
+            raise unittest.SkipTest(error)
+        finally:
+            logger.disabled = disabled  # main silences the log
+        cls.main = main
+
+    def setUp(self):
+        super().setUp()
+        main = self.main
+        self.write('inventory.txt', 'tech/tv:5\n')
+        main.user_store.put('ann', 'pw', '30', '500')
+        self.workers = Workers()
+        patcher = mock.patch.object(main, 'workers', self.workers)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        cart = Cart()
+        self.order = Order(Catalog('tech', [('tv', 'TV', '100')]),
+                           'tech_order.txt', main.file_writer)
+        self.order.set('tv', 2)
+        cart.add('tech', self.order)
+
+        toplevel = types.SimpleNamespace(
+            opened=1, submit=Widget(), cancel=Widget(), user_info=Widget())
+        page = types.SimpleNamespace(
+            toplevel=toplevel, controller=types.SimpleNamespace(
+                cart=cart, frames={}),
+            snapshot=(cart.total, cart.stock(), [
+                ('tech', self.order.sales())]),
+            reservation=main.inventory.reserve_many(cart.stock()),
+            transaction=main.transaction_log.new_id())
+        for name in ('purchase', 'paid', 'empty_cart', 'remove_window'):
+            setattr(page, name, types.MethodType(
+                getattr(main.ShopPage, name), page))
+        self.page = page
+
+    def tearDown(self):
+        self.main.sales_ledger.save()  # Before leaving the directory
+        super().tearDown()
+
+    def test_confirm_twice(self):
+        main = self.main
+        self.page.purchase('ann')
+        self.page.purchase('ann')  # Pressed again while paying
+        self.workers.finish()
+        self.page.purchase('ann')  # Pressed again once paid
+        self.workers.finish()
+
+        self.assertEqual(main.user_store.get('ann')['balance'], '300')
+        self.assertEqual(main.inventory.available('tech', 'tv'), 3)
+        self.assertEqual(main.sales_ledger.user_totals('ann'), (1, 20000))
+        self.assertEqual(len(self.read('order_history.txt').splitlines()),
+                         1)
+        self.assertEqual(self.order.count, 0)
+        self.assertEqual(self.read('tech_order.txt'), 'tv:0\ntotal:0')
+        self.assertIsNone(self.page.transaction)
+        self.assertEqual(self.page.toplevel.submit.options,
+                         {'state': 'disabled', 'command': ''})
+        self.assertEqual(self.page.toplevel.user_info.options['text'],
+                         "Transaction successful")
+
+
+if __name__ == '__main__':
+    unittest.main()
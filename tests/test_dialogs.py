@@ -0,0 +1,107 @@
+# ===================================
+# Filename: test_dialogs.py
+# Purpose: To test the reused dialog windows of the virtual-world program.
+#
+#
+# virtual-world
+# Copyright (C) 2017  Joshua Peter Booth
+#
+# This file is part of virtual-world.
+#
+# virtual-world is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# virtual-world is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with virtual-world (see LICENSE.md).
+# If not, see <http://www.gnu.org/licenses/>.
+#
+# Contact me:
+# Email: joshb00th@icloud.com
+# ===================================
+
+import unittest
+from unittest import mock
+
+from _dialogs import DialogPool
+
+
+class Toplevel:
+
+    def __init__(self, master):
+        """ Stand-in for tk.Toplevel that needs no display. """
+        self.master = master
+        self.shown = False
+        self.destroyed = False
+
+    def withdraw(self):
+        self.shown = False
+
+    def deiconify(self):
+        self.shown = True
+
+    def lift(self):
+        pass
+
+    def focus_set(self):
+        pass
+
+    def destroy(self):
+        self.destroyed = True
+
+
+@mock.patch('_dialogs.tk.Toplevel', Toplevel)
+class DialogPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = DialogPool(keep=1)
+        self.built = []
+
+    def build(self, dialog):
+        self.built.append(dialog)
+
+    def test_reused(self):
+        dialog = self.pool.open('root', 'checkout', self.build)
+        self.assertTrue(dialog.shown)
+        self.assertEqual((dialog.kind, dialog.opened), ('checkout', 1))
+        self.pool.close(dialog)
+        self.assertFalse(dialog.shown)
+        self.assertIs(self.pool.open('root', 'checkout', self.build), dialog)
+        self.assertEqual(dialog.opened, 2)
+        self.assertEqual(len(self.built), 1)
+        self.assertIsNot(self.pool.open('root', 'settings', self.build),
+                         dialog)
+
+    def test_keep(self):
+        first = self.pool.open('root', 'checkout', self.build)
+        second = self.pool.open('root', 'checkout', self.build)
+        self.pool.close(first)
+        self.pool.close(second)
+        self.assertFalse(first.destroyed)
+        self.assertTrue(second.destroyed)
+
+    def test_prebuild(self):
+        self.pool.prebuild('root', 'checkout', self.build)
+        self.pool.prebuild('root', 'checkout', self.build)
+        self.assertEqual(len(self.built), 1)
+        self.assertFalse(self.built[0].shown)
+        self.assertIs(self.pool.open('root', 'checkout', self.build),
+                      self.built[0])
+
+    def test_is_open(self):
+        dialog = self.pool.open('root', 'checkout', self.build)
+        self.assertTrue(DialogPool.is_open(dialog, 1))
+        self.assertFalse(DialogPool.is_open(None, 1))
+        self.pool.close(dialog)
+        self.pool.open('root', 'checkout', self.build)
+        self.assertFalse(DialogPool.is_open(dialog, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+# ===================================
+# Filename: test_history.py
+# Purpose: To test the balance history of the virtual-world program.
+#
+#
+# virtual-world
+# Copyright (C) 2017  Joshua Peter Booth
+#
+# This file is part of virtual-world.
+#
+# virtual-world is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# virtual-world is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with virtual-world (see LICENSE.md).
+# If not, see <http://www.gnu.org/licenses/>.
+#
+# Contact me:
+# Email: joshb00th@icloud.com
+# ===================================
+
+import time
+import unittest
+
+from tests import TempDirTest
+from _history import BalanceHistory, Timeline
+from _log import logger
+
+
+class TimelineTest(unittest.TestCase):
+
+    def test_balance(self):
+        timeline = Timeline()
+        self.assertIsNone(timeline.balance())
+        timeline.add(1, 100, 100)
+        timeline.add(2, -30)
+        timeline.add(3, 5, 75)
+        timeline.add(4, 1)
+        self.assertEqual([timeline.balance(position) for position in
+                          range(-1, 4)], [None, 100, 70, 75, 76])
+
+
+class BalanceHistoryTest(TempDirTest):
+
+    def setUp(self):
+        super().setUp()
+        self.start = round(time.time()) - 3600
+        self.history = self.open()
+
+    def open(self):
+        return BalanceHistory('history.txt', checkpoint_every=3)
+
+    def record(self, history, changes):
+        """ Record (seconds after start, delta) changes for 'ann'. """
+        balance = 0
+        for seconds, delta in changes:
+            balance += delta
+            history.record('ann', delta, balance, self.start + seconds)
+
+    def test_balance_at(self):
+        self.record(self.history, [(10 * number, 100) for number in
+                                   range(1, 11)])
+        self.assertIsNone(self.history.balance_at('ann', self.start + 5))
+        self.assertIsNone(self.history.balance_at('bob', self.start + 50))
+        for history in (self.history, self.open()):
+            self.assertEqual([history.balance_at('ann', self.start + seconds)
+                              for seconds in (10, 15, 30, 45, 100, 200)],
+                             [100, 100, 300, 400, 1000, 1000])
+
+    def test_checkpoints(self):
+        self.record(self.history, [(number, 1) for number in range(7)])
+        lines = self.read('history.txt').splitlines()
+        self.assertEqual([line.split(',')[2] for line in lines],
+                         ['1', '', '', '4', '', '', '7'])
+
+    def test_clock_going_backwards(self):
+        self.record(self.history, [(20, 100), (10, 5)])
+        self.assertEqual(self.history.balance_at('ann', self.start + 20),
+                         105)
+
+    def test_rename_and_remove(self):
+        self.record(self.history, [(10, 100)])
+        self.history.record('bob', 7, 7, self.start + 10)
+        self.history.rename('ann', 'amy')
+        self.history.remove('bob')
+        history = self.open()
+        self.assertIsNone(history.balance_at('ann', self.start + 10))
+        self.assertIsNone(history.balance_at('bob', self.start + 10))
+        self.assertEqual(history.balance_at('amy', self.start + 10), 100)
+
+    def test_partial_last_line(self):
+        self.record(self.history, [(10, 100), (20, 1)])
+        with open('history.txt', 'a') as file:
+            file.write('{:.3f},5'.format(self.start + 30))
+        history = self.open()
+        with self.assertLogs(logger, 'WARNING'):
+            self.assertEqual(history.balance_at('ann', self.start + 30),
+                             101)
+        self.assertEqual(len(self.read('history.txt').splitlines()), 2)
+        history.record('ann', 1, 102, self.start + 40)
+        self.assertEqual(self.open().balance_at('ann', self.start + 40), 102)
+
+
+class DownsampleTest(TempDirTest):
+
+    def test_boundaries(self):
+        history = BalanceHistory('history.txt', checkpoint_every=3,
+                                 full_days=1, resolution=100)
+        now = round(time.time())
+        cutoff = now - 86400
+        start = (cutoff // 100 - 100) * 100  # A period's first second
+        changes = [(start, 100), (start + 50, 50), (start + 99.5, 10),
+                   (start + 100, 1), (start + 150, 1), (cutoff, 1),
+                   (cutoff + 1, 1), (cutoff + 2, 1)]
+        balance = 0
+        for when, delta in changes:
+            balance += delta
+            history.record('ann', delta, balance, when)
+        history.downsample(now)
+        self.assertEqual(len(self.read('history.txt').splitlines()), 5)
+        for history in (history, BalanceHistory('history.txt',
+                                                full_days=1, resolution=100)):
+            self.assertEqual([history.balance_at('ann', when) for when in (
+                start, start + 99.5, start + 120, start + 150, cutoff,
+                cutoff + 1, cutoff + 2)],
+                [None, 160, 160, 162, 163, 164, 165])
+
+    def test_nothing_to_merge(self):
+        history = BalanceHistory('history.txt', full_days=1, resolution=100)
+        now = round(time.time())
+        history.record('ann', 5, 5, now - 86400 - 200)
+        history.record('ann', 5, 10, now - 86400 - 100)
+        data = self.read('history.txt')
+        history.downsample(now)
+        self.assertEqual(self.read('history.txt'), data)
+
+
+if __name__ == '__main__':
+    unittest.main()
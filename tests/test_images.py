@@ -0,0 +1,111 @@
+# ===================================
+# Filename: test_images.py
+# Purpose: To test the image cache of the virtual-world program.
+#
+#
+# virtual-world
+# Copyright (C) 2017  Joshua Peter Booth
+#
+# This file is part of virtual-world.
+#
+# virtual-world is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# virtual-world is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with virtual-world (see LICENSE.md).
+# If not, see <http://www.gnu.org/licenses/>.
+#
+# Contact me:
+# Email: joshb00th@icloud.com
+# ===================================
+
+import json
+import unittest
+from unittest import mock
+
+from tests import TempDirTest
+from _images import ImageCache, atlas_key, pack
+
+
+class PhotoImage:
+
+    def __init__(self, file=None, data=None, format=None, width=None,
+                 height=None):
+        """ Stand-in for tk.PhotoImage that needs no display. """
+        self.file = file
+        self._width = width or 40
+        self._height = height or 20
+        self.tk = mock.Mock()
+
+    def width(self):
+        return self._width
+
+    def height(self):
+        return self._height
+
+    def subsample(self, factor):
+        return PhotoImage(width=self._width // factor,
+                          height=self._height // factor)
+
+
+class PackTest(unittest.TestCase):
+
+    def test_shelves(self):
+        offsets, size = pack([('a', 30, 10), ('b', 30, 20), ('c', 30, 5)],
+                             width=64)
+        self.assertEqual(offsets, {'b': [0, 0, 30, 20], 'a': [31, 0, 30, 10],
+                                   'c': [0, 21, 30, 5]})
+        self.assertEqual(size, (64, 26))
+
+    def test_widened_to_fit(self):
+        offsets, size = pack([('a', 100, 10)], width=64)
+        self.assertEqual(size, (100, 10))
+
+    def test_atlas_key(self):
+        self.assertEqual(atlas_key('img\\Shops\\Logo.GIF'),
+                         'img/shops/logo.gif')
+
+
+@mock.patch('_images.tk.PhotoImage', PhotoImage)
+class ImageCacheTest(TempDirTest):
+
+    def test_shared(self):
+        images = ImageCache()
+        logo = images.get('img/logo.gif')
+        self.assertIs(images.get('IMG\\logo.gif'), logo)
+        self.assertIsNot(images.get('img/logo.gif', height=10), logo)
+        self.assertEqual(images.stats(), {"hits": 1, "misses": 2,
+                                          "images": 2, "bytes": 4800})
+
+    def test_subsample_shares_the_full_image(self):
+        images = ImageCache()
+        small = images.get('img/logo.gif', subsample=2)
+        self.assertEqual((small.width(), small.height()), (20, 10))
+        self.assertIs(images.get('img/logo.gif', subsample=2), small)
+        images.get('img/logo.gif')
+        self.assertEqual(images.stats()["misses"], 2)
+
+    def test_atlas(self):
+        self.write('atlas.json', json.dumps({'img/logo.gif': [3, 4, 8, 6]}))
+        images = ImageCache('atlas.png', 'atlas.json')
+        logo = images.get('img/logo.gif')
+        self.assertIsNone(logo.file)
+        self.assertEqual((logo.width(), logo.height()), (8, 6))
+        logo.tk.call.assert_called_once_with(
+            logo, 'copy', images._atlas, '-from', 3, 4, 11, 10)
+        self.assertEqual(images.get('img/other.gif').file, 'img/other.gif')
+
+    def test_no_atlas(self):
+        images = ImageCache('atlas.png', 'atlas.json')
+        self.assertEqual(images.get('img/logo.gif').file, 'img/logo.gif')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+# ===================================
+# Filename: test_index.py
+# Purpose: To test the username and login indexes of the virtual-world
+#          program.
+#
+#
+# virtual-world
+# Copyright (C) 2017  Joshua Peter Booth
+#
+# This file is part of virtual-world.
+#
+# virtual-world is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# virtual-world is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with virtual-world (see LICENSE.md).
+# If not, see <http://www.gnu.org/licenses/>.
+#
+# Contact me:
+# Email: joshb00th@icloud.com
+# ===================================
+
+import unittest
+
+from tests import TempDirTest
+from _index import BloomFilter, UsernameIndex, CredentialIndex
+from _store import UserStore, BinaryUserStore
+
+
+class BloomFilterTest(unittest.TestCase):
+
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(1000)
+        names = ['user{}'.format(number) for number in range(1000)]
+        for name in names:
+            bloom.add(name)
+        self.assertTrue(all(name in bloom for name in names))
+        false_positives = sum('other{}'.format(number) in bloom
+                              for number in range(1000))
+        self.assertLess(false_positives, 50)
+
+    def test_bytes_round_trip(self):
+        bloom = BloomFilter(10)
+        bloom.add('ann')
+        copy = BloomFilter.from_bytes(bloom.to_bytes())
+        self.assertIn('ann', copy)
+        self.assertEqual((copy.size, copy.hashes, copy.count),
+                         (bloom.size, bloom.hashes, 1))
+
+    def test_bytes_not_valid(self):
+        with self.assertRaises(ValueError):
+            BloomFilter.from_bytes(b'short')
+        with self.assertRaises(ValueError):
+            BloomFilter.from_bytes(BloomFilter(10).to_bytes()[:-1])
+
+
+class UsernameIndexTest(TempDirTest):
+
+    def setUp(self):
+        super().setUp()
+        self.store = UserStore('users.txt', 'names.txt', 'journal.txt')
+        self.store.put('ann', 'pw', '30', '100')
+        self.index = UsernameIndex(self.store, 'names.bloom')
+
+    def test_available(self):
+        self.assertFalse(self.index.available('ann'))
+        self.assertTrue(self.index.available('bob'))
+
+    def test_add_and_remove(self):
+        self.assertTrue(self.index.available('bob'))
+        self.store.put('bob', 'pw', '40', '1')
+        self.index.add('bob')
+        self.assertFalse(self.index.available('bob'))
+        self.store.remove('bob')
+        self.index.remove('bob')
+        self.assertTrue(self.index.available('bob'))
+
+    def test_saved_filter_survives_balance_changes(self):
+        self.index.available('ann')
+        self.store.adjust_balance('ann', 1)
+        self.store.credit_all(1)
+        index = UsernameIndex(self.store, 'names.bloom')
+        self.assertTrue(index._load(repr(self.store.names_stamp())))
+        self.store.rename('ann', 'amy')
+        self.assertFalse(index._load(repr(self.store.names_stamp())))
+
+    def test_outside_change_rebuilds(self):
+        self.assertTrue(self.index.available('cat'))
+        self.store.get('ann')  # Adopt the stamp of our own writes
+        self.write('users.txt', 'cat,pw,20,5\n')
+        self.assertFalse(self.index.available('cat'))
+
+    def test_grows_past_capacity(self):
+        self.index.available('ann')
+        names = ['user{}'.format(number) for number in range(1100)]
+        self.store.put_many({'username': name, 'password': 'pw', 'age': '20',
+                             'balance': '0'} for name in names)
+        self.index.add(*names)
+        self.assertGreater(self.index._bloom.capacity, 1100)
+        self.assertFalse(self.index.available('user1099'))
+
+
+class CredentialIndexTest(TempDirTest):
+
+    def setUp(self):
+        super().setUp()
+        self.store = BinaryUserStore('users.bin', 'users.idx')
+        self.store.put('ann', 'pw', '30', '100')
+        self.index = CredentialIndex(self.store, 'users.key')
+
+    def tearDown(self):
+        self.store.close()
+        super().tearDown()
+
+    def test_verify(self):
+        self.assertTrue(self.index.verify('ann', 'pw'))
+        self.assertFalse(self.index.verify('ann', 'no'))
+        self.assertFalse(self.index.verify('bob', 'pw'))
+        self.assertEqual(self.index.verify_many([('ann', 'pw'),
+                                                 ('ann', 'no')]),
+                         [True, False])
+
+    def test_key_is_kept(self):
+        self.index.verify('ann', 'pw')
+        with open('users.key', 'rb') as file:
+            key = file.read()
+        self.assertEqual(len(key), 32)
+        CredentialIndex(self.store, 'users.key').verify('ann', 'pw')
+        with open('users.key', 'rb') as file:
+            self.assertEqual(file.read(), key)
+
+    def test_changes(self):
+        self.index.verify('ann', 'pw')
+        self.index.set('ann', 'new')
+        self.assertTrue(self.index.verify('ann', 'new'))
+        self.index.rename('ann', 'amy')
+        self.assertTrue(self.index.verify('amy', 'new'))
+        self.assertFalse(self.index.verify('ann', 'new'))
+        self.index.remove('amy')
+        self.assertFalse(self.index.verify('amy', 'new'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+# ===================================
+# Filename: test_inventory.py
+# Purpose: To test the shop stock of the virtual-world program.
+#
+#
+# virtual-world
+# Copyright (C) 2017  Joshua Peter Booth
+#
+# This file is part of virtual-world.
+#
+# virtual-world is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# virtual-world is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with virtual-world (see LICENSE.md).
+# If not, see <http://www.gnu.org/licenses/>.
+#
+# Contact me:
+# Email: joshb00th@icloud.com
+# ===================================
+
+import unittest
+
+from tests import TempDirTest
+from _inventory import Inventory
+from _log import logger
+
+
+class InventoryTest(TempDirTest):
+
+    def setUp(self):
+        super().setUp()
+        self.write('stock.txt', 'tech/pc:4\ntech/tv:3\n')
+        self.inventory = self.open()
+
+    def open(self):
+        return Inventory('stock.txt', 'journal.txt', hold=60)
+
+    def test_available(self):
+        self.assertEqual(self.inventory.available('tech', 'tv'), 3)
+        self.assertIsNone(self.inventory.available('coffee', 'latte'))
+
+    def test_all_or_none(self):
+        result = self.inventory.reserve_many(
+            {'tech': [('pc', 1), ('tv', 4)], 'coffee': [('latte', 9)]})
+        self.assertEqual(result, "out_of_stock")
+        self.assertEqual(self.inventory.available('tech', 'pc'), 4)
+        first = self.inventory.reserve('tech', [('tv', 2), ('tv', 1)])
+        self.assertIsInstance(first, int)
+        self.assertEqual(self.inventory.available('tech', 'tv'), 0)
+        self.assertEqual(self.inventory.reserve('tech', [('tv', 1)]),
+                         "out_of_stock")
+        self.assertIsInstance(self.inventory.reserve(
+            'coffee', [('latte', 100)]), int)
+
+    def test_commit_once(self):
+        reservation = self.inventory.reserve('tech', [('tv', 2)])
+        self.assertTrue(self.inventory.commit(reservation))
+        self.assertFalse(self.inventory.commit(reservation))
+        self.assertEqual(self.inventory.available('tech', 'tv'), 1)
+        self.assertEqual(self.read('journal.txt'), 'tech/tv:-2\n')
+
+    def test_release(self):
+        reservation = self.inventory.reserve('tech', [('tv', 2)])
+        self.inventory.release(reservation)
+        self.assertEqual(self.inventory.available('tech', 'tv'), 3)
+        self.assertFalse(self.inventory.commit(reservation))
+        self.assertEqual(self.inventory.available('tech', 'tv'), 3)
+
+    def test_expire(self):
+        reservation = self.inventory.reserve('tech', [('tv', 2)])
+        self.inventory.expire()
+        self.assertEqual(self.inventory.available('tech', 'tv'), 1)
+        with self.assertLogs(logger, 'INFO'):
+            self.inventory.expire(now=self.inventory._expiries[0][0])
+        self.assertEqual(self.inventory.available('tech', 'tv'), 3)
+        self.assertFalse(self.inventory.commit(reservation))
+
+    def test_restock(self):
+        self.inventory.restock('tech', [('tv', 2), ('pc', 0)])
+        self.inventory.restock('coffee', [('latte', 5)])
+        self.assertEqual(self.inventory.available('tech', 'tv'), 5)
+        self.assertIsNone(self.inventory.available('coffee', 'latte'))
+        self.assertEqual(self.read('journal.txt'), 'tech/tv:2\n')
+
+    def test_journal_replay(self):
+        self.inventory.commit(self.inventory.reserve('tech', [('tv', 2)]))
+        self.inventory.restock('tech', [('pc', 1)])
+        inventory = self.open()
+        self.assertEqual(inventory.available('tech', 'tv'), 1)
+        self.assertEqual(inventory.available('tech', 'pc'), 5)
+        self.assertEqual(self.read('stock.txt'), 'tech/pc:5\ntech/tv:1\n')
+        self.assertEqual(self.read('journal.txt'), '')
+
+    def test_partial_journal_line(self):
+        self.write('journal.txt', 'tech/tv:-1\ntech/pc:-')
+        with self.assertLogs(logger, 'WARNING'):
+            self.assertEqual(self.inventory.available('tech', 'tv'), 2)
+        self.assertEqual(self.inventory.available('tech', 'pc'), 4)
+        self.assertEqual(self.read('journal.txt'), '')
+
+    def test_compact(self):
+        self.inventory.commit(self.inventory.reserve('tech', [('tv', 1)]))
+        self.inventory.compact()
+        self.assertEqual(self.read('stock.txt'), 'tech/pc:4\ntech/tv:2\n')
+        self.assertEqual(self.read('journal.txt'), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
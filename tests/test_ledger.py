@@ -0,0 +1,118 @@
+# ===================================
+# Filename: test_ledger.py
+# Purpose: To test the transaction log of the virtual-world program.
+#
+#
+# virtual-world
+# Copyright (C) 2017  Joshua Peter Booth
+#
+# This file is part of virtual-world.
+#
+# virtual-world is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# virtual-world is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with virtual-world (see LICENSE.md).
+# If not, see <http://www.gnu.org/licenses/>.
+#
+# Contact me:
+# Email: joshb00th@icloud.com
+# ===================================
+
+import time
+import unittest
+
+from tests import TempDirTest
+from _ledger import TransactionLog, Withdrawal
+from _log import logger
+
+
+class TransactionLogTest(TempDirTest):
+
+    def setUp(self):
+        super().setUp()
+        self.log = TransactionLog('transactions.txt')
+        self.transaction = self.log.new_id()
+
+    def withdraw(self, log, username, cents, status="ok", balance="10"):
+        """ Run a withdrawal through the log as User.withdraw does. """
+        with log.claim(self.transaction, username, cents) as result:
+            if result is not None:
+                return result
+            result = Withdrawal(status, balance, self.transaction)
+            log.record(result, username, cents)
+            return result
+
+    def test_new_ids_differ(self):
+        self.assertNotEqual(self.log.new_id(), self.log.new_id())
+
+    def test_first_run(self):
+        self.assertIsNone(self.log.get(self.transaction))
+        result = self.withdraw(self.log, 'ann', 500)
+        self.assertTrue(result.ok)
+        self.assertEqual(self.log.get(self.transaction), result)
+
+    def test_repeat_gives_first_result(self):
+        first = self.withdraw(self.log, 'ann', 500, "inadequate_funds", None)
+        again = self.withdraw(self.log, 'ann', 500)
+        self.assertEqual(again, first)
+        self.assertFalse(again.ok)
+        self.assertEqual(len(self.read('transactions.txt').splitlines()), 1)
+
+    def test_reused_for_another_withdrawal(self):
+        self.withdraw(self.log, 'ann', 500)
+        with self.assertLogs(logger, 'WARNING'):
+            result = self.withdraw(self.log, 'bob', 500)
+        self.assertEqual(result, Withdrawal("error", None, self.transaction))
+        with self.assertLogs(logger, 'WARNING'):
+            result = self.withdraw(self.log, 'ann', 501)
+        self.assertEqual(result.status, "error")
+        self.assertTrue(self.log.get(self.transaction).ok)
+
+    def test_reload(self):
+        first = self.withdraw(self.log, 'ann', 500, balance="0.05")
+        log = TransactionLog('transactions.txt')
+        self.assertEqual(log.get(self.transaction), first)
+        self.assertEqual(self.withdraw(log, 'ann', 500), first)
+        with self.assertLogs(logger, 'WARNING'):
+            self.assertEqual(self.withdraw(log, 'bob', 500).status, "error")
+
+    def test_partial_last_line(self):
+        first = self.withdraw(self.log, 'ann', 500)
+        with open('transactions.txt', 'a') as file:
+            file.write('{:.3f},other,ok,'.format(time.time()))
+        log = TransactionLog('transactions.txt')
+        with self.assertLogs(logger, 'WARNING'):
+            self.assertEqual(log.get(self.transaction), first)
+        self.assertIsNone(log.get('other'))
+        self.assertEqual(len(self.read('transactions.txt').splitlines()), 1)
+
+    def test_old_lines_without_requests(self):
+        self.write('transactions.txt',
+                   '{:.3f},{},ok,10\n'.format(time.time(), self.transaction))
+        log = TransactionLog('transactions.txt')
+        first = Withdrawal("ok", "10", self.transaction)
+        self.assertEqual(log.get(self.transaction), first)
+        # Without the request it cannot tell a reuse from a repeat
+        self.assertEqual(self.withdraw(log, 'bob', 1), first)
+
+    def test_old_results_dropped(self):
+        old = time.time() - 8 * 86400
+        self.write('transactions.txt',
+                   '{:.3f},old,ok,10,500,ann\n'.format(old))
+        self.withdraw(self.log, 'ann', 500)
+        log = TransactionLog('transactions.txt')
+        self.assertIsNone(log.get('old'))
+        self.assertIsNotNone(log.get(self.transaction))
+        self.assertNotIn('old', self.read('transactions.txt'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+# ===================================
+# Filename: test_report.py
+# Purpose: To test the sales report of the virtual-world program.
+#
+#
+# virtual-world
+# Copyright (C) 2017  Joshua Peter Booth
+#
+# This file is part of virtual-world.
+#
+# virtual-world is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# virtual-world is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with virtual-world (see LICENSE.md).
+# If not, see <http://www.gnu.org/licenses/>.
+#
+# Contact me:
+# Email: joshb00th@icloud.com
+# ===================================
+
+import json
+import unittest
+from array import array
+
+from tests import TempDirTest
+from _report import AGE_BRACKETS, SalesReport, age_bracket, group_sum
+
+
+class AgeBracketTest(unittest.TestCase):
+
+    def test_brackets(self):
+        ages = ['14', '15', '16', '20', '30', '40', '59', '60', '61', '80',
+                '81', 'old', None]
+        self.assertEqual([AGE_BRACKETS[age_bracket(age)] for age in ages],
+                         ['under 15', 'other', '15 to 20', 'other',
+                          '20 to 40', 'other', '40 to 60', 'other',
+                          '60 to 80', 'other', 'over 80', 'unknown',
+                          'unknown'])
+
+
+class GroupSumTest(unittest.TestCase):
+
+    def test_counts(self):
+        self.assertEqual(group_sum(array('q', [0, 2, 2]), 4), [1, 0, 2, 0])
+
+    def test_weights(self):
+        self.assertEqual(group_sum(array('q', [1, 0, 1]), 2,
+                                   array('q', [5, 7, 9])), [7, 14])
+
+
+class SalesReportTest(TempDirTest):
+    start, end = 1000000.0, 2000000.0
+    ages = {'amy': '30', 'bob': '50'}
+
+    def setUp(self):
+        super().setUp()
+        self.lines = []
+
+    def order(self, when, user, cents, shop='tech', item='tv'):
+        self.lines.append(json.dumps(
+            {"time": when, "shop": shop, "user": user,
+             "items": [[item, 1, cents]], "total": cents}) + '\n')
+
+    def rename(self, when, old_name, new_name):
+        self.lines.append(json.dumps(
+            {"time": when, "rename": [old_name, new_name]}) + '\n')
+
+    def build(self, chunk_size=None, tail=''):
+        """ Write the history and build a report over it (dict). """
+        self.write('history.txt', ''.join(self.lines) + tail)
+        report = SalesReport('history.txt', self.start, self.end,
+                             self.ages.__getitem__)
+        if chunk_size is not None:
+            report.chunk_size = chunk_size
+        report.build()
+        return report.results()
+
+    def test_window(self):
+        self.order(self.start - 1, 'bob', 1)
+        self.order(self.start, 'bob', 100)
+        self.order(self.start + 10, 'bob', 200, 'coffee', 'latte')
+        self.order(self.end, 'bob', 1)
+        results = self.build()
+        self.assertEqual((results["orders"], results["items"],
+                          results["cents"]), (2, 2, 300))
+        self.assertEqual(results["shops"]["tech"],
+                         {"orders": 1, "items": 1, "cents": 100})
+        self.assertEqual(results["items_sold"][1],
+                         {"shop": "coffee", "item": "latte", "items": 1,
+                          "cents": 200})
+        self.assertEqual(results["age_brackets"]["40 to 60"],
+                         {"orders": 2, "cents": 300})
+        self.assertEqual(sum(hour["orders"] for hour in results["hours"]), 2)
+
+    def test_renames(self):
+        self.order(self.start, 'ann', 100)
+        self.rename(self.start + 1, 'ann', 'cat')
+        self.order(self.start + 2, 'ann', 200)  # Someone new
+        self.order(self.start + 3, 'cat', 300)
+        self.order(self.end, 'cat', 1)
+        self.rename(self.end + 1, 'cat', 'amy')  # After the end
+        self.order(self.end + 2, 'amy', 1)
+        brackets = self.build()["age_brackets"]
+        self.assertEqual(brackets["20 to 40"], {"orders": 2, "cents": 400})
+        self.assertEqual(brackets["unknown"], {"orders": 1, "cents": 200})
+
+    def test_chunks(self):
+        for number in range(7):
+            self.order(self.start + number, ('amy', 'bob')[number % 2],
+                       number, 'shop{}'.format(number % 3))
+        self.assertEqual(self.build(chunk_size=2), self.build())
+
+    def test_partial_last_line(self):
+        self.order(self.start, 'bob', 100)
+        results = self.build(tail='{"time": 1000001.0, "shop": "te')
+        self.assertEqual(results["orders"], 1)
+        self.assertEqual(results["cents"], 100)
+
+    def test_seek(self):
+        for number in range(2000):
+            self.order(self.start - 2000 + number, 'bob', 1)
+        self.order(self.start, 'bob', 100)
+        results = self.build()
+        self.assertEqual((results["orders"], results["cents"]), (1, 100))
+
+    def test_missing_history(self):
+        report = SalesReport('missing.txt', self.start, self.end)
+        self.assertEqual(report.build(), 0)
+        self.assertEqual(report.results()["orders"], 0)
+
+    def test_write(self):
+        self.order(self.start, 'bob', 150)
+        self.write('history.txt', ''.join(self.lines))
+        report = SalesReport('history.txt', self.start, self.end)
+        report.build()
+        report.write('report')
+        self.assertIn('shop,tech,1,1,1.50\n', self.read('report.csv'))
+        self.assertEqual(json.loads(self.read('report.json'))["cents"], 150)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+# ===================================
+# Filename: test_sales.py
+# Purpose: To test the sales totals of the virtual-world program.
+#
+#
+# virtual-world
+# Copyright (C) 2017  Joshua Peter Booth
+#
+# This file is part of virtual-world.
+#
+# virtual-world is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# virtual-world is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with virtual-world (see LICENSE.md).
+# If not, see <http://www.gnu.org/licenses/>.
+#
+# Contact me:
+# Email: joshb00th@icloud.com
+# ===================================
+
+import json
+import time
+import unittest
+
+from tests import TempDirTest
+from _log import logger
+from _sales import SalesLedger
+
+
+class SalesLedgerTest(TempDirTest):
+
+    def setUp(self):
+        super().setUp()
+        self.ledgers = []
+        self.ledger = self.open()
+        self.ledger.record('tech', 'ann', [('tv', 2, 20000), ('pc', 1, 500)])
+        self.ledger.record('coffee', 'bob', [('latte', 3, 900)])
+
+    def tearDown(self):
+        for ledger in self.ledgers:
+            ledger.save()  # Before leaving the directory
+        super().tearDown()
+
+    def open(self, snapshot_every=100, keep_days=30):
+        ledger = SalesLedger('history.txt', 'totals.json',
+                             snapshot_every=snapshot_every,
+                             keep_days=keep_days)
+        self.ledgers.append(ledger)
+        return ledger
+
+    def check_totals(self, ledger):
+        self.assertEqual(ledger.item_totals('tech'),
+                         {'tv': (2, 20000), 'pc': (1, 500)})
+        self.assertEqual(ledger.shop_totals('tech'), (1, 3, 20500))
+        self.assertEqual(ledger.shop_totals('pizza'), (0, 0, 0))
+        self.assertEqual(ledger.user_totals('bob'), (1, 900))
+
+    def test_totals(self):
+        self.check_totals(self.ledger)
+        self.assertEqual(self.ledger.top_sellers(),
+                         [('coffee', 'latte', 3), ('tech', 'tv', 2),
+                          ('tech', 'pc', 1)])
+        self.assertEqual(self.ledger.top_sellers(shop='tech', count=1),
+                         [('tech', 'tv', 2)])
+
+    def test_reload(self):
+        self.check_totals(self.open())
+
+    def test_reload_from_saved_totals(self):
+        self.ledger.save()
+        offset = json.loads(self.read('totals.json'))["offset"]
+        self.assertEqual(offset, len(self.read('history.txt')))
+        self.ledger.record('tech', 'ann', [('tv', 1, 10000)])
+        ledger = self.open()
+        self.assertEqual(ledger.item_totals('tech')['tv'], (3, 30000))
+        self.assertEqual(ledger._unsaved, 1)  # Only the new order replayed
+
+    def test_replaced_history(self):
+        self.ledger.save()
+        self.write('history.txt', json.dumps(
+            {"time": time.time(), "shop": "tech", "user": "cat",
+             "items": [["tv", 1, 10000]], "total": 10000}) + '\n')
+        ledger = self.open()
+        self.assertEqual(ledger.user_totals('ann'), (0, 0))
+        self.assertEqual(ledger.user_totals('cat'), (1, 10000))
+
+    def test_snapshot_every(self):
+        ledger = self.open(snapshot_every=3)  # Replays the two orders
+        ledger.record('tech', 'ann', [('tv', 1, 10000)])
+        totals = json.loads(self.read('totals.json'))
+        self.assertEqual(totals["offset"], len(self.read('history.txt')))
+        self.assertEqual(totals["users"]["ann"], [2, 30500])
+
+    def test_rename(self):
+        self.ledger.rename('ann', 'amy')
+        for ledger in (self.ledger, self.open()):
+            self.assertEqual(ledger.user_totals('ann'), (0, 0))
+            self.assertEqual(ledger.user_totals('amy'), (1, 20500))
+
+    def test_partial_last_line(self):
+        with open('history.txt', 'a') as file:
+            file.write('{"shop": "tech", "items": [["tv", 9')
+        ledger = self.open()
+        with self.assertLogs(logger, 'WARNING'):
+            self.check_totals(ledger)
+        self.assertEqual(len(self.read('history.txt').splitlines()), 2)
+        ledger.record('tech', 'ann', [('tv', 1, 10000)])
+        self.assertEqual(self.open().item_totals('tech')['tv'], (3, 30000))
+
+    def test_old_days_dropped(self):
+        ledger = self.open(keep_days=2)
+        for days in (3, 2, 1):
+            ledger.record('tech', 'ann', [('pc', days, 500 * days)],
+                          time.time() - days * 86400)
+        day = time.strftime('%Y-%m-%d', time.localtime(
+            time.time() - 3 * 86400))
+        self.assertEqual(ledger.top_sellers(day), [])
+        day = time.strftime('%Y-%m-%d', time.localtime(
+            time.time() - 86400))
+        self.assertEqual(ledger.top_sellers(day), [('tech', 'pc', 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,205 @@
+# ===================================
+# Filename: test_shop.py
+# Purpose: To test the shop catalogs and orders of the virtual-world program.
+#
+#
+# virtual-world
+# Copyright (C) 2017  Joshua Peter Booth
+#
+# This file is part of virtual-world.
+#
+# virtual-world is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# virtual-world is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with virtual-world (see LICENSE.md).
+# If not, see <http://www.gnu.org/licenses/>.
+#
+# Contact me:
+# Email: joshb00th@icloud.com
+# ===================================
+
+import json
+import os
+import unittest
+
+from tests import TempDirTest
+from _log import logger
+from _shop import Catalog, CatalogFile, Order, Cart, format_price
+from _writer import DurableWriter
+
+SHOPS = {"tech": {"heading": "Catalogue", "kind": "tech", "limit": 2,
+                  "items": [["tv", "TV", "100"], ["pc", "PC", "1000.50"]]},
+         "coffee": {"items": [["latte", "Latte", "4.50"]]}}
+
+
+class CatalogTest(unittest.TestCase):
+
+    def test_prices(self):
+        catalog = Catalog('tech', [('tv', 'TV', '100'),
+                                   ('pc', 'PC', 1000.5)])
+        self.assertEqual(len(catalog), 2)
+        self.assertEqual(catalog.price('pc'), 100050)
+        self.assertEqual(catalog.labels, ['TV', 'PC'])
+        with self.assertRaises(KeyError):
+            catalog.price('phone')
+
+    def test_not_valid(self):
+        for items, limit in (([('tv', 'TV', 1), ('tv', 'TV', 2)], 9),
+                             ([('total', 'Total', 1)], 9),
+                             ([('tv', 'TV', 1)], 0)):
+            with self.assertRaises(ValueError):
+                Catalog('tech', items, limit=limit)
+
+    def test_format_price(self):
+        self.assertEqual(format_price(350), '$3.50')
+        self.assertEqual(format_price(100000), '$1000.00')
+
+
+class CatalogFileTest(TempDirTest):
+
+    def setUp(self):
+        super().setUp()
+        self.write('catalog.json', json.dumps(SHOPS))
+        self.catalogs = CatalogFile('catalog.json')
+
+    def test_parse(self):
+        tech = self.catalogs.get('tech')
+        self.assertEqual((tech.heading, tech.kind, tech.limit),
+                         ("Catalogue", "tech", 2))
+        coffee = self.catalogs.get('coffee')
+        self.assertEqual((coffee.heading, coffee.kind, coffee.limit),
+                         ("Menu", "item", 9))
+        self.assertIs(self.catalogs.get('tech'), tech)
+        with self.assertRaises(KeyError):
+            self.catalogs.get('pizza')
+
+    def test_reload(self):
+        tech = self.catalogs.get('tech')
+        shops = dict(SHOPS, tech=dict(SHOPS["tech"], limit=5))
+        self.write('catalog.json', json.dumps(shops, indent=4))
+        self.assertEqual(self.catalogs.get('tech').limit, 5)
+        self.write('catalog.json', json.dumps(SHOPS))
+        self.assertIs(self.catalogs.get('tech'), tech)  # Parsed before
+
+    def test_edit_not_valid(self):
+        tech = self.catalogs.get('tech')
+        self.write('catalog.json', '{"tech": {"items": [["tv"')
+        with self.assertLogs(logger, 'ERROR'):
+            self.assertIs(self.catalogs.get('tech'), tech)
+        os.remove('catalog.json')
+        with self.assertLogs(logger, 'ERROR'):
+            self.assertIs(self.catalogs.get('tech'), tech)
+
+    def test_first_load_not_valid(self):
+        self.write('catalog.json', '[]')
+        with self.assertRaises(ValueError):
+            CatalogFile('catalog.json').catalogs()
+        with self.assertRaises(ValueError):
+            CatalogFile('missing.json').catalogs()
+
+
+class Widget:
+
+    def __init__(self):
+        """ Stand-in for the widget that schedules delayed saves. """
+        self.jobs = {}
+        self.number = 0
+
+    def after(self, delay, callback):
+        self.number += 1
+        self.jobs[self.number] = callback
+        return self.number
+
+    def after_cancel(self, job):
+        del self.jobs[job]
+
+    def run(self):
+        """ Run the jobs that are waiting. """
+        jobs, self.jobs = self.jobs, {}
+        for callback in jobs.values():
+            callback()
+
+
+class OrderTest(TempDirTest):
+
+    def setUp(self):
+        super().setUp()
+        self.catalog = Catalog('tech', [('tv', 'TV', '100'),
+                                        ('pc', 'PC', '1000.50')])
+        self.writer = DurableWriter()
+
+    def test_totals(self):
+        order = Order(self.catalog, 'order.txt', self.writer)
+        self.assertTrue(order.set('pc', 2))
+        self.assertFalse(order.set('pc', 2))
+        order.set('tv', 1)
+        order.set('pc', 1)
+        self.assertEqual((order.count, order.total), (2, 110050))
+        self.assertEqual(order.amount('pc'), 1)
+        self.assertEqual(order.lines(), [('TV', 1, 10000),
+                                         ('PC', 1, 100050)])
+        self.assertEqual(order.sales(), [('tv', 1, 10000),
+                                         ('pc', 1, 100050)])
+        self.assertEqual(self.read('order.txt'), 'tv:1\npc:1\ntotal:2')
+
+    def test_delayed_save(self):
+        widget = Widget()
+        order = Order(self.catalog, 'order.txt', self.writer, widget)
+        order.set('tv', 1)
+        order.set('tv', 2)
+        self.assertEqual(len(widget.jobs), 1)
+        self.assertFalse(os.path.exists('order.txt'))
+        widget.run()
+        self.assertEqual(self.read('order.txt'), 'tv:2\npc:0\ntotal:2')
+
+    def test_clear(self):
+        widget = Widget()
+        order = Order(self.catalog, 'order.txt', self.writer, widget)
+        order.set('tv', 1)
+        contents = order.clear()
+        self.assertEqual(widget.jobs, {})
+        self.assertEqual((order.count, order.total), (0, 0))
+        self.assertFalse(os.path.exists('order.txt'))
+        order.write(contents)
+        self.assertEqual(self.read('order.txt'), 'tv:0\npc:0\ntotal:0')
+
+
+class CartTest(TempDirTest):
+
+    def setUp(self):
+        super().setUp()
+        writer = DurableWriter()
+        self.tech = Order(Catalog('tech', [('tv', 'TV', '100')]),
+                          'tech.txt', writer)
+        self.coffee = Order(Catalog('coffee', [('latte', 'Latte', '4.50')]),
+                            'coffee.txt', writer)
+        self.cart = Cart()
+        self.cart.add('tech', self.tech)
+        self.cart.add('coffee', self.coffee)
+
+    def test_totals(self):
+        self.tech.set('tv', 2)
+        self.coffee.set('latte', 1)
+        self.assertEqual((self.cart.count, self.cart.total), (3, 20450))
+        self.assertEqual(self.cart.stock(), {'tech': [('tv', 2)],
+                                             'coffee': [('latte', 1)]})
+
+    def test_reset(self):
+        self.tech.set('tv', 2)
+        emptied = self.cart.reset()
+        self.assertEqual(emptied, [(self.tech, 'tv:0\ntotal:0')])
+        self.assertEqual(self.cart.count, 0)
+        self.assertEqual(self.cart.stock(), {})
+        self.assertEqual(self.read('tech.txt'), 'tv:2\ntotal:2')  # Unsaved
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,292 @@
+# ===================================
+# Filename: test_store.py
+# Purpose: To test the user account stores of the virtual-world program.
+#
+#
+# virtual-world
+# Copyright (C) 2017  Joshua Peter Booth
+#
+# This file is part of virtual-world.
+#
+# virtual-world is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# virtual-world is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with virtual-world (see LICENSE.md).
+# If not, see <http://www.gnu.org/licenses/>.
+#
+# Contact me:
+# Email: joshb00th@icloud.com
+# ===================================
+
+import os
+import unittest
+
+from tests import TempDirTest
+from _log import logger
+from _store import (UserStore, SQLiteUserStore, BinaryUserStore,
+                    ShardedUserStore, migrate, parse_cents, format_cents)
+
+
+class CentsTest(unittest.TestCase):
+
+    def test_parse_cents(self):
+        self.assertEqual(parse_cents('12.345'), 1235)
+        self.assertEqual(parse_cents(-0.5), -50)
+        self.assertEqual(parse_cents(3), 300)
+
+    def test_format_cents(self):
+        self.assertEqual(format_cents(1000000), '10000')
+        self.assertEqual(format_cents(2489950), '24899.50')
+        self.assertEqual(format_cents(-5), '-0.05')
+
+
+class StoreTests:
+    """ Behaviour every StorageBackend must share. """
+
+    def open(self):
+        """ Open the store under test on this test's files. """
+        raise NotImplementedError
+
+    def setUp(self):
+        super().setUp()
+        self.stores = []
+        self.store = self.reopen()
+        self.store.put('ann', 'pw', '30', '100')
+        self.store.put('bob', 'pw', '40', '20.50')
+
+    def tearDown(self):
+        for store in self.stores:
+            if hasattr(store, 'close'):
+                store.close()
+        super().tearDown()
+
+    def reopen(self):
+        store = self.open()
+        self.stores.append(store)
+        return store
+
+    def test_get(self):
+        user = self.store.get('ann')
+        self.assertEqual(user['username'], 'ann')
+        self.assertEqual(user['password'], self.store.password_token('pw'))
+        self.assertEqual(user['age'], '30')
+        self.assertEqual(user['balance'], '100')
+        self.assertIn('bob', self.store)
+        self.assertNotIn('cat', self.store)
+        with self.assertRaises(KeyError):
+            self.store.get('cat')
+
+    def test_check_password(self):
+        self.assertTrue(self.store.check_password('ann', 'pw'))
+        self.assertFalse(self.store.check_password('ann', 'no'))
+        self.assertFalse(self.store.check_password('cat', 'pw'))
+
+    def test_update(self):
+        self.store.update('ann', age='31')
+        self.assertEqual(self.store.get('ann')['age'], '31')
+        self.assertEqual(self.store.get('ann')['balance'], '100')
+
+    def test_rename(self):
+        self.store.rename('ann', 'amy')
+        self.assertNotIn('ann', self.store)
+        self.assertEqual(self.store.get('amy')['balance'], '100')
+        self.assertEqual(sorted(self.store.names()), ['amy', 'bob'])
+
+    def test_remove(self):
+        self.store.remove('ann')
+        self.assertEqual(self.store.names(), ['bob'])
+        with self.assertRaises(KeyError):
+            self.store.remove('ann')
+
+    def test_adjust_balance(self):
+        self.assertEqual(self.store.adjust_balance('ann', '-40.25'), '59.75')
+        self.assertIsNone(self.store.adjust_balance('ann', -60))
+        self.assertEqual(self.store.get('ann')['balance'], '59.75')
+        with self.assertRaises(KeyError):
+            self.store.adjust_balance('cat', 1)
+
+    def test_adjust_many(self):
+        results = self.store.adjust_many(
+            [('ann', -60), ('ann', -60), ('cat', 1), ('bob', '0.50')])
+        self.assertEqual(results, ['40', None, False, '21'])
+        self.assertEqual(self.store.get('ann')['balance'], '40')
+        self.assertEqual(self.store.get('bob')['balance'], '21')
+
+    def test_adjust_many_atomic(self):
+        results = self.store.adjust_many([('ann', -60), ('bob', -30)],
+                                         atomic=True)
+        self.assertEqual(results, ['40', None])
+        self.assertEqual(self.store.get('ann')['balance'], '100')
+        self.assertEqual(self.store.get('bob')['balance'], '20.50')
+        results = self.store.adjust_many([('ann', -60), ('bob', -20)],
+                                         atomic=True)
+        self.assertEqual(results, ['40', '0.50'])
+        self.assertEqual(self.store.get('ann')['balance'], '40')
+        self.assertEqual(self.store.get('bob')['balance'], '0.50')
+
+    def test_bulk_balances(self):
+        self.assertEqual(self.store.credit_all(150), 2)
+        self.assertEqual(self.store.get('bob')['balance'], '22')
+        self.assertEqual(self.store.total_cents(), 12350)
+        self.assertEqual(self.store.names_below(5000), ['bob'])
+        with self.assertRaises(ValueError):
+            self.store.credit_all(-1)
+
+    def test_put_many(self):
+        count = self.store.put_many([
+            {'username': 'cat', 'password': 'pw', 'age': '20',
+             'balance': '5'},
+            {'username': 'ann', 'password': 'pw', 'age': '30',
+             'balance': '1'}])
+        self.assertEqual(count, 2)
+        self.assertEqual(sorted(self.store.names()), ['ann', 'bob', 'cat'])
+        self.assertEqual(self.store.get('ann')['balance'], '1')
+
+    def test_reopen(self):
+        self.store.adjust_balance('ann', '0.01')
+        self.store.rename('bob', 'ben')
+        store = self.reopen()
+        self.assertEqual(sorted(store.names()), ['ann', 'ben'])
+        self.assertEqual(store.get('ann')['balance'], '100.01')
+        self.assertEqual(store.get('ben')['balance'], '20.50')
+
+
+class UserStoreTest(StoreTests, TempDirTest):
+
+    def open(self):
+        return UserStore('users.txt', 'names.txt', 'journal.txt')
+
+    def test_balance_changes_are_journalled(self):
+        self.store.adjust_balance('ann', 1)
+        self.assertEqual(self.read('journal.txt'), 'ann,101\n')
+        self.assertIn('ann,pw,30,100', self.read('users.txt'))
+
+    def test_names_file(self):
+        self.assertEqual(self.read('names.txt'), 'ann\nbob')
+        stamp = self.store.names_stamp()
+        self.store.adjust_balance('ann', 1)
+        self.store.credit_all(1)
+        self.assertEqual(self.store.names_stamp(), stamp)
+        self.store.rename('ann', 'amy')
+        self.assertEqual(self.read('names.txt'), 'amy\nbob')
+
+    def test_partial_journal_line(self):
+        self.store.adjust_balance('ann', 1)
+        with open('journal.txt', 'a') as file:
+            file.write('bob,9')
+        with self.assertLogs(logger, 'WARNING'):
+            store = self.reopen()
+            self.assertEqual(store.get('ann')['balance'], '101')
+            self.assertEqual(store.get('bob')['balance'], '20.50')
+        self.assertEqual(self.read('journal.txt'), 'ann,101\n')
+        store.adjust_balance('bob', 1)
+        self.assertEqual(self.read('journal.txt'), 'ann,101\nbob,21.50\n')
+
+    def test_compact(self):
+        self.store.adjust_balance('ann', 1)
+        self.store.compact()
+        self.assertEqual(self.read('journal.txt'), '')
+        self.assertEqual(self.reopen().get('ann')['balance'], '101')
+
+    def test_outside_change_reloads(self):
+        generation = self.store.generation
+        self.store.get('ann')  # Adopt the stamp of our own writes
+        self.write('users.txt', 'cat,pw,20,5\n')
+        self.write('journal.txt', '')
+        self.assertEqual(self.store.names(), ['cat'])
+        self.assertEqual(self.store.generation, generation + 1)
+
+    def test_without_journal(self):
+        store = UserStore('plain.txt')
+        store.put('ann', 'pw', '30', '100')
+        store.adjust_balance('ann', -1)
+        self.assertEqual(self.read('plain.txt'), 'ann,pw,30,99')
+
+
+class SQLiteUserStoreTest(StoreTests, TempDirTest):
+
+    def open(self):
+        return SQLiteUserStore('users.db')
+
+    def test_names_stamp(self):
+        stamp = self.store.names_stamp()
+        self.store.adjust_balance('ann', 1)
+        self.assertEqual(self.store.names_stamp(), stamp)
+        self.store.rename('ann', 'amy')
+        self.assertNotEqual(self.store.names_stamp(), stamp)
+
+
+class BinaryUserStoreTest(StoreTests, TempDirTest):
+
+    def open(self):
+        return BinaryUserStore('users.bin', 'users.idx')
+
+    def test_grows_and_reuses_slots(self):
+        names = ['user{}'.format(number) for number in range(100)]
+        for name in names:
+            self.store.put(name, 'pw', '20', '1')
+        self.store.remove('ann')
+        self.store.put('cat', 'pw', '20', '1')
+        self.assertEqual(len(self.store), 102)
+        self.assertEqual(self.store.total_cents(), 12150)
+
+    def test_rebuilds_stale_index(self):
+        self.store.put('cat', 'pw', '20', '1')
+        with open('users.idx', 'wb') as file:
+            file.write(b'')
+        self.assertEqual(sorted(self.reopen().names()),
+                         ['ann', 'bob', 'cat'])
+
+    def test_username_too_long(self):
+        with self.assertRaises(ValueError):
+            self.store.put('x' * 33, 'pw', '20', '1')
+
+
+class ShardedUserStoreTest(StoreTests, TempDirTest):
+
+    def open(self):
+        return ShardedUserStore('users{}.txt', 'journal{}.txt', 'count.txt',
+                                count=4)
+
+    def test_reshard(self):
+        for number in range(20):
+            self.store.put('user{}'.format(number), 'pw', '20', '1')
+        self.store.adjust_balance('ann', 1)
+        self.store.reshard(2)
+        self.assertEqual(len(self.store.shards), 2)
+        self.assertEqual(self.read('count.txt'), '2')
+        self.assertFalse(os.path.exists('users3.txt'))
+        self.assertFalse(os.path.exists('journal2.txt'))
+        self.assertEqual(len(self.store.names()), 22)
+        self.assertEqual(self.store.get('ann')['balance'], '101')
+        self.assertEqual(self.store.total_cents(), 14150)
+        store = self.reopen()
+        self.assertEqual(len(store.shards), 2)
+        self.assertEqual(sorted(store.names()), sorted(self.store.names()))
+
+
+class MigrateTest(TempDirTest):
+
+    def test_migrate(self):
+        source = UserStore('users.txt', 'names.txt')
+        source.put('ann', 'pw', '30', '100')
+        source.put('bob', 'pw', '40', '20.50')
+        target = SQLiteUserStore('users.db')
+        try:
+            self.assertEqual(migrate(source, target), 2)
+            self.assertEqual(target.names(), ['ann', 'bob'])
+            self.assertEqual(target.get('bob'), source.get('bob'))
+        finally:
+            target.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
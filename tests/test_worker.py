@@ -0,0 +1,111 @@
+# ===================================
+# Filename: test_worker.py
+# Purpose: To test the worker threads of the virtual-world program.
+#
+#
+# virtual-world
+# Copyright (C) 2017  Joshua Peter Booth
+#
+# This file is part of virtual-world.
+#
+# virtual-world is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# virtual-world is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with virtual-world (see LICENSE.md).
+# If not, see <http://www.gnu.org/licenses/>.
+#
+# Contact me:
+# Email: joshb00th@icloud.com
+# ===================================
+
+import threading
+import time
+import unittest
+
+from _log import logger
+from _worker import WorkerPool
+
+
+class Widget:
+
+    def __init__(self):
+        """ Stand-in for a window, its root and a button in it. """
+        self.options = {}
+        self.delayed = []
+
+    def winfo_toplevel(self):
+        return self
+
+    def _root(self):
+        return self
+
+    def configure(self, **options):
+        self.options.update(options)
+
+    def after(self, delay, callback):
+        self.delayed.append(callback)
+
+
+class WorkerPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = WorkerPool(workers=2)
+        self.addCleanup(self.pool.shutdown)
+        self.window = Widget()
+        self.button = Widget()
+
+    def finish(self):
+        """ Wait for the calls, then run the checks they scheduled. """
+        self.pool.shutdown()
+        while self.window.delayed:
+            self.window.delayed.pop(0)()
+
+    def test_done_on_the_tk_thread(self):
+        threads = []
+        results = []
+        self.pool.run(self.window, lambda: threads.append(
+            threading.current_thread()) or 42, results.append,
+            busy=(self.button,))
+        self.assertEqual(self.window.options['cursor'], "watch")
+        self.assertEqual(self.button.options['state'], "disabled")
+        self.finish()
+        self.assertEqual(results, [42])
+        self.assertIsNot(threads[0], threading.current_thread())
+        self.assertEqual(self.window.options['cursor'], "")
+        self.assertEqual(self.button.options['state'], "normal")
+
+    def test_busy_until_every_call_is_done(self):
+        gate = threading.Event()
+        self.pool.run(self.window, gate.wait, busy=(self.button,))
+        self.pool.run(self.window, lambda: None)
+        while self.pool._finished.empty():  # The quick call
+            time.sleep(0.01)
+        self.window.delayed.pop(0)()
+        self.assertEqual(self.window.options['cursor'], "watch")
+        self.assertEqual(self.button.options['state'], "disabled")
+        gate.set()
+        self.finish()
+        self.assertEqual(self.window.options['cursor'], "")
+        self.assertEqual(self.button.options['state'], "normal")
+
+    def test_failed(self):
+        errors = []
+        self.pool.run(self.window, lambda: 1 / 0, failed=errors.append)
+        self.finish()
+        self.assertIsInstance(errors[0], ZeroDivisionError)
+        self.pool = WorkerPool()
+        self.pool.run(self.window, lambda: 1 / 0)
+        with self.assertLogs(logger, 'ERROR'):
+            self.finish()
+
+
+if __name__ == '__main__':
+    unittest.main()
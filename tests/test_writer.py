@@ -0,0 +1,135 @@
+# ===================================
+# Filename: test_writer.py
+# Purpose: To test the durable file writer of the virtual-world program.
+#
+#
+# virtual-world
+# Copyright (C) 2017  Joshua Peter Booth
+#
+# This file is part of virtual-world.
+#
+# virtual-world is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# virtual-world is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with virtual-world (see LICENSE.md).
+# If not, see <http://www.gnu.org/licenses/>.
+#
+# Contact me:
+# Email: joshb00th@icloud.com
+# ===================================
+
+import os
+import unittest
+
+from tests import TempDirTest
+from _log import logger
+from _writer import DurableWriter
+
+
+class DurableWriterTest(TempDirTest):
+
+    def test_mode_not_valid(self):
+        with self.assertRaises(ValueError):
+            DurableWriter('never')
+
+    def test_replace_and_append(self):
+        writer = DurableWriter()
+        writer.replace('a.txt', 'one\n')
+        writer.append('a.txt', 'two\n')
+        self.assertEqual(self.read('a.txt'), 'one\ntwo\n')
+        self.assertFalse(writer.pending('a.txt'))
+        self.assertFalse(os.path.exists('a.txt.tmp'))
+
+    def test_read_sees_pending_writes(self):
+        writer = DurableWriter('exit')
+        self.write('a.txt', 'old\n')
+        writer.append('a.txt', 'new\n')
+        self.assertTrue(writer.pending('a.txt'))
+        self.assertEqual(self.read('a.txt'), 'old\n')
+        self.assertEqual(writer.read('a.txt'), 'old\nnew\n')
+        writer.replace('a.txt', 'whole\n')
+        writer.append('a.txt', 'more\n')
+        self.assertEqual(writer.read('a.txt'), 'whole\nmore\n')
+        writer.flush()
+        self.assertFalse(writer.pending('a.txt'))
+        self.assertEqual(self.read('a.txt'), 'whole\nmore\n')
+
+    def test_read_missing_file(self):
+        with self.assertRaises(FileNotFoundError):
+            DurableWriter().read('missing.txt')
+
+    def test_group_commits_together(self):
+        writer = DurableWriter()
+        with writer.group():
+            writer.replace('a.txt', 'a')
+            writer.append('b.txt', 'b')
+            self.assertTrue(writer.pending('a.txt', 'b.txt'))
+            self.assertFalse(os.path.exists('a.txt'))
+            self.assertFalse(os.path.exists('b.txt'))
+        self.assertEqual(self.read('a.txt'), 'a')
+        self.assertEqual(self.read('b.txt'), 'b')
+
+    def test_group_commits_when_raising(self):
+        writer = DurableWriter()
+        with self.assertRaises(KeyError):
+            with writer.group():
+                writer.replace('a.txt', 'a')
+                raise KeyError
+        self.assertEqual(self.read('a.txt'), 'a')
+
+    def test_failed_commit_raises(self):
+        writer = DurableWriter()
+        with self.assertRaises(OSError):
+            writer.replace(os.path.join('missing', 'a.txt'), 'a')
+        writer.replace('a.txt', 'a')  # Other files still commit
+        self.assertEqual(self.read('a.txt'), 'a')
+
+    def test_draft_written_at_once(self):
+        writer = DurableWriter('exit')
+        writer.replace('draft.txt', 'd', sync=False)
+        self.assertFalse(writer.pending('draft.txt'))
+        self.assertEqual(self.read('draft.txt'), 'd')
+
+    def test_draft_after_queued_write(self):
+        writer = DurableWriter('exit')
+        writer.replace('draft.txt', 'old')
+        writer.replace('draft.txt', 'new', sync=False)
+        self.assertTrue(writer.pending('draft.txt'))
+        writer.flush()
+        self.assertEqual(self.read('draft.txt'), 'new')
+
+
+class ReadRecordsTest(TempDirTest):
+
+    def test_whole_lines(self):
+        self.write('log.txt', 'a\nb\n')
+        self.assertEqual(DurableWriter().read_records('log.txt'),
+                         ['a', 'b'])
+
+    def test_partial_last_line(self):
+        self.write('log.txt', 'a\nb\npar')
+        writer = DurableWriter()
+        with self.assertLogs(logger, 'WARNING'):
+            self.assertEqual(writer.read_records('log.txt'), ['a', 'b'])
+        self.assertEqual(self.read('log.txt'), 'a\nb\n')
+        writer.append('log.txt', 'c\n')
+        self.assertEqual(writer.read_records('log.txt'), ['a', 'b', 'c'])
+
+    def test_only_partial_line(self):
+        self.write('log.txt', 'par')
+        writer = DurableWriter()
+        with self.assertLogs(logger, 'WARNING'):
+            self.assertEqual(writer.read_records('log.txt'), [])
+        self.assertEqual(self.read('log.txt'), '')
+
+
+if __name__ == '__main__':
+    unittest.main()